@@ -13,3 +13,14 @@ class InvalidAuthError(AddonError):
 
 class HookError(AddonError):
     pass
+
+class FileTreeSizeExceeded(AddonError):
+    """Raised by `BaseStorageAddon._get_file_tree` when the files found exceed `max_size`."""
+
+    def __init__(self, file_tree, size, max_size):
+        super(FileTreeSizeExceeded, self).__init__(
+            'File tree exceeds {} bytes, {} found so far'.format(max_size, size)
+        )
+        self.file_tree = file_tree
+        self.size = size
+        self.max_size = max_size
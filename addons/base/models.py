@@ -1,6 +1,6 @@
 import abc
 import os
-import time
+from multiprocessing.pool import ThreadPool
 
 import markupsafe
 import requests
@@ -8,6 +8,7 @@ from django.db import models
 from framework.auth import Auth
 from framework.auth.decorators import must_be_logged_in
 from framework.exceptions import HTTPError, PermissionsError
+from framework.utils import RateLimiter
 from mako.lookup import TemplateLookup
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.models.external import ExternalAccount
@@ -16,6 +17,7 @@ from osf.models.user import OSFUser
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from website import settings
 from addons.base import logger, serializer
+from addons.base.exceptions import FileTreeSizeExceeded
 from website.oauth.signals import oauth_complete
 
 lookup = TemplateLookup(
@@ -51,6 +53,14 @@ class BaseAddonSettings(ObjectIDMixin, BaseModel):
     def short_name(self):
         return self.config.short_name
 
+    def save(self, *args, **kwargs):
+        ret = super(BaseAddonSettings, self).save(*args, **kwargs)
+        # Keep the addon cache of the owner, if loaded, up to date
+        owner = getattr(self, self._meta.get_field('owner').get_cache_name(), None)
+        if owner is not None and owner._addon_settings is not None:
+            owner._addon_settings[self.short_name] = self
+        return ret
+
     def delete(self, save=True):
         self.deleted = True
         self.on_delete()
@@ -585,17 +595,23 @@ class BaseStorageAddon(object):
         if res.status_code != 200:
             raise HTTPError(res.status_code, data={'error': res.json()})
 
-        # TODO: better throttling?
-        time.sleep(1.0 / 5.0)
-
         data = res.json().get('data', None)
         if data:
             return [child['attributes'] for child in data]
         return []
 
-    def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None):
-        """
-        Recursively get file metadata
+    def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None, max_size=None, progress=None):
+        """Get file metadata, with the metadata of the contents of folders under `children`.
+
+        Folders are listed level by level, each level's folders concurrently on up to
+        ``settings.FILE_TREE_CONCURRENCY`` threads and at most
+        ``settings.FILE_TREE_MAX_REQUESTS_PER_SECOND`` requests per second in total.
+
+        :param dict filenode: Metadata of the file or folder to start at, the root by default
+        :param int max_size: Raise FileTreeSizeExceeded with the tree listed so far as soon
+            as the files found add up to more than this many bytes
+        :param progress: Called with the number of files and their total size found so
+            far after each folder is listed
         """
         filenode = filenode or {
             'path': '/',
@@ -605,14 +621,38 @@ class BaseStorageAddon(object):
         if filenode.get('kind') == 'file':
             return filenode
 
-        kwargs = {
-            'version': version,
-            'cookie': cookie,
-        }
-        filenode['children'] = [
-            self._get_file_tree(child, user, cookie=cookie)
-            for child in self._get_fileobj_child_metadata(filenode, user, **kwargs)
-        ]
+        # Loaded here, so the threads don't query the database
+        if user and not cookie:
+            cookie = user.get_or_create_cookie()
+        self.owner  # noqa
+        limiter = RateLimiter(settings.FILE_TREE_MAX_REQUESTS_PER_SECOND)
+
+        def list_folder(folder):
+            limiter.wait()
+            return folder, self._get_fileobj_child_metadata(folder, user, cookie=cookie, version=version)
+
+        num_files = 0
+        size = 0
+        level = [filenode]
+        pool = ThreadPool(settings.FILE_TREE_CONCURRENCY)
+        try:
+            while level:
+                next_level = []
+                for folder, children in pool.imap_unordered(list_folder, level):
+                    folder['children'] = children
+                    for child in children:
+                        if child.get('kind') == 'file':
+                            num_files += 1
+                            size += float(child.get('size') or 0)
+                        else:
+                            next_level.append(child)
+                    if progress:
+                        progress(num_files, size)
+                    if max_size is not None and size > max_size:
+                        raise FileTreeSizeExceeded(filenode, size, max_size)
+                level = next_level
+        finally:
+            pool.terminate()
         return filenode
 
 
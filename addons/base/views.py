@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import httplib
 import os
 import uuid
@@ -14,6 +15,7 @@ import jwe
 import jwt
 from django.db import transaction
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 
 from addons.base.models import BaseStorageAddon
 from addons.osfstorage.models import OsfStorageFile
@@ -35,7 +37,7 @@ from addons.base import signals as file_signals
 from addons.base.utils import format_last_known_metadata
 from osf.models import (BaseFileNode, TrashedFileNode,
                         OSFUser, AbstractNode,
-                        NodeLog, DraftRegistration, RegistrationSchema,
+                        NodeLog, DraftRegistration,
                         Guid, FileVersionUserMetadata)
 from website.profile.utils import get_profile_image_url
 from website.project import decorators
@@ -197,20 +199,15 @@ def check_access(node, auth, action, cas_resp):
 
     # Users with the prereg admin permission should be allowed to download files
     # from prereg challenge draft registrations.
-    try:
-        prereg_schema = RegistrationSchema.objects.get(name='Prereg Challenge', schema_version=2)
-        allowed_nodes = [node] + node.parents
-        prereg_draft_registration = DraftRegistration.objects.filter(
-            branched_from__in=allowed_nodes,
-            registration_schema=prereg_schema
-        )
-        if action == 'download' and \
-                    auth.user is not None and \
-                    prereg_draft_registration.count() > 0 and \
-                    auth.user.has_perm('osf.administer_prereg'):
-            return True
-    except RegistrationSchema.DoesNotExist:
-        pass
+    if action == 'download' and \
+            auth.user is not None and \
+            auth.user.has_perm('osf.administer_prereg') and \
+            DraftRegistration.objects.filter(
+                branched_from__in=[node] + node.parents,
+                registration_schema__name='Prereg Challenge',
+                registration_schema__schema_version=2,
+            ).exists():
+        return True
 
     raise HTTPError(httplib.FORBIDDEN if auth.user else httplib.UNAUTHORIZED)
 
@@ -225,27 +222,50 @@ def make_auth(user):
     return {}
 
 
-@collect_auth
-def get_auth(auth, **kwargs):
+def get_auth_cache():
+    """The cache of signed WaterButler payloads, or `None` if disabled."""
+    if not settings.WATERBUTLER_AUTH_CACHE_TIMEOUT:
+        return None
+    return caches[settings.WATERBUTLER_AUTH_CACHE]
+
+
+def auth_cache_key(auth, cas_resp, node_id, provider_name, action):
+    """A payload may be reused by the same user, with the same view-only link and token
+    scopes, for the same action on the same provider of the same node.
+    """
+    scopes = sorted(cas_resp.attributes.get('accessTokenScope', ())) if cas_resp else None
+    raw = repr((
+        auth.user._id if auth.user else None,
+        auth.private_key,
+        scopes,
+        node_id,
+        provider_name,
+        action,
+    ))
+    return 'waterbutler-auth:{}'.format(hashlib.sha256(raw).hexdigest())
+
+
+def authenticate_waterbutler_request(auth):
+    """Authenticate a request from WaterButler with its OAuth bearer token, or with the
+    cookie in its payload.
+
+    :return tuple: The decrypted payload data and the CAS response, if a token was used
+    """
     cas_resp = None
     if not auth.user:
         # Central Authentication Server OAuth Bearer Token
         authorization = request.headers.get('Authorization')
         if authorization and authorization.startswith('Bearer '):
             client = cas.get_client()
-            try:
-                access_token = cas.parse_auth_header(authorization)
-                cas_resp = client.profile(access_token)
-            except cas.CasError as err:
-                sentry.log_exception()
-                # NOTE: We assume that the request is an AJAX request
-                return json_renderer(err)
+            access_token = cas.parse_auth_header(authorization)
+            cas_resp = client.profile(access_token)
             if cas_resp.authenticated:
                 auth.user = OSFUser.load(cas_resp.user)
 
+    payload = request.args.get('payload') or (request.get_json(silent=True) or {}).get('payload', '')
     try:
         data = jwt.decode(
-            jwe.decrypt(request.args.get('payload', '').encode('utf-8'), WATERBUTLER_JWE_KEY),
+            jwe.decrypt(payload.encode('utf-8'), WATERBUTLER_JWE_KEY),
             settings.WATERBUTLER_JWT_SECRET,
             options={'require_exp': True},
             algorithm=settings.WATERBUTLER_JWT_ALGORITHM
@@ -256,15 +276,24 @@ def get_auth(auth, **kwargs):
 
     if not auth.user:
         auth.user = OSFUser.from_cookie(data.get('cookie', ''))
+    return data, cas_resp
 
-    try:
-        action = data['action']
-        node_id = data['nid']
-        provider_name = data['provider']
-    except KeyError:
-        raise HTTPError(httplib.BAD_REQUEST)
 
-    node = AbstractNode.load(node_id)
+def authorize_waterbutler(auth, cas_resp, node_id, provider_name, action, node=None):
+    """The signed payload allowing WaterButler to perform `action` on the files of the
+    provider `provider_name` of node `node_id`. Payloads are cached for
+    `WATERBUTLER_AUTH_CACHE_TIMEOUT` seconds.
+
+    :param AbstractNode node: The node, if already loaded
+    :raises HTTPError: If the action isn't allowed
+    """
+    cache = get_auth_cache()
+    key = auth_cache_key(auth, cas_resp, node_id, provider_name, action) if cache else None
+    ret = cache.get(key) if cache else None
+    if ret is not None:
+        return ret
+
+    node = node or AbstractNode.load(node_id)
     if not node:
         raise HTTPError(httplib.NOT_FOUND)
 
@@ -281,7 +310,7 @@ def get_auth(auth, **kwargs):
         log_exception()
         raise HTTPError(httplib.BAD_REQUEST)
 
-    return {'payload': jwe.encrypt(jwt.encode({
+    ret = {'payload': jwe.encrypt(jwt.encode({
         'exp': timezone.now() + datetime.timedelta(seconds=settings.WATERBUTLER_JWT_EXPIRATION),
         'data': {
             'auth': make_auth(auth.user),  # A waterbutler auth dict not an Auth object
@@ -294,6 +323,67 @@ def get_auth(auth, **kwargs):
             ),
         }
     }, settings.WATERBUTLER_JWT_SECRET, algorithm=settings.WATERBUTLER_JWT_ALGORITHM), WATERBUTLER_JWE_KEY)}
+    if cache:
+        cache.set(key, ret, settings.WATERBUTLER_AUTH_CACHE_TIMEOUT)
+    return ret
+
+
+@collect_auth
+def get_auth(auth, **kwargs):
+    try:
+        data, cas_resp = authenticate_waterbutler_request(auth)
+    except cas.CasError as err:
+        sentry.log_exception()
+        # NOTE: We assume that the request is an AJAX request
+        return json_renderer(err)
+
+    try:
+        action = data['action']
+        node_id = data['nid']
+        provider_name = data['provider']
+    except KeyError:
+        raise HTTPError(httplib.BAD_REQUEST)
+
+    return authorize_waterbutler(auth, cas_resp, node_id, provider_name, action)
+
+
+@collect_auth
+def get_auth_batch(auth, **kwargs):
+    """Authorize many WaterButler actions, e.g. the files of a folder download, in one
+    request. The payload is the same as `get_auth`'s, with a list of ``requests``, each
+    with an ``action``, ``nid`` and ``provider``, instead of a single action.
+
+    :return dict: ``payloads``, in the order of the requests. Each is a signed payload
+        like `get_auth` returns, or the HTTP ``code`` of the error.
+    """
+    try:
+        data, cas_resp = authenticate_waterbutler_request(auth)
+    except cas.CasError as err:
+        sentry.log_exception()
+        return json_renderer(err)
+
+    actions = data.get('requests')
+    if not isinstance(actions, list) or len(actions) > settings.WATERBUTLER_AUTH_BATCH_SIZE:
+        raise HTTPError(httplib.BAD_REQUEST)
+    try:
+        actions = [(each['nid'], each['provider'], each['action']) for each in actions]
+    except (KeyError, TypeError):
+        raise HTTPError(httplib.BAD_REQUEST)
+
+    nodes = {
+        node._id: node for node in
+        AbstractNode.prefetch_addons(AbstractNode.objects.filter(guids___id__in={nid for nid, _, _ in actions}))
+    }
+    payloads = []
+    for node_id, provider_name, action in actions:
+        try:
+            payloads.append(authorize_waterbutler(
+                auth, cas_resp, node_id, provider_name, action,
+                node=nodes.get(node_id),
+            ))
+        except HTTPError as err:
+            payloads.append({'code': err.code})
+    return {'payloads': payloads}
 
 
 LOG_ACTION_MAP = {
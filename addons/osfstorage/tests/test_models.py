@@ -198,6 +198,35 @@ class TestOsfstorageFileNode(StorageTestCase):
     def test_update_version_metadata(self):
         pass
 
+    def test_version_summary(self):
+        child = self.node_settings.get_root().append_file('Test')
+        assert_is_none(child.version_count)
+
+        first = child.create_version(self.user, {'service': 'cloud', settings.WATERBUTLER_RESOURCE: 'osf', 'object': '06d80e'})
+        second = child.create_version(self.user, {'service': 'cloud', settings.WATERBUTLER_RESOURCE: 'osf', 'object': '07d80e'})
+        child.reload()
+        assert_equal(child.version_count, 2)
+        assert_equal(child.latest_version, second)
+        assert_equal(child.earliest_version, first)
+
+        second.delete()
+        child.reload()
+        assert_equal(child.version_count, 1)
+        assert_equal(child.latest_version, first)
+
+        child.versions.clear()
+        assert_equal(child.version_count, 0)
+        assert_is_none(child.latest_version)
+        assert_is_none(child.earliest_version)
+
+    def test_version_summary_reverse_add(self):
+        child = self.node_settings.get_root().append_file('Test')
+        version = factories.FileVersionFactory()
+        version.basefilenode_set.add(child)
+        child.reload()
+        assert_equal(child.version_count, 1)
+        assert_equal(child.latest_version, version)
+
     def test_delete_folder(self):
         parent = self.node_settings.get_root().append_folder('Test')
         kids = []
@@ -117,6 +117,25 @@ class TestGetMetadataHook(HookTestCase):
         assert_equal(res_date_created, expected_date_created)
         assert_equal(res_data, expected_data)
 
+    def test_children_metadata_of_files_not_summarized(self):
+        record = recursively_create_file(self.node_settings, u'kind/of/magic.mp3')
+        first, second = factories.FileVersionFactory(), factories.FileVersionFactory()
+        record.versions.add(first, second)
+        # As before backfill_file_version_summaries runs
+        models.BaseFileNode.objects.filter(id=record.id).update(version_count=None, latest_version=None, earliest_version=None)
+        res = self.send_hook(
+            'osfstorage_get_children',
+            {'fid': record.parent._id, 'user_id': self.user._id},
+            {},
+            self.node
+        )
+        res_data = res.json[0]
+        assert_equal(res_data['version'], 2)
+        assert_equal(res_data['size'], second.size)
+        assert_equal(res_data['md5'], second.metadata.get('md5'))
+        assert_equal(parse_datetime(res_data['modified']), second.created)
+        assert_equal(parse_datetime(res_data['created']), first.created)
+
     def test_osf_storage_root(self):
         auth = Auth(self.project.creator)
         result = osf_storage_root(self.node_settings.config, self.node_settings, auth)
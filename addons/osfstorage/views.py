@@ -162,6 +162,103 @@ def osfstorage_get_metadata(file_node, **kwargs):
     return file_node.serialize(version=version, include_full=True)
 
 
+# Lists the children of a folder for WaterButler. The version fields come from the summary
+# maintained on BaseFileNode rather than being aggregated per file. Files that have not
+# been summarized yet (version_count is null until backfill_file_version_summaries ran)
+# still have their versions aggregated
+GET_CHILDREN_SQL = """
+        SELECT json_agg(CASE
+            WHEN F.type = 'osf.osfstoragefile' THEN
+                json_build_object(
+                    'id', F._id
+                    , 'path', '/' || F._id
+                    , 'name', F.name
+                    , 'kind', 'file'
+                    , 'size', LATEST_VERSION.size
+                    , 'downloads',  COALESCE(DOWNLOAD_COUNT, 0)
+                    , 'version', COALESCE(F.version_count, (SELECT COUNT(*) FROM osf_basefilenode_versions WHERE osf_basefilenode_versions.basefilenode_id = F.id))
+                    , 'contentType', LATEST_VERSION.content_type
+                    , 'modified', LATEST_VERSION.created
+                    , 'created', EARLIEST_VERSION.created
+                    , 'checkout', CHECKOUT_GUID
+                    , 'md5', LATEST_VERSION.metadata ->> 'md5'
+                    , 'sha256', LATEST_VERSION.metadata ->> 'sha256'
+                    , 'latestVersionSeen', SEEN_LATEST_VERSION.case
+                )
+            ELSE
+                json_build_object(
+                    'id', F._id
+                    , 'path', '/' || F._id || '/'
+                    , 'name', F.name
+                    , 'kind', 'folder'
+                )
+            END
+        )
+        FROM osf_basefilenode AS F
+        LEFT JOIN LATERAL (
+            SELECT osf_fileversion.id FROM osf_fileversion
+            JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
+            WHERE F.version_count IS NULL
+            AND osf_basefilenode_versions.basefilenode_id = F.id
+            ORDER BY created DESC, osf_fileversion.id DESC
+            LIMIT 1
+        ) UNSUMMARIZED_LATEST_VERSION ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT osf_fileversion.id FROM osf_fileversion
+            JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
+            WHERE F.version_count IS NULL
+            AND osf_basefilenode_versions.basefilenode_id = F.id
+            ORDER BY created ASC, osf_fileversion.id ASC
+            LIMIT 1
+        ) UNSUMMARIZED_EARLIEST_VERSION ON TRUE
+        LEFT JOIN osf_fileversion AS LATEST_VERSION
+            ON LATEST_VERSION.id = COALESCE(F.latest_version_id, UNSUMMARIZED_LATEST_VERSION.id)
+        LEFT JOIN osf_fileversion AS EARLIEST_VERSION
+            ON EARLIEST_VERSION.id = COALESCE(F.earliest_version_id, UNSUMMARIZED_EARLIEST_VERSION.id)
+        LEFT JOIN LATERAL (
+            SELECT _id from osf_guid
+            WHERE object_id = F.checkout_id
+            AND content_type_id = %s
+            LIMIT 1
+        ) CHECKOUT_GUID ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT P.total AS DOWNLOAD_COUNT FROM osf_pagecounter AS P
+            WHERE P._id = 'download:' || %s || ':' || F._id
+            LIMIT 1
+        ) DOWNLOAD_COUNT ON TRUE
+        LEFT JOIN LATERAL (
+          SELECT EXISTS(
+            SELECT (1) FROM osf_fileversionusermetadata
+              INNER JOIN osf_fileversion ON osf_fileversionusermetadata.file_version_id = osf_fileversion.id
+              INNER JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
+              WHERE osf_fileversionusermetadata.user_id = %s
+              AND osf_basefilenode_versions.basefilenode_id = F.id
+            LIMIT 1
+          )
+        ) SEEN_FILE ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT CASE WHEN SEEN_FILE.exists
+            THEN
+                CASE WHEN EXISTS(
+                  SELECT (1) FROM osf_fileversionusermetadata
+                  WHERE osf_fileversionusermetadata.file_version_id = LATEST_VERSION.id
+                  AND osf_fileversionusermetadata.user_id = %s
+                  LIMIT 1
+                )
+                THEN
+                  json_build_object('user', %s, 'seen', TRUE)
+                ELSE
+                  json_build_object('user', %s, 'seen', FALSE)
+                END
+            ELSE
+              NULL
+            END
+        ) SEEN_LATEST_VERSION ON TRUE
+        WHERE parent_id = %s
+        AND (NOT F.type IN ('osf.trashedfilenode', 'osf.trashedfile', 'osf.trashedfolder'))
+"""
+
+
 @must_be_signed
 @decorators.autoload_filenode(must_be='folder')
 def osfstorage_get_children(file_node, **kwargs):
@@ -171,91 +268,7 @@ def osfstorage_get_children(file_node, **kwargs):
     user_pk = OSFUser.objects.filter(guids___id=user_id, guids___id__isnull=False).values_list('pk', flat=True).first()
     with connection.cursor() as cursor:
         # Read the documentation on FileVersion's fields before reading this code
-        cursor.execute("""
-            SELECT json_agg(CASE
-                WHEN F.type = 'osf.osfstoragefile' THEN
-                    json_build_object(
-                        'id', F._id
-                        , 'path', '/' || F._id
-                        , 'name', F.name
-                        , 'kind', 'file'
-                        , 'size', LATEST_VERSION.size
-                        , 'downloads',  COALESCE(DOWNLOAD_COUNT, 0)
-                        , 'version', (SELECT COUNT(*) FROM osf_basefilenode_versions WHERE osf_basefilenode_versions.basefilenode_id = F.id)
-                        , 'contentType', LATEST_VERSION.content_type
-                        , 'modified', LATEST_VERSION.created
-                        , 'created', EARLIEST_VERSION.created
-                        , 'checkout', CHECKOUT_GUID
-                        , 'md5', LATEST_VERSION.metadata ->> 'md5'
-                        , 'sha256', LATEST_VERSION.metadata ->> 'sha256'
-                        , 'latestVersionSeen', SEEN_LATEST_VERSION.case
-                    )
-                ELSE
-                    json_build_object(
-                        'id', F._id
-                        , 'path', '/' || F._id || '/'
-                        , 'name', F.name
-                        , 'kind', 'folder'
-                    )
-                END
-            )
-            FROM osf_basefilenode AS F
-            LEFT JOIN LATERAL (
-                SELECT * FROM osf_fileversion
-                JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
-                WHERE osf_basefilenode_versions.basefilenode_id = F.id
-                ORDER BY created DESC
-                LIMIT 1
-            ) LATEST_VERSION ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT * FROM osf_fileversion
-                JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
-                WHERE osf_basefilenode_versions.basefilenode_id = F.id
-                ORDER BY created ASC
-                LIMIT 1
-            ) EARLIEST_VERSION ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT _id from osf_guid
-                WHERE object_id = F.checkout_id
-                AND content_type_id = %s
-                LIMIT 1
-            ) CHECKOUT_GUID ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT P.total AS DOWNLOAD_COUNT FROM osf_pagecounter AS P
-                WHERE P._id = 'download:' || %s || ':' || F._id
-                LIMIT 1
-            ) DOWNLOAD_COUNT ON TRUE
-            LEFT JOIN LATERAL (
-              SELECT EXISTS(
-                SELECT (1) FROM osf_fileversionusermetadata
-                  INNER JOIN osf_fileversion ON osf_fileversionusermetadata.file_version_id = osf_fileversion.id
-                  INNER JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
-                  WHERE osf_fileversionusermetadata.user_id = %s
-                  AND osf_basefilenode_versions.basefilenode_id = F.id
-                LIMIT 1
-              )
-            ) SEEN_FILE ON TRUE
-            LEFT JOIN LATERAL (
-                SELECT CASE WHEN SEEN_FILE.exists
-                THEN
-                    CASE WHEN EXISTS(
-                      SELECT (1) FROM osf_fileversionusermetadata
-                      WHERE osf_fileversionusermetadata.file_version_id = LATEST_VERSION.fileversion_id
-                      AND osf_fileversionusermetadata.user_id = %s
-                      LIMIT 1
-                    )
-                    THEN
-                      json_build_object('user', %s, 'seen', TRUE)
-                    ELSE
-                      json_build_object('user', %s, 'seen', FALSE)
-                    END
-                ELSE
-                  NULL
-                END
-            ) SEEN_LATEST_VERSION ON TRUE
-            WHERE parent_id = %s
-            AND (NOT F.type IN ('osf.trashedfilenode', 'osf.trashedfile', 'osf.trashedfolder'))
-        """, [
+        cursor.execute(GET_CHILDREN_SQL, [
             user_content_type_id,
             file_node.target._id,
             user_pk,
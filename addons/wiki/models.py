@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
 import functools
+import hashlib
+import json
 import logging
 
+import bleach
 import markdown
 import pytz
 from addons.base.models import BaseNodeSettings
@@ -10,11 +13,13 @@ from bleach.callbacks import nofollow
 from bleach import Cleaner
 from functools import partial
 from bleach.linkifier import LinkifyFilter
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
 from framework.forms.utils import sanitize
 from markdown.extensions import codehilite, fenced_code, wikilinks
 from osf.models import AbstractNode, NodeLog, OSFUser
-from osf.models.base import BaseModel, GuidMixin, ObjectIDMixin
+from osf.models.base import BaseModel, Guid, GuidMixin, ObjectIDMixin, generate_guids
 from osf.utils.fields import NonNaiveDateTimeField
 from osf.utils.requests import DummyRequest, get_request_and_user_id
 from website import settings
@@ -85,18 +90,33 @@ def build_wiki_url(node, label, base, end):
     return '/{pid}/wiki/{wname}/'.format(pid=node._id, wname=label)
 
 
+# Bump when build_html_output or WikiVersion.html change, so cached renders are redone
+RENDERER_VERSION = 1
+
+def get_render_key(node):
+    """Identifies everything but its content that the HTML of a WikiVersion depends on."""
+    config = json.dumps([RENDERER_VERSION, markdown.version, bleach.__version__, settings.WIKI_WHITELIST], sort_keys=True)
+    return '{}:{}'.format(hashlib.md5(config).hexdigest(), node._id)
+
+
 class WikiVersion(ObjectIDMixin, BaseModel):
     user = models.ForeignKey('osf.OSFUser', null=True, blank=True, on_delete=models.CASCADE)
     wiki_page = models.ForeignKey('WikiPage', null=True, blank=True, on_delete=models.CASCADE, related_name='versions')
     content = models.TextField(default='', blank=True)
     identifier = models.IntegerField(default=1)
 
+    # Versions never change once written, so their rendered HTML and text are kept.
+    # Only valid while `rendered_key` matches get_render_key(node)
+    rendered_html = models.TextField(null=True, blank=True)
+    rendered_text = models.TextField(null=True, blank=True)
+    rendered_key = models.CharField(max_length=64, null=True, blank=True)
+
     @property
     def is_current(self):
         return not self.wiki_page.deleted and self.id == self.wiki_page.versions.order_by('-created').first().id
 
-    def html(self, node):
-        """The cleaned HTML of the page"""
+    def render(self, node):
+        """Render the HTML and text of the page for `node` and store them."""
         html_output = build_html_output(self.content, node=node)
         try:
             cleaner = Cleaner(
@@ -105,15 +125,33 @@ class WikiVersion(ObjectIDMixin, BaseModel):
                 styles=settings.WIKI_WHITELIST['styles'],
                 filters=[partial(LinkifyFilter, callbacks=[nofollow, ])]
             )
-            return cleaner.clean(html_output)
+            self.rendered_html = cleaner.clean(html_output)
         except TypeError:
             logger.warning('Returning unlinkified content.')
-            return render_content(self.content, node=node)
+            self.rendered_html = render_content(self.content, node=node)
+        self.rendered_text = sanitize(self.rendered_html, tags=[], strip=True)
+        self.rendered_key = get_render_key(node)
+        if self.pk:
+            # Not `save`, which would reindex the node and spam check the page again
+            WikiVersion.objects.filter(pk=self.pk).update(
+                rendered_html=self.rendered_html,
+                rendered_text=self.rendered_text,
+                rendered_key=self.rendered_key,
+            )
+
+    def _ensure_rendered(self, node):
+        if self.rendered_html is None or self.rendered_key != get_render_key(node):
+            self.render(node)
+
+    def html(self, node):
+        """The cleaned HTML of the page"""
+        self._ensure_rendered(node)
+        return self.rendered_html
 
     def raw_text(self, node):
         """ The raw text of the page, suitable for using in a test search"""
-
-        return sanitize(self.html(node), tags=[], strip=True)
+        self._ensure_rendered(node)
+        return self.rendered_text
 
     @property
     def rendered_before_update(self):
@@ -141,6 +179,9 @@ class WikiVersion(ObjectIDMixin, BaseModel):
         return self.content
 
     def save(self, *args, **kwargs):
+        if self.pk is None and self.wiki_page.node:
+            # Rendered on write as indexing the node needs it right away
+            self.render(self.wiki_page.node)
         rv = super(WikiVersion, self).save(*args, **kwargs)
         if self.wiki_page.node:
             self.wiki_page.node.update_search()
@@ -281,15 +322,47 @@ class WikiPage(GuidMixin, BaseModel):
     @classmethod
     def clone_wiki_pages(cls, node, copy, user, save=True):
         """Clone wiki pages for a forked or registered project.
-        First clones the WikiPage, then clones all WikiPage versions.
+        Clones the WikiPages, then all their versions, in bulk. The HTML of the cloned
+        versions is rendered for the copy when it's first needed.
         :param node: The Node that was forked/registered
         :param copy: The fork/registration
         :param user: The user who forked or registered the node
         :param save: Whether to save the fork/registration
         :return: copy
         """
-        for wiki_page in node.wikis.filter(deleted__isnull=True):
-            wiki_page.clone_wiki_page(copy, user, save)
+        from osf.utils.forks import OBJECT_ID_SQL, copied_fields, copy_rows, object_id_prefix
+
+        wiki_pages = list(node.wikis.filter(deleted__isnull=True).order_by('id'))
+        if not wiki_pages:
+            return copy
+        new_wiki_pages = [cls(node=copy, user=user, **copied_fields(wiki_page)) for wiki_page in wiki_pages]
+        cls.objects.bulk_create(new_wiki_pages)
+        content_type = ContentType.objects.get_for_model(cls)
+        Guid.objects.bulk_create([
+            Guid(_id=guid, content_type=content_type, object_id=new_wiki_page.id)
+            for new_wiki_page, guid in zip(new_wiki_pages, generate_guids(len(new_wiki_pages)))
+        ])
+
+        order_by = 'R.created, R.id'
+        now = timezone.now()
+        copy_rows(
+            WikiVersion, WikiVersion._meta.get_field('wiki_page').column,
+            {wiki_page.id: new_wiki_page.id for wiki_page, new_wiki_page in zip(wiki_pages, new_wiki_pages)},
+            values={
+                '_id': OBJECT_ID_SQL.format(order_by=order_by),
+                # Distinct, so the versions keep their order
+                'created': "%(now)s + row_number() OVER (ORDER BY {}) * interval '1 microsecond'".format(order_by),
+                'modified': '%(now)s',
+                'user_id': '%(user_id)s',
+                'rendered_html': 'NULL',
+                'rendered_text': 'NULL',
+                'rendered_key': 'NULL',
+            },
+            params={'id_prefix': object_id_prefix(), 'now': now, 'user_id': user.id},
+            order_by=order_by,
+        )
+        if copy.is_public:
+            copy.update_search()
         return copy
 
     def to_json(self, user):
@@ -1,12 +1,14 @@
+import mock
 import pytest
 import pytz
 import datetime
 from addons.wiki.exceptions import NameMaximumLengthError
 
-from addons.wiki.models import WikiPage, WikiVersion
+from addons.wiki.models import WikiPage, WikiVersion, get_render_key
 from addons.wiki.tests.factories import WikiFactory, WikiVersionFactory
 from osf_tests.factories import NodeFactory, UserFactory, ProjectFactory
 from tests.base import OsfTestCase, fake
+from website import settings
 
 pytestmark = pytest.mark.django_db
 
@@ -48,6 +50,31 @@ class TestWikiPageModel:
         page.save()
         assert ver1.is_current is False
 
+    def test_rendered_on_write(self):
+        user = UserFactory()
+        node = NodeFactory()
+        page = WikiPage(page_name='foo', node=node)
+        page.save()
+        version = page.create_version(user=user, content='*hello* [[bar]]')
+        version = WikiVersion.objects.get(id=version.id)
+        assert version.rendered_key == get_render_key(node)
+        assert version.html(node) == version.rendered_html
+        assert '<em>hello</em>' in version.rendered_html
+        assert '/{}/wiki/bar/'.format(node._id) in version.rendered_html
+        assert version.raw_text(node) == 'hello bar'
+
+    def test_rerendered_when_whitelist_changes(self):
+        user = UserFactory()
+        node = NodeFactory()
+        page = WikiPage(page_name='foo', node=node)
+        page.save()
+        version = page.create_version(user=user, content='*hello*')
+        whitelist = dict(settings.WIKI_WHITELIST, tags=[tag for tag in settings.WIKI_WHITELIST['tags'] if tag != 'em'])
+        with mock.patch.object(settings, 'WIKI_WHITELIST', whitelist):
+            assert '<em>' not in version.html(node)
+            assert WikiVersion.objects.get(id=version.id).rendered_key == get_render_key(node)
+        assert '<em>hello</em>' in version.html(node)
+
 
 class TestWikiPage(OsfTestCase):
 
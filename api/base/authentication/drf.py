@@ -14,7 +14,8 @@ from api.base.exceptions import (UnconfirmedAccountError, UnclaimedAccountError,
                                  MergedAccountError, InvalidAccountError, TwoFactorRequiredError)
 from framework.auth import cas
 from framework.auth.core import get_user
-from osf.models import OSFUser, Session
+from framework.sessions.cache import load_session
+from osf.models import OSFUser
 from website import settings
 
 
@@ -30,11 +31,7 @@ def get_session_from_cookie(cookie_val):
         session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie_val)
     except itsdangerous.BadSignature:
         return None
-    try:
-        session = Session.objects.get(_id=session_id)
-        return session
-    except Session.DoesNotExist:
-        return None
+    return load_session(session_id)
 
 
 def check_user(user):
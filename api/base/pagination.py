@@ -1,8 +1,12 @@
+import base64
+import json
 from django.utils import six
 from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist
 from django.core.urlresolvers import reverse
 from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
-from django.db.models import QuerySet
+from django.db import connections
+from django.db.models import Q, QuerySet
 
 from rest_framework import pagination
 from rest_framework.exceptions import NotFound
@@ -10,6 +14,7 @@ from rest_framework.response import Response
 from rest_framework.utils.urls import (
     replace_query_param, remove_query_param
 )
+from api.base.exceptions import InvalidQueryStringError
 from api.base.serializers import is_anonymized
 from api.base.settings import MAX_PAGE_SIZE
 from api.base.utils import absolute_reverse
@@ -18,16 +23,181 @@ from osf.models import AbstractNode, Comment, Guid
 from website.search.elastic_search import DOC_TYPE_TO_MODEL
 
 
+def estimate_count(queryset):
+    """Row count of `queryset` as estimated by the postgres planner, without running it."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, six.string_types):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPaginator(object):
+    """Paginates a queryset by the values of its ordering fields rather than by offset, so
+    deep pages are as cheap as the first one and no COUNT(*) is needed.
+
+    A cursor is `(direction, values)`: the page after (`'next'`) or before (`'prev'`) the row
+    whose ordering fields have `values`. Without values, it is the first or last page.
+    The primary key is always appended to the ordering so that it is unique.
+
+    Ordering fields may be nullable. Postgres sorts NULL after every value in ascending
+    order and before them in descending order, i.e. as the greatest value either way,
+    and `keyset_filter` does the same.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        self.per_page = per_page
+        self.count = count
+        self.ordering = self.get_ordering(queryset)
+        self.queryset = queryset.order_by(*[
+            '{}{}'.format('-' if descending else '', field.attname) for field, descending in self.ordering
+        ])
+
+    @staticmethod
+    def get_ordering(queryset):
+        """Returns [(field, descending)], raising InvalidQueryStringError if the ordering can't be paginated by keyset."""
+        if queryset.query.combinator:
+            raise InvalidQueryStringError('Cursor pagination is not supported for this endpoint.', parameter='page[cursor]')
+        opts = queryset.model._meta
+        order_by = queryset.query.order_by or (queryset.query.default_ordering and opts.ordering) or ()
+        ordering = []
+        for name in order_by:
+            if not isinstance(name, six.string_types):
+                raise InvalidQueryStringError('Cursor pagination is not supported for this ordering.', parameter='page[cursor]')
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if not field or not field.concrete or field.is_relation:
+                raise InvalidQueryStringError(
+                    'Cursor pagination is not supported when sorting by {}.'.format(name), parameter='page[cursor]'
+                )
+            ordering.append((field, descending))
+        if opts.pk not in [field for field, _ in ordering]:
+            ordering.append((opts.pk, ordering[-1][1] if ordering else False))
+        return ordering
+
+    def encode_cursor(self, direction, obj=None):
+        values = None
+        if obj is not None:
+            values = [
+                None if getattr(obj, field.attname) is None else field.value_to_string(obj)
+                for field, _ in self.ordering
+            ]
+        return base64.urlsafe_b64encode(json.dumps([direction, values]))
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return 'next', None
+        try:
+            direction, values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            if direction not in ('next', 'prev'):
+                raise ValueError
+            if values is not None:
+                if len(values) != len(self.ordering):
+                    raise ValueError
+                values = [
+                    None if value is None else field.to_python(value)
+                    for (field, _), value in zip(self.ordering, values)
+                ]
+        except Exception:
+            raise InvalidQueryStringError('Invalid cursor.', parameter='page[cursor]')
+        return direction, values
+
+    @staticmethod
+    def equal(field, value):
+        if value is None:
+            return Q(**{'{}__isnull'.format(field.attname): True})
+        return Q(**{field.attname: value})
+
+    @staticmethod
+    def greater(field, value):
+        """Q matching values of `field` greater than `value`, NULL being the greatest, or
+        None if there are none.
+        """
+        if value is None:
+            return None
+        return Q(**{'{}__gt'.format(field.attname): value}) | Q(**{'{}__isnull'.format(field.attname): True})
+
+    @staticmethod
+    def less(field, value):
+        """Q matching values of `field` less than `value`, NULL being the greatest."""
+        if value is None:
+            return Q(**{'{}__isnull'.format(field.attname): False})
+        return Q(**{'{}__lt'.format(field.attname): value})
+
+    def keyset_filter(self, values, backwards):
+        """Q matching rows after `values` in the ordering, or before them if `backwards`."""
+        q = Q()
+        for i, (field, descending) in enumerate(self.ordering):
+            compare = self.less if descending != backwards else self.greater
+            condition = compare(field, values[i])
+            if condition is None:
+                continue
+            for (previous, _), value in zip(self.ordering[:i], values):
+                condition &= self.equal(previous, value)
+            q |= condition
+        return q
+
+    def page(self, cursor):
+        direction, values = self.decode_cursor(cursor)
+        backwards = direction == 'prev'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+            return KeysetPage(objects, self, has_next=values is not None, has_previous=has_more)
+        return KeysetPage(objects, self, has_next=has_more, has_previous=values is not None)
+
+
+class KeysetPage(list):
+    """A page of a KeysetPaginator, with the parts of the django Page interface used by JSONAPIPagination."""
+
+    def __init__(self, objects, paginator, has_next, has_previous):
+        super(KeysetPage, self).__init__(objects)
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_cursor(self):
+        return self.paginator.encode_cursor('next', self[-1])
+
+    def previous_cursor(self):
+        return self.paginator.encode_cursor('prev', self[0])
+
+
 class JSONAPIPagination(pagination.PageNumberPagination):
     """
     Custom paginator that formats responses in a JSON-API compatible format.
 
     Properly handles pagination of embedded objects.
 
+    Clients may opt in to keyset pagination, which stays fast for deep pages of large
+    lists, by passing `page[cursor]` (empty for the first page) instead of `page`.
+    The `prev` and `next` links then carry cursors and `meta.total` is null
+    unless `page[total]=estimate` asks for the planner's estimate of it.
     """
 
     page_size_query_param = 'page[size]'
     max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'page[cursor]'
+    total_query_param = 'page[total]'
 
     def page_number_query(self, url, page_number):
         """
@@ -41,30 +211,47 @@ class JSONAPIPagination(pagination.PageNumberPagination):
 
         return paginated_url
 
+    def cursor_query(self, url, cursor):
+        """
+        Builds uri and adds cursor param.
+        """
+        url = remove_query_param(self.request.build_absolute_uri(url), '_')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
     def get_self_real_link(self, url):
+        if isinstance(self.page, KeysetPage):
+            return self.cursor_query(url, self.request.query_params.get(self.cursor_query_param))
         page_number = self.page.number
         return self.page_number_query(url, page_number)
 
     def get_first_real_link(self, url):
         if not self.page.has_previous():
             return None
+        if isinstance(self.page, KeysetPage):
+            return self.cursor_query(url, '')
         return self.page_number_query(url, 1)
 
     def get_last_real_link(self, url):
         if not self.page.has_next():
             return None
+        if isinstance(self.page, KeysetPage):
+            return self.cursor_query(url, self.page.paginator.encode_cursor('prev'))
         page_number = self.page.paginator.num_pages
         return self.page_number_query(url, page_number)
 
     def get_previous_real_link(self, url):
         if not self.page.has_previous():
             return None
+        if isinstance(self.page, KeysetPage):
+            return self.cursor_query(url, self.page.previous_cursor())
         page_number = self.page.previous_page_number()
         return self.page_number_query(url, page_number)
 
     def get_next_real_link(self, url):
         if not self.page.has_next():
             return None
+        if isinstance(self.page, KeysetPage):
+            return self.cursor_query(url, self.page.next_cursor())
         page_number = self.page.next_page_number()
         return self.page_number_query(url, page_number)
 
@@ -156,9 +343,24 @@ class JSONAPIPagination(pagination.PageNumberPagination):
             self.request = request
             return list(self.page)
 
+        elif self.cursor_query_param in request.query_params and isinstance(queryset, QuerySet):
+            return self.paginate_queryset_by_cursor(queryset, request)
+
         else:
             return super(JSONAPIPagination, self).paginate_queryset(queryset, request, view=None)
 
+    def paginate_queryset_by_cursor(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        count = None
+        if request.query_params.get(self.total_query_param) == 'estimate':
+            count = estimate_count(queryset)
+        paginator = KeysetPaginator(queryset, page_size, count=count)
+        self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        self.request = request
+        return list(self.page)
+
 
 class MaxSizePagination(JSONAPIPagination):
     page_size = 1000
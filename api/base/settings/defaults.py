@@ -266,6 +266,56 @@ ENABLE_ESI = osf_settings.ENABLE_ESI
 VARNISH_SERVERS = osf_settings.VARNISH_SERVERS
 ESI_MEDIA_TYPES = osf_settings.ESI_MEDIA_TYPES
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Embedded results of anonymous requests, see api.caching.embeds.
+    # Only used once this is shared between API, web and celery processes, e.g. with django-redis.
+    'embeds': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'embeds',
+        'TIMEOUT': 300,
+    },
+    # CAS profiles of OAuth2 access tokens, see framework.auth.cas.CasClient.profile.
+    # Only used once this is shared between API and web processes, so revoked tokens are evicted everywhere.
+    'cas_tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cas_tokens',
+        'TIMEOUT': osf_settings.CAS_TOKEN_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': osf_settings.CAS_TOKEN_CACHE_MAX_ENTRIES},
+    },
+    # Signed WaterButler payloads, see addons.base.views.get_auth
+    'waterbutler_auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'waterbutler_auth',
+        'TIMEOUT': osf_settings.WATERBUTLER_AUTH_CACHE_TIMEOUT,
+    },
+    # Rendered citations, see api.citations.utils
+    'citations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'citations',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Sessions and verified basic auth credentials, see framework.sessions.cache.
+    # Sessions are only cached once this is shared between API and web processes (e.g. with
+    # django-redis), so logging out evicts everywhere.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'TIMEOUT': osf_settings.SESSION_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+EMBED_CACHE = 'embeds'
+EMBED_CACHE_ENABLED = True  # Has no effect while EMBED_CACHE is per process
+EMBED_CACHE_TIMEOUT = 300  # seconds
+
+CITATION_CACHE = 'citations'
+CITATION_CACHE_TIMEOUT = 3600  # seconds
+CITATION_STYLE_CACHE_SIZE = 100  # parsed CSL styles kept per process
+
 ADDONS_FOLDER_CONFIGURABLE = ['box', 'dropbox', 's3', 'googledrive', 'figshare', 'owncloud', 'onedrive']
 ADDONS_OAUTH = ADDONS_FOLDER_CONFIGURABLE + ['dataverse', 'github', 'bitbucket', 'gitlab', 'mendeley', 'zotero', 'forward']
 
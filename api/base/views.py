@@ -16,6 +16,7 @@ from rest_framework.response import Response
 
 from api.base import permissions as base_permissions
 from api.base import utils
+from api.caching import embeds as embed_cache
 from api.base.exceptions import RelationshipPostMakesNoChanges
 from api.base.filters import ListFilterMixin
 from api.base.parsers import JSONAPIRelationshipParser
@@ -101,6 +102,15 @@ class JSONAPIBaseView(generics.GenericAPIView):
                 # We already have the result for this embed, return it
                 return cache[_cache_key]
 
+            # Anonymous embeds are the same for every client, so they are shared across requests
+            shared_cache_key = None
+            if embed_cache.is_cacheable(request):
+                shared_cache_key = embed_cache.get_key(request, v.cls, field_name, view.get_serializer_class(), item)
+                ret = embed_cache.get_embed(shared_cache_key)
+                if ret is not None:
+                    cache[_cache_key] = ret
+                    return ret
+
             # Cache serializers. to_representation of a serializer should NOT augment it's fields so resetting the context
             # should be sufficient for reuse
             if not view.get_serializer_class() in cache:
@@ -126,12 +136,15 @@ class JSONAPIBaseView(generics.GenericAPIView):
             except Exception as e:
                 with transaction.atomic():
                     ret = view.handle_exception(e).data
+                shared_cache_key = None  # Errors may be transient, don't share them
 
             # Allow request to be gc'd
             ser._context = None
 
             # Cache our final result
             cache[_cache_key] = ret
+            if shared_cache_key:
+                embed_cache.set_embed(shared_cache_key, ret)
 
             return ret
 
@@ -0,0 +1,129 @@
+"""Shared cache for embedded results of anonymous API requests.
+
+`JSONAPIBaseView._get_embed_partial` memoizes embeds per request. For anonymous
+requests the same embed (e.g. `?embed=contributors` on a public node) is identical
+across clients, so it is also stored in the `embeds` django cache, which may be
+shared between processes (e.g. redis).
+
+Every key includes a generation number for the embedded object. Saving or deleting
+one of the `INVALIDATING_MODELS` bumps the number of the object and of the objects it
+belongs to, so stale entries are never read again and simply expire. Other changes
+(e.g. a new log, or a contributor renaming their account) are bounded by the cache
+timeout. Generations are bumped in the process that saved the object, so the cache is
+only used when it is shared between processes.
+"""
+import hashlib
+
+from django.conf import settings as django_settings
+from django.core.cache import caches
+
+from framework.utils import is_shared_cache
+
+# Models whose saves and deletes invalidate embeds, by concrete model label: the attributes
+# holding the ids of the objects whose embeds they appear in, with the label of those objects
+INVALIDATING_MODELS = {
+    'osf.abstractnode': (),
+    'osf.osfuser': (),
+    'osf.contributor': (('node_id', 'osf.abstractnode'), ('user_id', 'osf.osfuser')),
+    'osf.noderelation': (('parent_id', 'osf.abstractnode'), ('child_id', 'osf.abstractnode')),
+    'osf.preprintservice': (('node_id', 'osf.abstractnode'),),
+    'osf.comment': (('node_id', 'osf.abstractnode'),),
+}
+
+HITS_KEY = 'embed-cache:hits'
+MISSES_KEY = 'embed-cache:misses'
+
+
+def get_cache():
+    return caches[django_settings.EMBED_CACHE]
+
+def _model_label(model):
+    # Node, Registration... are proxies of AbstractNode, and share its generations
+    return model._meta.concrete_model._meta.label_lower
+
+def _object_label(obj):
+    return '{}:{}'.format(_model_label(type(obj)), obj.pk)
+
+def _generation_key(label, pk):
+    return 'embed-gen:{}:{}'.format(label, pk)
+
+def _incr(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+def is_enabled():
+    """Whether embeds are cached; never with a per-process ``EMBED_CACHE``."""
+    return django_settings.EMBED_CACHE_ENABLED and is_shared_cache(django_settings.EMBED_CACHE)
+
+def is_cacheable(request):
+    """Only anonymous requests without a view-only link see the same results."""
+    return (
+        is_enabled() and
+        not request.user.is_authenticated and
+        not request.query_params.get('view_only')
+    )
+
+def get_key(request, view_class, field_name, serializer_class, obj):
+    """Key for the embed `field_name` of `obj`, as rendered for the anonymous `request`.
+    The query string is part of the key since it may change the embed (e.g. `page[size]`).
+    """
+    http_request = request._request._request
+    generation = get_cache().get(_generation_key(_model_label(type(obj)), obj.pk), 0)
+    query_string = '&'.join(sorted(http_request.META.get('QUERY_STRING', '').split('&')))
+    raw = u':'.join(unicode(part) for part in (
+        request.version,
+        'anonymous',
+        http_request.get_host(),
+        query_string,
+        '{}.{}'.format(view_class.__module__, view_class.__name__),
+        field_name,
+        '{}.{}'.format(serializer_class.__module__, serializer_class.__name__),
+        _object_label(obj),
+        generation,
+    ))
+    return 'embed:{}'.format(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+def get_embed(key):
+    """Return the cached embed for `key` or None, recording the hit or miss."""
+    value = get_cache().get(key)
+    _incr(HITS_KEY if value is not None else MISSES_KEY)
+    return value
+
+def set_embed(key, value):
+    get_cache().set(key, value, django_settings.EMBED_CACHE_TIMEOUT)
+
+def invalidates_embeds(model):
+    return _model_label(model) in INVALIDATING_MODELS
+
+def invalidate_embed_cache(instance):
+    """Invalidate embeds of `instance`, one of the `INVALIDATING_MODELS`, and of the objects
+    it belongs to. Only ids are read, related objects are not loaded.
+    """
+    label = _model_label(type(instance))
+    if not instance.pk or label not in INVALIDATING_MODELS:
+        return
+    keys = [_generation_key(label, instance.pk)]
+    for attr, owner_label in INVALIDATING_MODELS[label]:
+        owner_id = getattr(instance, attr)
+        if owner_id:
+            keys.append(_generation_key(owner_label, owner_id))
+    if label == 'osf.abstractnode':
+        # e.g. the children embed of the parent, when a component is made private
+        from osf.models import NodeRelation
+        parent_ids = NodeRelation.objects.filter(child_id=instance.pk).values_list('parent_id', flat=True)
+        keys.extend(_generation_key(label, parent_id) for parent_id in parent_ids)
+    for key in keys:
+        _incr(key)
+
+def get_embed_cache_stats():
+    """Cumulative hit and miss counts and the hit ratio across all processes sharing the cache."""
+    counts = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': float(hits) / (hits + misses) if hits + misses else None,
+    }
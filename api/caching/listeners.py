@@ -1,10 +1,19 @@
-from api.caching.tasks import ban_url
-from framework.postcommit_tasks.handlers import enqueue_postcommit_task
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.caching.embeds import invalidate_embed_cache, invalidates_embeds, is_enabled
+from api.caching.tasks import enqueue_ban
 
 # unused for now
-# from django.dispatch import receiver
-# from django.db.models.signals import post_save
 # @receiver(post_save)
 def ban_object_from_cache(sender, instance, **kwargs):
     if hasattr(instance, 'absolute_api_v2_url'):
-        enqueue_postcommit_task(ban_url, (instance, ), {}, celery=False, once_per_request=True)
+        enqueue_ban(instance)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_embeds(sender, instance, raw=False, **kwargs):
+    # Connected to every sender since Node, Registration... are proxies of AbstractNode
+    if not raw and invalidates_embeds(sender) and is_enabled():
+        invalidate_embed_cache(instance)
@@ -1,9 +1,9 @@
 import urlparse
 
-import requests
 import logging
 
 from framework.celery_tasks import app
+from framework.postcommit_tasks.bans import enqueue_bans, group_ban_urls, send_bans
 from website import settings
 
 logger = logging.getLogger(__name__)
@@ -59,30 +59,13 @@ def get_bannable_urls(instance):
     return bannable_urls, parsed_absolute_url.hostname
 
 
+def enqueue_ban(instance):
+    """Queue bans for `instance` to be coalesced with the rest of the request's bans."""
+    if settings.ENABLE_VARNISH:
+        enqueue_bans(*get_bannable_urls(instance))
+
+
 @app.task(max_retries=5, default_retry_delay=60)
 def ban_url(instance):
-    # TODO: Refactor; Pull url generation into postcommit_task handling so we only ban urls once per request
-    timeout = 0.3  # 300ms timeout for bans
     if settings.ENABLE_VARNISH:
-        bannable_urls, hostname = get_bannable_urls(instance)
-
-        for url_to_ban in set(bannable_urls):
-            try:
-                response = requests.request('BAN', url_to_ban, timeout=timeout, headers=dict(
-                    Host=hostname
-                ))
-            except Exception as ex:
-                logger.error('Banning {} failed: {}'.format(
-                    url_to_ban,
-                    ex.message
-                ))
-            else:
-                if not response.ok:
-                    logger.error('Banning {} failed: {}'.format(
-                        url_to_ban,
-                        response.text
-                    ))
-                else:
-                    logger.info('Banning {} succeeded'.format(
-                        url_to_ban
-                    ))
+        send_bans(group_ban_urls(*get_bannable_urls(instance)))
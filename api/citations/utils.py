@@ -1,11 +1,17 @@
+import hashlib
+import json
 import os
 import re
+import threading
 import httplib as http
+from collections import OrderedDict
 
 from citeproc import CitationStylesStyle, CitationStylesBibliography
 from citeproc import Citation, CitationItem
 from citeproc import formatter
 from citeproc.source.json import CiteProcJSON
+from django.conf import settings as django_settings
+from django.core.cache import caches
 
 from framework.exceptions import HTTPError
 from framework.auth import utils
@@ -73,42 +79,133 @@ def process_name(node, user):
     }
 
 
-def render_citation(node, style='apa'):
-    """Given a node, return a citation"""
-    reformat_styles = ['apa', 'chicago-author-date', 'modern-language-association']
-    csl = None
-    if isinstance(node, PreprintService):
-        csl = preprint_csl(node, node.node)
-        data = [csl, ]
-    else:
-        data = [node.csl, ]
+# Parsed styles, least recently used first: style id -> ParsedStyle
+_styles = OrderedDict()
+_styles_lock = threading.Lock()
 
-    bib_source = CiteProcJSON(data)
 
-    custom = CUSTOM_CITATIONS.get(style, False)
-    path = os.path.join(BASE_PATH, 'static', custom) if custom else os.path.join(CITATION_STYLES_PATH, style)
+class ParsedStyle(object):
+    """A parsed CSL style, and the file and modification time it was parsed from."""
+
+    def __init__(self, path, mtime, style):
+        self.path = path
+        self.mtime = mtime
+        self.style = style
+        # citeproc-py keeps rendering state on the style
+        self.lock = threading.Lock()
+
+    def is_current(self):
+        try:
+            return os.path.getmtime(self.path) == self.mtime
+        except OSError:
+            return False
+
+
+def style_file(path):
+    """The file `CitationStylesStyle` reads for `path`."""
+    return path if os.path.exists(path) else '{}.csl'.format(path)
 
-    try:
-        bib_style = CitationStylesStyle(path, validate=False)
-    except ValueError:
+
+def get_style(style):
+    """The parsed CSL style `style`, or the independent style it depends on. Styles are
+    kept in an LRU cache of `CITATION_STYLE_CACHE_SIZE` styles, and parsed again when their
+    file changes.
+
+    :raises ValueError: If the style can't be found
+    """
+    with _styles_lock:
+        parsed = _styles.pop(style, None)
+        if parsed is not None:
+            _styles[style] = parsed
+    if parsed is not None and parsed.is_current():
+        return parsed
+
+    custom = CUSTOM_CITATIONS.get(style, False)
+    path = style_file(os.path.join(BASE_PATH, 'static', custom) if custom else os.path.join(CITATION_STYLES_PATH, style))
+    if not os.path.exists(path):
         citation_style = CitationStyle.load(style)
         if citation_style is not None and citation_style.has_parent_style:
-            parent_style = citation_style.parent_style
-            parent_path = os.path.join(CITATION_STYLES_PATH, parent_style)
-            bib_style = CitationStylesStyle(parent_path, validate=False)
+            path = style_file(os.path.join(CITATION_STYLES_PATH, citation_style.parent_style))
         else:
             raise ValueError('Unable to find a dependent or independent parent style related to {}.csl'.format(style))
+    mtime = os.path.getmtime(path)
+    parsed = ParsedStyle(path, mtime, CitationStylesStyle(path, validate=False))
+
+    with _styles_lock:
+        _styles.pop(style, None)
+        _styles[style] = parsed
+        while len(_styles) > django_settings.CITATION_STYLE_CACHE_SIZE:
+            _styles.popitem(last=False)
+    return parsed
+
+
+def clear_style_cache():
+    with _styles_lock:
+        _styles.clear()
+
+
+def get_citation_cache():
+    return caches[django_settings.CITATION_CACHE]
+
+
+def citation_cache_key(csl, style):
+    """Citations only depend on the CSL data of the node, and the style."""
+    digest = hashlib.sha256(json.dumps(csl, sort_keys=True, default=unicode)).hexdigest()
+    return u'citation:{}:{}'.format(style, digest)
+
+
+def citation_data(node):
+    """The CSL data of a node or preprint."""
+    if isinstance(node, PreprintService):
+        return preprint_csl(node, node.node)
+    return node.csl
+
+
+def render_citation(node, style='apa'):
+    """Given a node, return a citation"""
+    return _render_cached(node, citation_data(node), style)
+
+
+def render_citation_styles(node, styles):
+    """Render the citation of one node or preprint in each of `styles`.
+
+    :return dict: Style -> citation
+    """
+    csl = citation_data(node)
+    return {style: _render_cached(node, csl, style) for style in styles}
+
+
+def render_citations(nodes, style='apa'):
+    """Render the citations of several nodes or preprints in one style, in order."""
+    return [_render_cached(node, citation_data(node), style) for node in nodes]
+
+
+def _render_cached(node, csl, style):
+    cache = get_citation_cache()
+    key = citation_cache_key(csl, style)
+    cit = cache.get(key)
+    if cit is None:
+        cit = _render(node, csl, style)
+        cache.set(key, cit, django_settings.CITATION_CACHE_TIMEOUT)
+    return cit
+
+
+def _render(node, csl, style):
+    reformat_styles = ['apa', 'chicago-author-date', 'modern-language-association']
+    bib_source = CiteProcJSON([csl, ])
+    parsed = get_style(style)
 
-    bibliography = CitationStylesBibliography(bib_style, bib_source, formatter.plain)
+    with parsed.lock:
+        bibliography = CitationStylesBibliography(parsed.style, bib_source, formatter.plain)
 
-    citation = Citation([CitationItem(node._id)])
+        citation = Citation([CitationItem(node._id)])
 
-    bibliography.register(citation)
+        bibliography.register(citation)
 
-    bib = bibliography.bibliography()
+        bib = bibliography.bibliography()
     cit = unicode(bib[0] if len(bib) else '')
 
-    title = csl['title'] if csl else node.csl['title']
+    title = csl['title']
     title = title.rstrip('.')
     if cit.count(title) == 1:
         i = cit.index(title)
@@ -0,0 +1,87 @@
+import mock
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.base.settings.defaults import API_BASE
+from api.caching import embeds
+from osf.models import NodeLog
+from osf_tests.factories import (
+    AuthUserFactory,
+    NodeFactory,
+    ProjectFactory,
+)
+
+
+@pytest.fixture(autouse=True)
+def shared_embed_cache():
+    # The tests run in one process, so the locmem cache is as good as a shared one
+    with mock.patch('api.caching.embeds.is_shared_cache', return_value=True):
+        embeds.get_cache().clear()
+        yield
+
+
+@pytest.mark.django_db
+class TestEmbedCache:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def project(self, user):
+        return ProjectFactory(is_public=True, creator=user)
+
+    @pytest.fixture()
+    def url(self, project):
+        return '/{}nodes/{}/?embed=children'.format(API_BASE, project._id)
+
+    def test_anonymous_embeds_are_shared(self, app, url):
+        first = app.get(url)
+        second = app.get(url)
+        assert first.json['data']['embeds'] == second.json['data']['embeds']
+        stats = embeds.get_embed_cache_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['hit_ratio'] == 0.5
+
+    def test_authenticated_embeds_are_not_shared(self, app, url, user):
+        app.get(url, auth=user.auth)
+        app.get(url, auth=user.auth)
+        assert embeds.get_embed_cache_stats()['hits'] == 0
+
+    def test_query_string_is_part_of_key(self, app, url):
+        app.get(url)
+        app.get('{}&page[size]=1'.format(url))
+        assert embeds.get_embed_cache_stats()['hits'] == 0
+
+    def test_new_child_invalidates_embed(self, app, url, project, user):
+        res = app.get(url)
+        assert res.json['data']['embeds']['children']['data'] == []
+
+        child = NodeFactory(parent=project, creator=user, is_public=True)
+        res = app.get(url)
+        assert [each['id'] for each in res.json['data']['embeds']['children']['data']] == [child._id]
+
+    def test_private_child_invalidates_embed(self, app, url, project, user):
+        child = NodeFactory(parent=project, creator=user, is_public=True)
+        res = app.get(url)
+        assert [each['id'] for each in res.json['data']['embeds']['children']['data']] == [child._id]
+
+        child.is_public = False
+        child.save()
+        res = app.get(url)
+        assert res.json['data']['embeds']['children']['data'] == []
+
+    def test_other_models_do_not_invalidate(self, project, user):
+        generation = embeds.get_cache().get('embed-gen:osf.abstractnode:{}'.format(project.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            embeds.invalidate_embed_cache(NodeLog.objects.filter(node=project).first())
+        assert len(ctx.captured_queries) == 0
+        assert embeds.get_cache().get('embed-gen:osf.abstractnode:{}'.format(project.pk)) == generation
+
+    def test_per_process_cache_is_not_used(self, app, url):
+        with mock.patch('api.caching.embeds.is_shared_cache', return_value=False):
+            app.get(url)
+            app.get(url)
+        assert embeds.get_embed_cache_stats()['hits'] == 0
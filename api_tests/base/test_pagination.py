@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from nose.tools import *  # flake8: noqa
 
+from api_tests.utils import create_test_file
+from framework.auth.core import Auth
+from osf.models import NodeLog
 from osf_tests import factories
 from tests.base import ApiTestCase
 
@@ -54,3 +57,84 @@ class TestJSONAPIPagination(ApiTestCase):
         assert_not_in('meta', links)
         assert_in('total', meta)
         assert_in('per_page', meta)
+
+
+class TestCursorPagination(ApiTestCase):
+
+    def setUp(self):
+        super(TestCursorPagination, self).setUp()
+        self.user = factories.AuthUserFactory()
+        self.nodes = [factories.ProjectFactory(creator=self.user) for i in range(5)]
+        self.url = '/{}nodes/?version=2.1&page[size]=2&page[cursor]='.format(settings.API_BASE)
+
+    def test_pages_follow_modified_ordering(self):
+        expected = [node._id for node in sorted(self.nodes, key=lambda node: (node.modified, node.id), reverse=True)]
+        ids = []
+        res = self.app.get(self.url, auth=self.user.auth)
+        assert_is_none(res.json['links']['prev'])
+        assert_is_none(res.json['meta']['total'])
+        while True:
+            ids.extend(each['id'] for each in res.json['data'])
+            if not res.json['links']['next']:
+                break
+            res = self.app.get(res.json['links']['next'], auth=self.user.auth)
+        assert_equal(ids, expected)
+
+        # Walk back from the last page
+        res = self.app.get(res.json['links']['prev'], auth=self.user.auth)
+        assert_equal([each['id'] for each in res.json['data']], expected[2:4])
+
+    def test_last_link(self):
+        res = self.app.get(self.url, auth=self.user.auth)
+        res = self.app.get(res.json['links']['last'], auth=self.user.auth)
+        assert_equal(len(res.json['data']), 2)
+        assert_is_none(res.json['links']['next'])
+        assert_true(res.json['links']['prev'])
+
+    def test_estimated_total(self):
+        res = self.app.get('{}&page[total]=estimate'.format(self.url), auth=self.user.auth)
+        assert_is_instance(res.json['meta']['total'], int)
+
+    def test_invalid_cursor(self):
+        res = self.app.get('{}garbage'.format(self.url), auth=self.user.auth, expect_errors=True)
+        assert_equal(res.status_code, 400)
+        assert_equal(res.json['errors'][0]['source'], {'parameter': 'page[cursor]'})
+
+    def walk(self, url):
+        """The ids on every page of `url`, following the next links."""
+        ids = []
+        res = self.app.get(url, auth=self.user.auth)
+        while True:
+            ids.extend(each['id'] for each in res.json['data'])
+            if not res.json['links']['next']:
+                return ids
+            res = self.app.get(res.json['links']['next'], auth=self.user.auth)
+
+    def test_logs_with_null_dates(self):
+        node = self.nodes[0]
+        for i in range(4):
+            node.set_title('Title {}'.format(i), auth=Auth(self.user), save=True)
+        logs = list(node.get_aggregate_logs_queryset(Auth(self.user)))
+        undated = sorted(logs[1::2], key=lambda log: log.id, reverse=True)
+        dated = sorted(logs[::2], key=lambda log: (log.date, log.id), reverse=True)
+        NodeLog.objects.filter(id__in=[log.id for log in undated]).update(date=None)
+        # Ordered by -date: NULL first
+        expected = [log._id for log in undated + dated]
+
+        url = '/{}nodes/{}/logs/?page[size]=2&page[cursor]='.format(settings.API_BASE, node._id)
+        assert_equal(self.walk(url), expected)
+
+        res = self.app.get(url, auth=self.user.auth)
+        res = self.app.get(res.json['links']['next'], auth=self.user.auth)
+        res = self.app.get(res.json['links']['prev'], auth=self.user.auth)
+        assert_equal([each['id'] for each in res.json['data']], expected[:2])
+
+    def test_files(self):
+        node = self.nodes[0]
+        for i in range(5):
+            create_test_file(node, self.user, filename='file{}'.format(i))
+        root = node.get_addon('osfstorage').get_root()
+        expected = list(root.children.order_by('_materialized_path', 'id').values_list('_id', flat=True))
+
+        url = '/{}nodes/{}/files/osfstorage/?page[size]=2&page[cursor]='.format(settings.API_BASE, node._id)
+        assert_equal(self.walk(url), expected)
@@ -46,6 +46,18 @@ def override_settings():
     website_settings.BCRYPT_LOG_ROUNDS = 1
     # Make sure we don't accidentally send any emails
     website_settings.SENDGRID_API_KEY = None
+    # Write counters immediately, so tests can read them back
+    website_settings.COUNTER_FLUSH_INTERVAL = 0
+    # Worker processes can't see data in the test transaction
+    website_settings.SITEMAP_WORKERS = 1
+    # Send to SHARE immediately, as the SHARE tests expect
+    website_settings.SHARE_OUTBOX_ENABLED = False
+    # CAS responses are mocked per test
+    website_settings.CAS_TOKEN_CACHE_ENABLED = False
+    # Permissions change within tests
+    website_settings.WATERBUTLER_AUTH_CACHE_TIMEOUT = 0
+    # Sessions and passwords are changed in the database directly
+    website_settings.SESSION_CACHE_ENABLED = False
 
 
 @pytest.fixture()
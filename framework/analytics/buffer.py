@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Write-behind buffer for counters.
+
+Incrementing a counter row on every page view or download serializes concurrent
+requests on its row lock. Instead, increments are summed in memory per process and
+written in bulk by a background thread every ``settings.COUNTER_FLUSH_INTERVAL``
+seconds, so each counter row is written at most once per interval per process.
+Increments still in the buffer when a process dies are lost.
+
+With an interval of 0, every increment is written immediately by the caller.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connections
+
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer(object):
+    """Sums tuples of increments by key and passes them to `flush_func`, a callable
+    taking {key: (increment, ...)}, when flushed.
+    """
+
+    def __init__(self, name, flush_func, width):
+        self.name = name
+        self.flush_func = flush_func
+        self.width = width
+        self._counts = self._new_counts()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def _new_counts(self):
+        return defaultdict(lambda: [0] * self.width)
+
+    def add(self, key, increments):
+        with self._lock:
+            counts = self._counts[key]
+            for i, increment in enumerate(increments):
+                counts[i] += increment
+            size = len(self._counts)
+        if not settings.COUNTER_FLUSH_INTERVAL:
+            self.flush()
+            return
+        self._ensure_flusher()
+        if size >= settings.COUNTER_BUFFER_MAX_KEYS:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return {key: tuple(counts) for key, counts in self._counts.items()}
+
+    def flush(self):
+        """Write buffered counts. Counts that failed to be written are kept for the next flush.
+
+        :return int: Number of keys written
+        """
+        with self._lock:
+            counts, self._counts = self._counts, self._new_counts()
+        if not counts:
+            return 0
+        start = time.time()
+        try:
+            self.flush_func({key: tuple(values) for key, values in counts.items()})
+        except Exception:
+            logger.exception('Failed to flush {} {} counter(s)'.format(len(counts), self.name))
+            with self._lock:
+                for key, values in counts.items():
+                    for i, value in enumerate(values):
+                        self._counts[key][i] += value
+            return 0
+        logger.debug('Flushed {} {} counter(s) in {:.3f}s'.format(len(counts), self.name, time.time() - start))
+        return len(counts)
+
+    def _ensure_flusher(self):
+        # Buffers and threads are not inherited by forked processes
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                self._counts = self._new_counts()
+            self._pid = pid
+        thread = threading.Thread(target=self._run, name='{}-counter-flusher'.format(self.name))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.COUNTER_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # This thread's connection is not closed by request handling
+                connections.close_all()
+
+
+_buffers = []
+
+def register(name, flush_func, width):
+    buffer = CounterBuffer(name, flush_func, width)
+    _buffers.append(buffer)
+    return buffer
+
+@atexit.register
+def flush_all():
+    for buffer in _buffers:
+        buffer.flush()
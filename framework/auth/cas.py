@@ -1,19 +1,33 @@
 # -*- coding: utf-8 -*-
 
 import furl
+import hashlib
 import httplib as http
 import json
+import os
+import threading
 import urllib
 
+from django.core.cache import caches
 from lxml import etree
 import requests
+from requests.adapters import HTTPAdapter
 
 from framework.auth import authenticate, external_first_login_authenticate
 from framework.auth.core import get_user, generate_verification_key
 from framework.flask import redirect
 from framework.exceptions import HTTPError
+from framework.utils import is_shared_cache
 from website import settings
 
+#: Django cache of CAS profiles of OAuth2 access tokens, see `CasClient.profile`
+TOKEN_CACHE = 'cas_tokens'
+TOKEN_GENERATION_KEY = 'cas-token-generation'
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
 
 class CasError(HTTPError):
     """General CAS-related error."""
@@ -114,7 +128,7 @@ class CasClient(object):
         url.args['ticket'] = ticket
         url.args['service'] = service_url
 
-        resp = requests.get(url.url)
+        resp = get_session().get(url.url)
         if resp.status_code == 200:
             return self._parse_service_validation(resp.content)
         else:
@@ -124,19 +138,46 @@ class CasClient(object):
         """
         Send request to get profile information, given an access token.
 
+        Profiles are cached for `CAS_TOKEN_CACHE_TIMEOUT` seconds, and tokens CAS
+        rejects for `CAS_TOKEN_CACHE_NEGATIVE_TIMEOUT` seconds, keyed on a hash of the
+        token. Revoking a token with `revoke_tokens` evicts it.
+
         :param str access_token: CAS access_token.
         :rtype: CasResponse
         :raises: CasError if an unexpected response is returned.
         """
 
+        cache = get_token_cache()
+        key = token_cache_key(access_token) if cache else None
+        cached = cache.get(key) if cache else None
+        if isinstance(cached, CasResponse):
+            cached.attributes['accessToken'] = access_token
+            return cached
+        elif cached:
+            code, content = cached
+            raise CasHTTPError(code=code, message='Unexpected response from CAS server', headers={}, content=content)
+
         url = self.get_profile_url()
         headers = {
             'Authorization': 'Bearer {}'.format(access_token),
         }
-        resp = requests.get(url, headers=headers)
+        resp = get_session().get(url, headers=headers)
         if resp.status_code == 200:
-            return self._parse_profile(resp.content, access_token)
+            cas_resp = self._parse_profile(resp.content, access_token)
+            if cache:
+                # Don't store the token itself
+                attributes = dict(cas_resp.attributes)
+                attributes.pop('accessToken')
+                cache.set(
+                    key,
+                    CasResponse(cas_resp.authenticated, cas_resp.status, cas_resp.user, attributes),
+                    settings.CAS_TOKEN_CACHE_TIMEOUT,
+                )
+            return cas_resp
         else:
+            # Invalid, expired or revoked token, unless CAS is throttling (429)
+            if cache and 400 <= resp.status_code < 500 and resp.status_code != 429:
+                cache.set(key, (resp.status_code, resp.content), settings.CAS_TOKEN_CACHE_NEGATIVE_TIMEOUT)
             self._handle_error(resp)
 
     def _handle_error(self, response, message='Unexpected response from CAS server'):
@@ -179,10 +220,13 @@ class CasClient(object):
         return self.revoke_tokens(payload={'client_id': client_id, 'client_secret': client_secret})
 
     def revoke_tokens(self, payload):
-        """Revoke a tokens based on payload"""
+        """Revoke a tokens based on payload, and evict them from the token cache"""
         url = self.get_auth_token_revocation_url()
 
-        resp = requests.post(url, data=payload)
+        try:
+            resp = get_session().post(url, data=payload)
+        finally:
+            evict_tokens(payload.get('token'))
         if resp.status_code == 204:
             return True
         else:
@@ -212,6 +256,55 @@ def get_client():
     return CasClient(settings.CAS_SERVER_URL)
 
 
+def get_session():
+    """Keep-alive session to CAS, shared by the clients of this process."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            # Connections are not shared with forked processes
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.CAS_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+            _session_pid = os.getpid()
+    return _session
+
+
+def get_token_cache():
+    """The cache of access token profiles, or `None` if disabled. Revoking a token must
+    evict it for every process, so a per-process cache is never used.
+    """
+    if not (settings.CAS_TOKEN_CACHE_ENABLED and is_shared_cache(TOKEN_CACHE)):
+        return None
+    return caches[TOKEN_CACHE]
+
+
+def token_cache_key(access_token):
+    """Key of `access_token` in the token cache, in the current generation of tokens."""
+    if isinstance(access_token, unicode):
+        access_token = access_token.encode('utf-8')
+    generation = caches[TOKEN_CACHE].get(TOKEN_GENERATION_KEY, 0)
+    return 'cas-token:{}:{}'.format(generation, hashlib.sha256(access_token).hexdigest())
+
+
+def evict_tokens(access_token=None):
+    """Evict `access_token` from the token cache, or every token, e.g. when all the
+    tokens of an application are revoked. Every token is evicted by starting a new
+    generation of keys, as clearing a shared cache would clear the other caches in it.
+    """
+    cache = get_token_cache()
+    if not cache:
+        return
+    if access_token:
+        cache.delete(token_cache_key(access_token))
+        return
+    try:
+        cache.incr(TOKEN_GENERATION_KEY)
+    except ValueError:
+        cache.set(TOKEN_GENERATION_KEY, 1, None)
+
+
 def get_login_url(*args, **kwargs):
     """
     Convenience function for getting a login URL for a service.
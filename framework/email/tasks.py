@@ -1,5 +1,11 @@
+import atexit
+import os
 import smtplib
+import socket
 import logging
+import threading
+import time
+from collections import defaultdict
 from email.mime.text import MIMEText
 
 from framework.celery_tasks import app
@@ -17,7 +23,9 @@ def send_email(from_addr, to_addr, subject, message, mimetype='html', ttls=True,
     Email is sent from the email specified in FROM_EMAIL settings in the
     settings module.
 
-    Uses the Sendgrid API if ``settings.SENDGRID_API_KEY`` is set.
+    Uses the Sendgrid API if ``settings.SENDGRID_API_KEY`` is set. SMTP connections are
+    taken from, and returned to, `smtp_pool`, so a worker sending many messages in a
+    row only connects and logs in once.
 
     :param from_addr: A string, the sender email
     :param to_addr: A string, the recipient
@@ -43,9 +51,10 @@ def send_email(from_addr, to_addr, subject, message, mimetype='html', ttls=True,
             categories=categories,
             attachment_name=attachment_name,
             attachment_content=attachment_content,
+            client=_get_sendgrid_client(),
         )
     else:
-        return _send_with_smtp(
+        return _send_with_pooled_smtp(
             from_addr=from_addr,
             to_addr=to_addr,
             subject=subject,
@@ -58,18 +67,14 @@ def send_email(from_addr, to_addr, subject, message, mimetype='html', ttls=True,
         )
 
 
-def _send_with_smtp(from_addr, to_addr, subject, message, mimetype='html', ttls=True, login=True, username=None, password=None):
+def open_smtp_connection(ttls=True, login=True, username=None, password=None):
+    """Connect, and log in, to ``settings.MAIL_SERVER``. Returns None if credentials are missing."""
     username = username or settings.MAIL_USERNAME
     password = password or settings.MAIL_PASSWORD
 
     if login and (username is None or password is None):
         logger.error('Mail username and password not set; skipping send.')
-        return
-
-    msg = MIMEText(message, mimetype, _charset='utf-8')
-    msg['Subject'] = subject
-    msg['From'] = from_addr
-    msg['To'] = to_addr
+        return None
 
     s = smtplib.SMTP(settings.MAIL_SERVER)
     s.ehlo()
@@ -78,12 +83,27 @@ def _send_with_smtp(from_addr, to_addr, subject, message, mimetype='html', ttls=
         s.ehlo()
     if login:
         s.login(username, password)
+    return s
+
+
+def _send_with_smtp(from_addr, to_addr, subject, message, mimetype='html', ttls=True, login=True, username=None, password=None, connection=None):
+    """Send over `connection`, which is left open, or over a new connection for this message only."""
+    s = connection or open_smtp_connection(ttls=ttls, login=login, username=username, password=password)
+    if s is None:
+        return
+
+    msg = MIMEText(message, mimetype, _charset='utf-8')
+    msg['Subject'] = subject
+    msg['From'] = from_addr
+    msg['To'] = to_addr
+
     s.sendmail(
         from_addr=from_addr,
         to_addrs=[to_addr],
         msg=msg.as_string()
     )
-    s.quit()
+    if connection is None:
+        s.quit()
     return True
 
 
@@ -119,3 +139,179 @@ def _send_with_sendgrid(from_addr, to_addr, subject, message, mimetype='html', c
         sentry.log_message(
             'SENDGRID_WHITELIST_MODE is True. Failed to send emails to non-whitelisted recipient {}.'.format(to_addr)
         )
+
+
+class SMTPConnectionPool(object):
+    """Open SMTP connections, by server and credentials, that are not in use.
+
+    Connections are reused most recently released first. Servers drop connections that
+    sit idle, so ones idle for longer than ``settings.MAIL_POOL_IDLE_TIMEOUT`` seconds are
+    closed instead of reused, and at most ``settings.MAIL_POOL_MAX_IDLE`` are kept per key.
+    """
+
+    def __init__(self):
+        self._idle = defaultdict(list)  # key -> [(connection, released at)]
+        self._keys = {}  # id(connection) -> key
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        # Connections are not shared with forked processes, e.g. celery workers
+        if self._pid != os.getpid():
+            self._idle, self._keys, self._pid = defaultdict(list), {}, os.getpid()
+
+    def acquire(self, ttls=True, login=True, username=None, password=None):
+        """An idle or new connection. Returns None if credentials are missing."""
+        username = username or settings.MAIL_USERNAME
+        password = password or settings.MAIL_PASSWORD
+        key = (settings.MAIL_SERVER, ttls, login, username, password)
+        expired = []
+        connection = None
+        with self._lock:
+            self._check_pid()
+            idle = self._idle[key]
+            while idle:
+                candidate, released = idle.pop()
+                if time.time() - released < settings.MAIL_POOL_IDLE_TIMEOUT:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+        for each in expired:
+            self._close(each)
+        if connection is None:
+            connection = open_smtp_connection(ttls=ttls, login=login, username=username, password=password)
+            if connection is not None:
+                with self._lock:
+                    self._keys[id(connection)] = key
+        return connection
+
+    def release(self, connection):
+        """Return a connection that is fit for reuse."""
+        with self._lock:
+            key = self._keys.get(id(connection))
+            if key is not None and len(self._idle[key]) < settings.MAIL_POOL_MAX_IDLE:
+                self._idle[key].append((connection, time.time()))
+                return
+            self._keys.pop(id(connection), None)
+        self._close(connection)
+
+    def discard(self, connection):
+        """Close a connection that may be broken."""
+        with self._lock:
+            self._keys.pop(id(connection), None)
+        self._close(connection)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle, self._keys = self._idle, defaultdict(list), {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, socket.error):
+            connection.close()
+
+
+smtp_pool = SMTPConnectionPool()
+atexit.register(smtp_pool.close_all)
+
+
+def _send_with_pooled_smtp(ttls=True, login=True, username=None, password=None, **kwargs):
+    """`_send_with_smtp` over a connection from `smtp_pool`."""
+    for attempt in range(2):
+        connection = smtp_pool.acquire(ttls=ttls, login=login, username=username, password=password)
+        if connection is None:
+            return
+        try:
+            ret = _send_with_smtp(connection=connection, **kwargs)
+        except smtplib.SMTPServerDisconnected:
+            smtp_pool.discard(connection)
+            # Servers drop idle or long-lived connections, reconnect once
+            if attempt:
+                raise
+            continue
+        except smtplib.SMTPResponseException:
+            # The server refused this message, the connection is fine
+            smtp_pool.release(connection)
+            raise
+        except Exception:
+            smtp_pool.discard(connection)
+            raise
+        smtp_pool.release(connection)
+        return ret
+
+
+_sendgrid = threading.local()
+
+def _get_sendgrid_client():
+    """A SendGrid client for this thread, reused while the API key does not change."""
+    if getattr(_sendgrid, 'api_key', None) != settings.SENDGRID_API_KEY:
+        _sendgrid.client = sendgrid.SendGridClient(settings.SENDGRID_API_KEY)
+        _sendgrid.api_key = settings.SENDGRID_API_KEY
+    return _sendgrid.client
+
+
+class BatchMailer(object):
+    """Drop-in replacement for `send_email` when sending many messages in a row, e.g. as
+    the `mailer` of `website.mails.send_mail`. Sends synchronously, over pooled
+    connections, from any number of threads, and counts what it sent. Call `close` when
+    done to log the throughput of the batch.
+    """
+
+    def __init__(self, name='batch'):
+        self.name = name
+        self.sent = 0
+        self.failed = 0
+        self._started = None
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+        try:
+            ret = send_email(**kwargs)
+        except Exception:
+            self._count(False)
+            raise
+        self._count(ret)
+        return ret
+
+    def _count(self, ok):
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def stats(self):
+        elapsed = time.time() - self._started if self._started is not None else 0
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'seconds': elapsed,
+            'per_second': self.sent / elapsed if elapsed else 0,
+        }
+
+    def close(self):
+        stats = self.stats()
+        logger.info('Mail batch {}: sent {} message(s), {} failed, in {:.1f}s ({:.1f}/s)'.format(
+            self.name, stats['sent'], stats['failed'], stats['seconds'], stats['per_second']
+        ))
+        return stats
+
+
+def send_batch(messages, name='batch'):
+    """Send `messages`, an iterable of `send_email` keyword arguments, one after another.
+    They all go over the same pooled connection unless it drops.
+
+    :return list: The result of `send_email` for each message
+    """
+    mailer = BatchMailer(name)
+    try:
+        return [mailer(**message) for message in messages]
+    finally:
+        mailer.close()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Request-scoped coalescing of Varnish BAN requests.
+
+URLs queued with `enqueue_bans` during a request are collected per Varnish host,
+collapsed into as few regex bans as possible and sent in parallel over pooled
+keep-alive sessions by `flush_ban_queue`, which runs from `postcommit_after_request`.
+Outside of a request (postcommit greenlets with their own locals, celery tasks,
+scripts) there is nothing to flush the queue, so bans are sent right away.
+
+The regex of a ban is sent in the ``X-Ban-Url`` header rather than in the URL, where
+``requests`` would percent-encode or split it; Varnish bans on that header.
+"""
+import logging
+import threading
+import time
+import urlparse
+from collections import Counter, OrderedDict
+
+import requests
+from gevent.pool import Pool
+from requests.adapters import HTTPAdapter
+
+from website import settings
+
+_local = threading.local()
+_sessions = {}
+_sessions_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+#: Cumulative BAN counters for this process: `sent`, `failed` and `seconds`
+metrics = Counter()
+
+
+def ban_queue():
+    if not hasattr(_local, 'ban_queue'):
+        _local.ban_queue = OrderedDict()
+    return _local.ban_queue
+
+def start_ban_queue():
+    """Collect bans until `flush_ban_queue`, rather than sending them right away."""
+    _local.ban_queue = OrderedDict()
+    _local.collecting = True
+
+def clear_ban_queue():
+    _local.ban_queue = OrderedDict()
+    _local.collecting = False
+
+def group_ban_urls(urls, hostname, queue=None):
+    """Add `<scheme>://<varnish netloc><path>.*` ban urls, as built by
+    `api.caching.tasks.get_bannable_urls`, to `queue`, a mapping of
+    (varnish base url, hostname) to a set of paths.
+    """
+    queue = OrderedDict() if queue is None else queue
+    for url in urls:
+        parsed = urlparse.urlparse(url)
+        base = '{}://{}'.format(parsed.scheme, parsed.netloc)
+        path = parsed.path[:-2] if parsed.path.endswith('.*') else parsed.path
+        queue.setdefault((base, hostname), set()).add(path)
+    return queue
+
+def enqueue_bans(urls, hostname):
+    """Queue ban urls to be coalesced and sent once the current request completes, or
+    send them now outside of a request.
+    """
+    if getattr(_local, 'collecting', False):
+        group_ban_urls(urls, hostname, ban_queue())
+    elif settings.ENABLE_VARNISH:
+        send_bans(group_ban_urls(urls, hostname))
+
+def coalesce_paths(paths, max_patterns=None):
+    """Collapse path prefixes into a minimal list of `.*`-terminated regexes.
+
+    Paths covered by a shorter queued prefix are dropped, and sibling paths that only
+    differ in their last segment are merged into a single alternation, e.g.
+    `/v2/nodes/abc12/` and `/v2/nodes/def34/` become `/v2/nodes/(?:abc12|def34)/.*`.
+    """
+    max_patterns = max_patterns or settings.VARNISH_BAN_MAX_PATTERNS
+    kept = []
+    for path in sorted(set(paths)):
+        if kept and path.startswith(kept[-1]):
+            continue
+        kept.append(path)
+
+    groups = OrderedDict()
+    for path in kept:
+        trailing = '/' if path.endswith('/') else ''
+        prefix, _, segment = path.rstrip('/').rpartition('/')
+        if not segment:
+            groups.setdefault((path, ''), []).append('')
+            continue
+        groups.setdefault((prefix + '/', trailing), []).append(segment)
+
+    patterns = []
+    for (prefix, trailing), segments in groups.items():
+        for i in range(0, len(segments), max_patterns):
+            chunk = segments[i:i + max_patterns]
+            alternation = chunk[0] if len(chunk) == 1 else '(?:{})'.format('|'.join(chunk))
+            patterns.append('{}{}{}.*'.format(prefix, alternation, trailing))
+    return patterns
+
+def get_session(base):
+    with _sessions_lock:
+        if base not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.VARNISH_BAN_CONCURRENCY)
+            session.mount(base, adapter)
+            _sessions[base] = session
+        return _sessions[base]
+
+def _send_ban(base, hostname, pattern):
+    try:
+        response = get_session(base).request('BAN', '{}/'.format(base), timeout=settings.VARNISH_BAN_TIMEOUT, headers={
+            'Host': hostname,
+            'X-Ban-Url': pattern,
+        })
+    except Exception as ex:
+        logger.error('Banning {} on {} failed: {}'.format(pattern, base, ex))
+        return False
+    if not response.ok:
+        logger.error('Banning {} on {} failed: {}'.format(pattern, base, response.text))
+        return False
+    return True
+
+def send_bans(queue):
+    """Send the bans in `queue`, a mapping of (varnish base url, hostname) to paths.
+    Returns a tuple of (number sent, number failed).
+    """
+    bans = [
+        (base, hostname, pattern)
+        for (base, hostname), paths in queue.items()
+        for pattern in coalesce_paths(paths)
+    ]
+    if not bans:
+        return 0, 0
+
+    start = time.time()
+    pool = Pool(settings.VARNISH_BAN_CONCURRENCY * max(len(queue), 1))
+    results = pool.map(lambda ban: _send_ban(*ban), bans)
+    elapsed = time.time() - start
+
+    failed = results.count(False)
+    metrics['sent'] += len(bans)
+    metrics['failed'] += failed
+    metrics['seconds'] += elapsed
+    logger.info('Sent {} bans for {} paths to {} hosts in {:.0f}ms, {} failed'.format(
+        len(bans), sum(len(paths) for paths in queue.values()),
+        len(set(base for base, _ in queue)), elapsed * 1000, failed
+    ))
+    return len(bans), failed
+
+def flush_ban_queue():
+    queue = ban_queue()
+    clear_ban_queue()
+    if settings.ENABLE_VARNISH:
+        return send_bans(queue)
+    return 0, 0
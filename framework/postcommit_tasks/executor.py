@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Shared, bounded greenlet pool for postcommit tasks.
+
+Rather than creating a pool per request, every request submits its postcommit tasks
+to one executor per gevent hub (i.e. per process when monkey patched, per thread
+otherwise), which caps the number of concurrently running tasks, and so the number
+of DB connections they hold, at `settings.POSTCOMMIT_POOL_SIZE`.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+import gevent
+from gevent.pool import Pool
+
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+#: Upper bounds, in seconds, of the task latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+_executors = {}
+_executors_lock = threading.Lock()
+_histograms = defaultdict(Counter)
+_histograms_lock = threading.Lock()
+
+
+def task_name(func):
+    func = getattr(func, 'func', func)  # unwrap functools.partial
+    return '{}.{}'.format(getattr(func, '__module__', None), getattr(func, '__name__', repr(func)))
+
+def record_latency(name, seconds):
+    bucket = LATENCY_BUCKETS[bisect.bisect_left(LATENCY_BUCKETS, seconds)]
+    with _histograms_lock:
+        _histograms[name][bucket] += 1
+
+def get_latency_histograms():
+    """Return {task name: {bucket upper bound: count}} for every task run in this process."""
+    with _histograms_lock:
+        return {name: dict(counts) for name, counts in _histograms.items()}
+
+def reset_latency_histograms():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class PostcommitExecutor(object):
+
+    def __init__(self, size, max_queue_depth):
+        self.pool = Pool(size)
+        self.max_queue_depth = max_queue_depth
+        self.waiting = 0
+        self.ran_inline = 0
+
+    def _run(self, func):
+        start = time.time()
+        try:
+            return func()
+        finally:
+            record_latency(task_name(func), time.time() - start)
+
+    def submit(self, func):
+        """Run `func` on the pool and return its greenlet.
+
+        Spawning blocks while the pool is full. Once `max_queue_depth` submissions are
+        already waiting for a slot, `func` runs in the caller instead and None is returned,
+        so a backlog slows requests down rather than growing without bound.
+        """
+        if self.waiting >= self.max_queue_depth:
+            self.ran_inline += 1
+            logger.warning('Postcommit queue depth {} reached, running {} inline'.format(self.waiting, task_name(func)))
+            self._run(func)
+            return None
+        self.waiting += 1
+        try:
+            return self.pool.spawn(self._run, func)
+        finally:
+            self.waiting -= 1
+
+    def run_all(self, funcs, timeout=None):
+        """Submit `funcs` and wait up to `timeout` seconds for them, reraising the first error."""
+        greenlets = [greenlet for greenlet in (self.submit(func) for func in funcs) if greenlet is not None]
+        gevent.joinall(greenlets, timeout=timeout, raise_error=True)
+        return greenlets
+
+
+def get_executor():
+    hub = gevent.get_hub()
+    with _executors_lock:
+        if hub not in _executors:
+            _executors[hub] = PostcommitExecutor(
+                settings.POSTCOMMIT_POOL_SIZE,
+                settings.POSTCOMMIT_MAX_QUEUE_DEPTH,
+            )
+        return _executors[hub]
@@ -10,8 +10,10 @@ import os
 
 from celery.canvas import Signature
 from celery.local import PromiseProxy
-from gevent.pool import Pool
 
+from framework.celery_tasks import app
+from framework.postcommit_tasks.bans import clear_ban_queue, flush_ban_queue, start_ban_queue
+from framework.postcommit_tasks.executor import get_executor
 from website import settings
 
 _local = threading.local()
@@ -30,25 +32,30 @@ def postcommit_celery_queue():
 def postcommit_before_request():
     _local.postcommit_queue = OrderedDict()
     _local.postcommit_celery_queue = OrderedDict()
+    start_ban_queue()
 
 def postcommit_after_request(response, base_status_error_code=500):
     if response.status_code >= base_status_error_code:
         _local.postcommit_queue = OrderedDict()
         _local.postcommit_celery_queue = OrderedDict()
+        clear_ban_queue()
         return response
     try:
         if postcommit_queue():
-            number_of_threads = 30  # one db connection per greenlet, let's share
-            pool = Pool(number_of_threads)
-            for func in postcommit_queue().values():
-                pool.spawn(func)
-            pool.join(timeout=5.0, raise_error=True)  # 5 second timeout and reraise exceptions
+            # Reraises the first exception
+            get_executor().run_all(postcommit_queue().values(), timeout=settings.POSTCOMMIT_TIMEOUT)
+
+        # Bans are sent after other postcommit tasks; those that run in this thread may
+        # queue more of them, others send theirs as they go
+        flush_ban_queue()
 
         if postcommit_celery_queue():
             if settings.USE_CELERY:
-                for task_dict in postcommit_celery_queue().values():
-                    task = Signature.from_dict(task_dict)
-                    task.apply_async()
+                # Publish every task over a single broker connection
+                with app.producer_or_acquire() as producer:
+                    for task_dict in postcommit_celery_queue().values():
+                        task = Signature.from_dict(task_dict)
+                        task.apply_async(producer=producer)
             else:
                 for task in postcommit_celery_queue().values():
                     task()
@@ -15,6 +15,7 @@ from weakref import WeakKeyDictionary
 from werkzeug.local import LocalProxy
 
 from framework.flask import redirect
+from framework.sessions.cache import get_basic_auth_user, last_login_update_due, load_session
 from framework.sessions.utils import remove_session
 from website import settings
 
@@ -115,7 +116,6 @@ session = LocalProxy(get_session)
 # NOTE: This gets attached in website.app.init_app to ensure correct callback order
 def before_request():
     # TODO: Fix circular import
-    from framework.auth.core import get_user
     from framework.auth import cas
     from framework.utils import throttle_period_expired
     Session = apps.get_model('osf.Session')
@@ -129,12 +129,11 @@ def before_request():
         return cas.make_response_from_ticket(ticket=ticket, service_url=service_url.url)
 
     if request.authorization:
-        user = get_user(
-            email=request.authorization.username,
-            password=request.authorization.password
+        user = get_basic_auth_user(
+            request.authorization.username,
+            request.authorization.password
         )
-        # Create an empty session
-        # TODO: Shoudn't need to create a session for Basic Auth
+        # Create an empty session for this request only, no cookie refers to it
         user_session = Session()
         set_session(user_session)
 
@@ -148,9 +147,7 @@ def before_request():
                     return
             user_session.data['auth_user_username'] = user.username
             user_session.data['auth_user_fullname'] = user.fullname
-            if user_session.data.get('auth_user_id', None) != user._primary_key:
-                user_session.data['auth_user_id'] = user._primary_key
-                user_session.save()
+            user_session.data['auth_user_id'] = user._primary_key
         else:
             # Invalid key: Not found in database
             user_session.data['auth_error_code'] = http.UNAUTHORIZED
@@ -160,16 +157,17 @@ def before_request():
     if cookie:
         try:
             session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie)
-            user_session = Session.load(session_id) or Session(_id=session_id)
+            user_session = load_session(session_id) or Session(_id=session_id)
         except itsdangerous.BadData:
             return
         if not throttle_period_expired(user_session.created, settings.OSF_SESSION_TIMEOUT):
             # Update date last login when making non-api requests
-            if user_session.data.get('auth_user_id') and 'api' not in request.url:
+            user_id = user_session.data.get('auth_user_id')
+            if user_id and 'api' not in request.url and last_login_update_due(user_id):
                 OSFUser = apps.get_model('osf.OSFUser')
                 (
                     OSFUser.objects
-                    .filter(guids___id__isnull=False, guids___id=user_session.data['auth_user_id'])
+                    .filter(guids___id__isnull=False, guids___id=user_id)
                     # Throttle updates
                     .filter(Q(date_last_login__isnull=True) | Q(date_last_login__lt=timezone.now() - dt.timedelta(seconds=settings.DATE_LAST_LOGIN_THROTTLE)))
                 ).update(date_last_login=timezone.now())
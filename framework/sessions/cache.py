@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Caches in front of the ``osf.Session`` table.
+
+Sessions are read from a small per-process LRU, then from the ``SESSION_CACHE`` django
+cache, and only then from the database. ``Session.save`` writes through to both tiers,
+and only writes to the database when the data of the session changed. Both tiers are
+only used when ``SESSION_CACHE`` is shared between processes (e.g. redis): removing a
+session, e.g. logging out, must evict it for every process. The local tier does not see
+changes made by other processes, so its entries expire after
+``SESSION_CACHE_LOCAL_TIMEOUT`` seconds.
+
+Verified basic auth credentials are remembered in ``SESSION_CACHE`` for
+``BASIC_AUTH_CACHE_TIMEOUT`` seconds, so the password hash is not checked on every request.
+The user is still loaded on every request, so this is safe with a per-process cache.
+"""
+import copy
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.cache import caches
+
+from framework.utils import is_shared_cache
+from website import settings
+
+# Session id -> (expiration, field values), least recently used first
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def is_enabled():
+    """Whether sessions are cached; never with a per-process ``SESSION_CACHE``."""
+    return settings.SESSION_CACHE_ENABLED and is_shared_cache(settings.SESSION_CACHE)
+
+
+def get_cache():
+    return caches[settings.SESSION_CACHE]
+
+
+def cache_key(session_id):
+    return 'session:{}'.format(session_id)
+
+
+def _field_names():
+    Session = apps.get_model('osf.Session')
+    return [field.attname for field in Session._meta.concrete_fields]
+
+
+def _values(session):
+    return tuple(getattr(session, name) for name in _field_names())
+
+
+def _build(values):
+    Session = apps.get_model('osf.Session')
+    return Session.from_db(Session.objects.db, _field_names(), copy.deepcopy(values))
+
+
+def _get_local(session_id):
+    if not settings.SESSION_CACHE_LOCAL_TIMEOUT:
+        return None
+    with _local_lock:
+        entry = _local.pop(session_id, None)
+        if entry is None or entry[0] < time.time():
+            return None
+        _local[session_id] = entry
+        return entry[1]
+
+
+def _set_local(session_id, values):
+    if not settings.SESSION_CACHE_LOCAL_TIMEOUT:
+        return
+    with _local_lock:
+        _local.pop(session_id, None)
+        _local[session_id] = (time.time() + settings.SESSION_CACHE_LOCAL_TIMEOUT, values)
+        while len(_local) > settings.SESSION_CACHE_LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def load_session(session_id):
+    """The session `session_id`, or `None` if there is none.
+
+    Each call returns a new ``Session``; changes to its data are only shared once saved.
+    """
+    Session = apps.get_model('osf.Session')
+    if not is_enabled():
+        return Session.load(session_id)
+    values = _get_local(session_id)
+    if values is None:
+        values = get_cache().get(cache_key(session_id))
+        if values is None:
+            session = Session.load(session_id)
+            if session is not None:
+                cache_session(session)
+            return session
+        _set_local(session_id, values)
+    return _build(values)
+
+
+def cache_session(session):
+    """Store a saved session in both tiers."""
+    if not is_enabled():
+        return
+    values = _values(session)
+    get_cache().set(cache_key(session._id), values, settings.SESSION_CACHE_TIMEOUT)
+    _set_local(session._id, copy.deepcopy(values))
+
+
+def evict_sessions(session_ids):
+    """Drop sessions deleted from the database from both tiers."""
+    get_cache().delete_many([cache_key(session_id) for session_id in session_ids])
+    with _local_lock:
+        for session_id in session_ids:
+            _local.pop(session_id, None)
+
+
+def clear_session_cache():
+    get_cache().clear()
+    with _local_lock:
+        _local.clear()
+
+
+def credentials_key(username, password):
+    raw = repr((username.strip().lower(), password.strip()))
+    return 'basic-auth:{}'.format(hmac.new(settings.SECRET_KEY, raw, hashlib.sha256).hexdigest())
+
+
+def get_basic_auth_user(username, password):
+    """``get_user(email=username, password=password)``, skipping the password check for
+    credentials verified in the last ``BASIC_AUTH_CACHE_TIMEOUT`` seconds. Changing the
+    password of the user invalidates them.
+    """
+    from framework.auth.core import get_user
+    if not (settings.SESSION_CACHE_ENABLED and settings.BASIC_AUTH_CACHE_TIMEOUT):
+        return get_user(email=username, password=password)
+
+    OSFUser = apps.get_model('osf.OSFUser')
+    key = credentials_key(username, password)
+    cached = get_cache().get(key)
+    if cached:
+        user_id, password_digest = cached
+        user = OSFUser.objects.filter(id=user_id).first()
+        if user and user.password and hashlib.sha256(user.password).hexdigest() == password_digest:
+            return user
+
+    user = get_user(email=username, password=password)
+    if user:
+        password_digest = hashlib.sha256(user.password).hexdigest()
+        get_cache().set(key, (user.id, password_digest), settings.BASIC_AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def last_login_update_due(user_id):
+    """Whether ``date_last_login`` of the user `user_id` may need an update; true at most
+    once per ``DATE_LAST_LOGIN_THROTTLE`` seconds, across processes if ``SESSION_CACHE``
+    is shared.
+    """
+    if not settings.SESSION_CACHE_ENABLED:
+        return True
+    return get_cache().add('last-login:{}'.format(user_id), True, settings.DATE_LAST_LOGIN_THROTTLE)
@@ -9,9 +9,13 @@ def remove_sessions_for_user(user):
     :return:
     """
     from osf.models import Session
+    from framework.sessions.cache import evict_sessions
 
     if user._id:
-        Session.objects.filter(data__auth_user_id=user._id).delete()
+        sessions = Session.objects.filter(data__auth_user_id=user._id)
+        session_ids = list(sessions.values_list('_id', flat=True))
+        sessions.delete()
+        evict_sessions(session_ids)
 
 
 def remove_session(session):
@@ -22,4 +26,6 @@ def remove_session(session):
     :return:
     """
     from osf.models import Session
+    from framework.sessions.cache import evict_sessions
     Session.objects.filter(id=session.id).delete()
+    evict_sessions([session._id])
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import re
 import pytz
+import threading
 import time
 from datetime import datetime
 from django.utils import timezone
@@ -47,3 +48,39 @@ def throttle_period_expired(timestamp, throttle):
             return (timezone.now() - timestamp.replace(tzinfo=pytz.utc)).total_seconds() > throttle
     else:
         return (get_timestamp() - timestamp) > throttle
+
+
+class RateLimiter(object):
+    """Spaces calls to `wait`, from any number of threads, at least 1 / `rate` seconds
+    apart. A falsy rate disables it.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            slot = now if self._next is None else max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Django cache backends that keep their entries in each process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias):
+    """Whether the django cache `alias` is shared between processes (e.g. redis), so that
+    evicting an entry in one process evicts it for all of them.
+    """
+    from django.conf import settings as django_settings
+    return django_settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
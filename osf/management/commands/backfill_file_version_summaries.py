@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Fills in BaseFileNode.latest_version, earliest_version and version_count for files created
+# before those fields existed. New and changed files are kept up to date by signal listeners.
+
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from osf.models import BaseFileNode
+from osf.models.files import update_version_summaries
+from scripts import utils as script_utils
+
+logger = logging.getLogger(__name__)
+
+def backfill_file_version_summaries(batch_size=10000):
+    total = 0
+    while True:
+        # Files without versions are summarized with a count of 0, so every batch makes progress
+        file_ids = list(BaseFileNode.objects.filter(version_count__isnull=True).values_list('id', flat=True)[:batch_size])
+        if not file_ids:
+            break
+        with transaction.atomic():
+            total += update_version_summaries(file_ids)
+        logger.info('Summarized versions of {} files.'.format(total))
+    return total
+
+
+class Command(BaseCommand):
+    """
+    Backfill the version summary fields used by the osfstorage file listing.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Run backfill and roll back changes to db',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, dest='batch_size', help='Files to update per transaction')
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if not dry_run:
+            script_utils.add_file_logger(logger, __file__)
+            # Each batch is committed on its own
+            backfill_file_version_summaries(batch_size=options['batch_size'])
+            return
+        with transaction.atomic():
+            backfill_file_version_summaries(batch_size=options['batch_size'])
+            raise RuntimeError('Dry run, transaction rolled back.')
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Builds and checks osf_nodeclosure, the ancestor/descendant table for non-link NodeRelations.
+# Migration 0134 fills the table; this rebuilds it if it gets out of sync, and `--verify` can
+# be run at any time.
+
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from osf.models import NodeClosure, NodeRelation
+from scripts import utils as script_utils
+
+logger = logging.getLogger(__name__)
+
+# Every (ancestor, descendant, depth) triple reachable through non-link relations.
+# `path` guards against cycles in bad data.
+EXPECTED_CLOSURE_SQL = """
+    WITH RECURSIVE closure AS (
+        SELECT
+            parent_id AS ancestor_id,
+            child_id AS descendant_id,
+            1 AS depth,
+            ARRAY[parent_id, child_id] AS path
+        FROM "{noderelation}"
+        WHERE is_node_link IS FALSE
+    UNION ALL
+        SELECT
+            C.ancestor_id,
+            R.child_id,
+            C.depth + 1,
+            C.path || R.child_id
+        FROM closure AS C
+            JOIN "{noderelation}" AS R ON R.parent_id = C.descendant_id
+        WHERE R.is_node_link IS FALSE
+            AND NOT R.child_id = ANY(C.path)
+    ) SELECT ancestor_id, descendant_id, MIN(depth) AS depth
+    FROM closure
+    GROUP BY ancestor_id, descendant_id
+"""
+
+BACKFILL_SQL = """
+    INSERT INTO "{closure}" (ancestor_id, descendant_id, depth)
+    {expected}
+    ON CONFLICT (ancestor_id, descendant_id) DO UPDATE SET depth = EXCLUDED.depth;
+"""
+
+VERIFY_SQL = """
+    WITH expected AS ({expected}),
+    actual AS (SELECT ancestor_id, descendant_id, depth FROM "{closure}")
+    SELECT
+        (SELECT COUNT(*) FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual) AS missing),
+        (SELECT COUNT(*) FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected) AS extra);
+"""
+
+def _format(sql):
+    expected = EXPECTED_CLOSURE_SQL.format(noderelation=NodeRelation._meta.db_table)
+    return sql.format(closure=NodeClosure._meta.db_table, expected=expected)
+
+def backfill_node_closure():
+    with connection.cursor() as cursor:
+        cursor.execute(_format(BACKFILL_SQL))
+        logger.info('Upserted {} closure rows.'.format(cursor.rowcount))
+
+def verify_node_closure():
+    """Return a tuple of (missing, extra) closure row counts."""
+    with connection.cursor() as cursor:
+        cursor.execute(_format(VERIFY_SQL))
+        missing, extra = cursor.fetchone()
+    if missing or extra:
+        logger.error('Node closure is out of sync: {} missing rows, {} extra rows.'.format(missing, extra))
+    else:
+        logger.info('Node closure is in sync.')
+    return missing, extra
+
+
+class Command(BaseCommand):
+    """
+    Backfill (and optionally verify) the NodeClosure table from NodeRelation.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Run backfill and roll back changes to db',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            dest='verify_only',
+            help='Only compare the closure table against NodeRelation, making no changes',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        verify_only = options.get('verify_only', False)
+        if verify_only:
+            verify_node_closure()
+            return
+        if not dry_run:
+            script_utils.add_file_logger(logger, __file__)
+        with transaction.atomic():
+            backfill_node_closure()
+            missing, extra = verify_node_closure()
+            if extra:
+                logger.warn('Extra rows are not removed by the backfill; inspect them manually.')
+            if dry_run:
+                raise RuntimeError('Dry run, transaction rolled back.')
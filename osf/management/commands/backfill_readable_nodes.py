@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Builds osf_readablenode from osf_contributor and osf_nodeclosure.
+# Migration 0135 fills the table; this adds rows missing from it. Implicit admin rows are
+# derived from the closure table, so rebuild that first with `backfill_node_closure` if needed.
+
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from osf.models import Contributor, NodeClosure, ReadableNode
+from scripts import utils as script_utils
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_SQL = """
+    INSERT INTO "{readable}" (user_id, node_id, source)
+        SELECT user_id, node_id, '{contributor}'
+        FROM "{contributor_table}"
+        WHERE read IS TRUE
+    UNION
+        SELECT C.user_id, NC.descendant_id, '{implicit_admin}'
+        FROM "{closure_table}" AS NC
+            JOIN "{contributor_table}" AS C ON C.node_id = NC.ancestor_id
+        WHERE C.admin IS TRUE
+    ON CONFLICT (user_id, node_id, source) DO NOTHING;
+"""
+
+def backfill_readable_nodes():
+    with connection.cursor() as cursor:
+        cursor.execute(BACKFILL_SQL.format(
+            readable=ReadableNode._meta.db_table,
+            contributor_table=Contributor._meta.db_table,
+            closure_table=NodeClosure._meta.db_table,
+            contributor=ReadableNode.CONTRIBUTOR,
+            implicit_admin=ReadableNode.IMPLICIT_ADMIN,
+        ))
+        logger.info('Inserted {} readable node rows.'.format(cursor.rowcount))
+
+
+class Command(BaseCommand):
+    """
+    Backfill the ReadableNode table used by AbstractNodeQuerySet.can_view.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Run backfill and roll back changes to db',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if not dry_run:
+            script_utils.add_file_logger(logger, __file__)
+        with transaction.atomic():
+            backfill_readable_nodes()
+            if dry_run:
+                raise RuntimeError('Dry run, transaction rolled back.')
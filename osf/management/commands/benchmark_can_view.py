@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Compares the query plans of the recursive-CTE implementation of AbstractNodeQuerySet.can_view
+# against the ReadableNode semi-join on a synthetic dataset. Everything runs in a transaction that
+# is rolled back, so this is safe to run against a local or staging database.
+
+from __future__ import print_function, unicode_literals
+import logging
+import time
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+
+from osf.models import AbstractNode, Contributor, Node, NodeRelation
+from osf.management.commands.backfill_node_closure import backfill_node_closure
+from osf.management.commands.backfill_readable_nodes import backfill_readable_nodes
+
+logger = logging.getLogger(__name__)
+
+SEED_NODES_SQL = """
+    CREATE TEMPORARY TABLE synthetic_node (id integer PRIMARY KEY, n integer) ON COMMIT DROP;
+    WITH inserted AS (
+        INSERT INTO "{abstractnode}" ({columns})
+        SELECT {select_columns}
+        FROM "{abstractnode}" AS T, generate_series(1, %(count)s) AS S(i)
+        WHERE T.id = %(template_id)s
+        RETURNING id
+    ) INSERT INTO synthetic_node SELECT id, row_number() OVER (ORDER BY id) - 1 FROM inserted;
+"""
+
+# Two level trees: every `fanout`th node is a root and the following nodes are its components
+SEED_RELATIONS_SQL = """
+    INSERT INTO "{noderelation}" (_id, created, modified, is_node_link, parent_id, child_id, _order)
+    SELECT substr(md5(random()::text), 1, 24), now(), now(), FALSE, P.id, C.id, C.n %% %(fanout)s
+    FROM synthetic_node AS C
+        JOIN synthetic_node AS P ON P.n = C.n - C.n %% %(fanout)s
+    WHERE C.n %% %(fanout)s <> 0;
+"""
+
+SEED_CONTRIBUTORS_SQL = """
+    INSERT INTO "{contributor}" (read, write, admin, visible, user_id, node_id, _order)
+    SELECT TRUE, TRUE, n %% (%(fanout)s * %(admin_every)s) = 0, TRUE, %(user_id)s, id, 0
+    FROM synthetic_node
+    WHERE n %% %(contributor_every)s = 0 OR n %% (%(fanout)s * %(admin_every)s) = 0
+    ON CONFLICT DO NOTHING;
+"""
+
+def legacy_can_view(user_id):
+    """The pre-ReadableNode implementation of AbstractNodeQuerySet.can_view, kept for comparison."""
+    qs = AbstractNode.objects.filter(is_public=True)
+    sqs = Contributor.objects.filter(node=models.OuterRef('pk'), user__id=user_id, read=True)
+    qs |= AbstractNode.objects.annotate(can_view=models.Exists(sqs)).filter(can_view=True)
+    qs |= AbstractNode.objects.extra(where=["""
+        "osf_abstractnode".id in (
+            WITH RECURSIVE implicit_read AS (
+                SELECT "osf_contributor"."node_id"
+                FROM "osf_contributor"
+                WHERE "osf_contributor"."user_id" = %s
+                AND "osf_contributor"."admin" is TRUE
+            UNION ALL
+                SELECT "osf_noderelation"."child_id"
+                FROM "implicit_read"
+                LEFT JOIN "osf_noderelation" ON "osf_noderelation"."parent_id" = "implicit_read"."node_id"
+                WHERE "osf_noderelation"."is_node_link" IS FALSE
+            ) SELECT * FROM implicit_read
+        )
+    """], params=(user_id, ))
+    return qs
+
+def seed(template, count, fanout, contributor_every, admin_every):
+    columns = [f.column for f in AbstractNode._meta.concrete_fields if not f.primary_key]
+    select_columns = [
+        '(random() < 0.1)' if column == 'is_public' else 'T."{}"'.format(column)
+        for column in columns
+    ]
+    params = {
+        'count': count,
+        'template_id': template.id,
+        'fanout': fanout,
+        'contributor_every': contributor_every,
+        'admin_every': admin_every,
+        'user_id': template.creator_id,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(SEED_NODES_SQL.format(
+            abstractnode=AbstractNode._meta.db_table,
+            columns=', '.join('"{}"'.format(c) for c in columns),
+            select_columns=', '.join(select_columns),
+        ), params)
+        cursor.execute(SEED_RELATIONS_SQL.format(noderelation=NodeRelation._meta.db_table), params)
+        cursor.execute(SEED_CONTRIBUTORS_SQL.format(contributor=Contributor._meta.db_table), params)
+    backfill_node_closure()
+    backfill_readable_nodes()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+def explain(queryset):
+    sql, params = queryset.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        start = time.time()
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return plan, time.time() - start
+
+
+class Command(BaseCommand):
+    """
+    Compare legacy and ReadableNode-backed can_view query plans on synthetic data.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--nodes', type=int, default=1000000, help='Number of synthetic nodes to create')
+        parser.add_argument('--fanout', type=int, default=10, help='Nodes per synthetic project (root + components)')
+        parser.add_argument('--contributor-every', type=int, default=500, dest='contributor_every',
+                            help='Make the benchmark user a contributor on every nth node')
+        parser.add_argument('--admin-every', type=int, default=100, dest='admin_every',
+                            help='Make the benchmark user an admin on every nth root')
+
+    def handle(self, *args, **options):
+        template = Node.objects.filter(is_deleted=False).exclude(creator=None).first()
+        if template is None:
+            raise RuntimeError('At least one node is required to use as a template.')
+        with transaction.atomic():
+            start = time.time()
+            seed(template, options['nodes'], options['fanout'], options['contributor_every'], options['admin_every'])
+            logger.info('Seeded {} nodes in {:.1f}s'.format(options['nodes'], time.time() - start))
+            for name, queryset in (
+                ('legacy', legacy_can_view(template.creator_id)),
+                ('readable_node', AbstractNode.objects.can_view(user=template.creator_id)),
+            ):
+                plan, elapsed = explain(queryset)
+                print('===== {} ({:.3f}s) =====\n{}\n'.format(name, elapsed, plan))
+            transaction.set_rollback(True)
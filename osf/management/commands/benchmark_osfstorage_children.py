@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Compares the osfstorage children listing that aggregates versions per file against the one
+# reading the version summary on BaseFileNode, on a synthetic folder. Everything runs in a
+# transaction that is rolled back, so this is safe to run against a local or staging database.
+
+from __future__ import print_function, unicode_literals
+import logging
+import time
+
+import django
+django.setup()
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from addons.osfstorage.models import OsfStorageFile, OsfStorageFolder
+from addons.osfstorage.views import GET_CHILDREN_SQL
+from osf.models import BaseFileNode, FileVersion, OSFUser
+from osf.models.files import update_version_summaries
+
+logger = logging.getLogger(__name__)
+
+# The version fields of GET_CHILDREN_SQL before they were summarized on BaseFileNode
+LEGACY_VERSION_COUNT = "(SELECT COUNT(*) FROM osf_basefilenode_versions WHERE osf_basefilenode_versions.basefilenode_id = F.id)"
+LEGACY_VERSION_JOINS = """
+        LEFT JOIN LATERAL (
+            SELECT * FROM osf_fileversion
+            JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
+            WHERE osf_basefilenode_versions.basefilenode_id = F.id
+            ORDER BY created DESC
+            LIMIT 1
+        ) LATEST_VERSION ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT * FROM osf_fileversion
+            JOIN osf_basefilenode_versions ON osf_fileversion.id = osf_basefilenode_versions.fileversion_id
+            WHERE osf_basefilenode_versions.basefilenode_id = F.id
+            ORDER BY created ASC
+            LIMIT 1
+        ) EARLIEST_VERSION ON TRUE
+"""
+
+def legacy_children_sql():
+    summary_joins = """
+        LEFT JOIN osf_fileversion AS LATEST_VERSION ON LATEST_VERSION.id = F.latest_version_id
+        LEFT JOIN osf_fileversion AS EARLIEST_VERSION ON EARLIEST_VERSION.id = F.earliest_version_id
+"""
+    assert summary_joins in GET_CHILDREN_SQL, 'GET_CHILDREN_SQL changed, update the legacy query'
+    return GET_CHILDREN_SQL.replace(
+        summary_joins, LEGACY_VERSION_JOINS
+    ).replace(
+        'COALESCE(F.version_count, 0)', LEGACY_VERSION_COUNT
+    ).replace(
+        'LATEST_VERSION.id\n', 'LATEST_VERSION.fileversion_id\n'
+    )
+
+def seed(root, user, files, versions_per_file):
+    folder = root.append_folder('benchmark-{}'.format(int(time.time())))
+    BaseFileNode.objects.bulk_create([
+        OsfStorageFile.create(name='file-{}'.format(i), target=root.target, parent=folder, path='/file-{}'.format(i))
+        for i in range(files)
+    ], batch_size=1000)
+    file_ids = list(folder._children.values_list('id', flat=True))
+    versions = FileVersion.objects.bulk_create([
+        FileVersion(identifier=str(n + 1), creator=user, size=1024 * n, location={'object': 'benchmark'}, metadata={'md5': 'benchmark'})
+        for _ in file_ids
+        for n in range(versions_per_file)
+    ], batch_size=1000)
+    Through = BaseFileNode.versions.through
+    Through.objects.bulk_create([
+        Through(basefilenode_id=file_id, fileversion_id=version.id)
+        for i, file_id in enumerate(file_ids)
+        for version in versions[i * versions_per_file:(i + 1) * versions_per_file]
+    ], batch_size=1000)
+    # bulk_create skips the m2m signals
+    update_version_summaries(file_ids)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return folder
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        start = time.time()
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return plan, time.time() - start
+
+
+class Command(BaseCommand):
+    """
+    Compare the per-file version aggregates and the version summary in the osfstorage children listing.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--files', type=int, default=10000, help='Number of files in the synthetic folder')
+        parser.add_argument('--versions', type=int, default=3, help='Number of versions per file')
+
+    def handle(self, *args, **options):
+        root = OsfStorageFolder.objects.filter(is_root=True).first()
+        user = OSFUser.objects.filter(is_active=True).first()
+        if root is None or user is None:
+            raise RuntimeError('At least one osfstorage root folder and one active user are required.')
+        with transaction.atomic():
+            start = time.time()
+            folder = seed(root, user, options['files'], options['versions'])
+            logger.info('Seeded {} files in {:.1f}s'.format(options['files'], time.time() - start))
+            params = [
+                ContentType.objects.get_for_model(OSFUser).id,
+                root.target._id,
+                user.id,
+                user.id,
+                user._id,
+                user._id,
+                folder.id,
+            ]
+            for name, sql in (
+                ('legacy', legacy_children_sql()),
+                ('version_summary', GET_CHILDREN_SQL),
+            ):
+                plan, elapsed = explain(sql, params)
+                print('===== {} ({:.3f}s) =====\n{}\n'.format(name, elapsed, plan))
+            transaction.set_rollback(True)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Measures how many WaterButler authorizations a single worker serves per second through
+# addons.base.views.get_auth, without and with the payload cache, and through get_auth_batch.
+# Everything runs in a transaction that is rolled back, so this is safe to run against a local
+# or staging database.
+
+from __future__ import print_function, unicode_literals
+import datetime
+import logging
+import time
+
+import django
+django.setup()
+
+import itsdangerous
+import jwe
+import jwt
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from addons.base.views import WATERBUTLER_JWE_KEY, get_auth_cache
+from osf.models import Node, Session
+from website import settings
+from website.app import init_app
+
+logger = logging.getLogger(__name__)
+
+def build_payload(data):
+    return jwe.encrypt(jwt.encode({
+        'data': data,
+        'exp': timezone.now() + datetime.timedelta(seconds=settings.WATERBUTLER_JWT_EXPIRATION),
+    }, settings.WATERBUTLER_JWT_SECRET, algorithm=settings.WATERBUTLER_JWT_ALGORITHM), WATERBUTLER_JWE_KEY)
+
+def run(client, url, payload, count):
+    """Send `count` requests and return the requests per second."""
+    start = time.time()
+    for _ in range(count):
+        res = client.get(url, query_string={'payload': payload})
+        assert res.status_code == 200, res.data
+    return count / (time.time() - start)
+
+
+class Command(BaseCommand):
+    """
+    Report WaterButler authorizations per second for one worker.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+        parser.add_argument('--batch-size', type=int, default=50, dest='batch_size',
+                            help='Actions per get_auth_batch request')
+
+    def handle(self, *args, **options):
+        node = Node.objects.filter(is_deleted=False).exclude(creator=None).first()
+        if node is None:
+            raise RuntimeError('At least one node is required.')
+        app = init_app(routes=True, set_backends=True)
+        client = app.test_client()
+        count = options['requests']
+        with transaction.atomic():
+            session = Session(data={'auth_user_id': node.creator._id})
+            session.save()
+            action = {
+                'action': 'download',
+                'nid': node._id,
+                'provider': 'osfstorage',
+            }
+            cookie = itsdangerous.Signer(settings.SECRET_KEY).sign(session._id)
+            single = build_payload(dict(action, cookie=cookie))
+            batch = build_payload({'requests': [action] * options['batch_size'], 'cookie': cookie})
+
+            timeout = settings.WATERBUTLER_AUTH_CACHE_TIMEOUT
+            try:
+                settings.WATERBUTLER_AUTH_CACHE_TIMEOUT = 0
+                uncached = run(client, '/api/v1/files/auth/', single, count)
+                batched = run(client, '/api/v1/files/auth/batch/', batch, max(count // options['batch_size'], 1))
+                settings.WATERBUTLER_AUTH_CACHE_TIMEOUT = settings.WATERBUTLER_JWT_EXPIRATION
+                get_auth_cache().clear()
+                cached = run(client, '/api/v1/files/auth/', single, count)
+            finally:
+                settings.WATERBUTLER_AUTH_CACHE_TIMEOUT = timeout
+
+            print('get_auth, uncached: {:.1f} requests/s'.format(uncached))
+            print('get_auth, cached: {:.1f} requests/s'.format(cached))
+            print('get_auth_batch, uncached: {:.1f} requests/s, {:.1f} actions/s'.format(
+                batched, batched * options['batch_size']))
+            transaction.set_rollback(True)
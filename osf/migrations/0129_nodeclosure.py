@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-09-04 14:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0128_merge_20180829_0012'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.AbstractNode')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.AbstractNode')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='nodeclosure',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='nodeclosure',
+            index_together=set([('descendant', 'depth')]),
+        ),
+    ]
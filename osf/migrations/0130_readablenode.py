@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-09-06 16:31
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0129_nodeclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadableNode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('contributor', 'Read contributor'), ('implicit_admin', 'Admin on an ancestor')], max_length=16)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.AbstractNode')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='readablenode',
+            unique_together=set([('user', 'node', 'source')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='readablenode',
+            index_together=set([('node', 'user')]),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-09-10 14:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0130_readablenode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPageCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=300)),
+                ('date', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('unique', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyUserActivityCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_guid', models.CharField(max_length=5)),
+                ('action', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailypagecount',
+            unique_together=set([('page', 'date')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyuseractivitycount',
+            unique_together=set([('user_guid', 'action', 'date')]),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-09-12 15:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0131_daily_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basefilenode',
+            name='earliest_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='osf.FileVersion'),
+        ),
+        migrations.AddField(
+            model_name='basefilenode',
+            name='latest_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='osf.FileVersion'),
+        ),
+        migrations.AddField(
+            model_name='basefilenode',
+            name='version_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.13 on 2018-09-17 13:48
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.utils.timezone
+import osf.utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0132_file_version_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShareOutboxEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('node', 'Node or registration'), ('preprint', 'Preprint')], max_length=16)),
+                ('target_guid', models.CharField(max_length=255)),
+                ('share_type', models.CharField(blank=True, max_length=255, null=True)),
+                ('old_subjects', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('enqueued', osf.utils.fields.NonNaiveDateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', osf.utils.fields.NonNaiveDateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='shareoutboxentry',
+            unique_together=set([('target_type', 'target_guid')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Every (ancestor, descendant, depth) reachable through non-link relations, as in the
+# backfill_node_closure command. `path` guards against cycles in bad data.
+FILL_NODE_CLOSURE_SQL = """
+    WITH RECURSIVE closure AS (
+        SELECT
+            parent_id AS ancestor_id,
+            child_id AS descendant_id,
+            1 AS depth,
+            ARRAY[parent_id, child_id] AS path
+        FROM osf_noderelation
+        WHERE is_node_link IS FALSE
+    UNION ALL
+        SELECT
+            C.ancestor_id,
+            R.child_id,
+            C.depth + 1,
+            C.path || R.child_id
+        FROM closure AS C
+            JOIN osf_noderelation AS R ON R.parent_id = C.descendant_id
+        WHERE R.is_node_link IS FALSE
+            AND NOT R.child_id = ANY(C.path)
+    )
+    INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, MIN(depth)
+        FROM closure
+        GROUP BY ancestor_id, descendant_id
+    ON CONFLICT (ancestor_id, descendant_id) DO UPDATE SET depth = EXCLUDED.depth;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0133_shareoutboxentry'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FILL_NODE_CLOSURE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Read contributors, and admins of an ancestor, as in the backfill_readable_nodes command.
+# Implicit admins are derived from osf_nodeclosure, filled by 0134.
+FILL_READABLE_NODES_SQL = """
+    INSERT INTO osf_readablenode (user_id, node_id, source)
+        SELECT user_id, node_id, 'contributor'
+        FROM osf_contributor
+        WHERE read IS TRUE
+    UNION
+        SELECT C.user_id, NC.descendant_id, 'implicit_admin'
+        FROM osf_nodeclosure AS NC
+            JOIN osf_contributor AS C ON C.node_id = NC.ancestor_id
+        WHERE C.admin IS TRUE
+    ON CONFLICT (user_id, node_id, source) DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0134_fill_nodeclosure'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FILL_READABLE_NODES_SQL, migrations.RunSQL.noop),
+    ]
@@ -31,8 +31,10 @@ from osf.models.files import (  # noqa
     File, Folder,  # noqa
     FileVersion, TrashedFile, TrashedFileNode, TrashedFolder, FileVersionUserMetadata,  # noqa
 )  # noqa
-from osf.models.node_relation import NodeRelation  # noqa
-from osf.models.analytics import UserActivityCounter, PageCounter  # noqa
+from osf.models.node_relation import NodeRelation, NodeClosure  # noqa
+from osf.models.readable_node import ReadableNode  # noqa
+from osf.models.share import ShareOutboxEntry  # noqa
+from osf.models.analytics import UserActivityCounter, PageCounter, DailyPageCount, DailyUserActivityCount  # noqa
 from osf.models.admin_profile import AdminProfile  # noqa
 from osf.models.admin_log_entry import AdminLogEntry  # noqa
 from osf.models.maintenance_state import MaintenanceState  # noqa
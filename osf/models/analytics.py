@@ -1,9 +1,11 @@
 import logging
 
 from dateutil import parser
-from django.db import models, transaction
+from django.db import connection, models
 from django.utils import timezone
+from psycopg2.extras import execute_values
 
+from framework.analytics import buffer
 from framework.sessions import session
 from osf.models.base import BaseModel
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
@@ -29,29 +31,42 @@ class UserActivityCounter(BaseModel):
 
     @classmethod
     def increment(cls, user_id, action, date_string):
-        date = parser.parse(date_string).strftime('%Y/%m/%d')
-        with transaction.atomic():
-            # select_for_update locks the row but only inside a transaction
-            uac, created = cls.objects.select_for_update().get_or_create(_id=user_id)
-            if uac.total > 0:
-                uac.total += 1
-            else:
-                uac.total = 1
-            if action in uac.action:
-                uac.action[action]['total'] += 1
-                if date in uac.action[action]['date']:
-                    uac.action[action]['date'][date] += 1
-                else:
-                    uac.action[action]['date'][date] = 1
-            else:
-                uac.action[action] = dict(total=1, date={date: 1})
-            if date in uac.date:
-                uac.date[date]['total'] += 1
-            else:
-                uac.date[date] = dict(total=1)
-            uac.save()
+        date = parser.parse(date_string).date()
+        activity_buffer.add((user_id, action, date), (1, ))
         return True
 
+    @classmethod
+    def flush_counts(cls, counts):
+        """Add buffered {(user guid, action, date): (count, )} to the daily rows and the totals."""
+        now = timezone.now()
+        totals = {}
+        for (user_guid, action, date), (count, ) in counts.items():
+            totals[user_guid] = totals.get(user_guid, 0) + count
+        with connection.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO "{daily}" (user_guid, action, date, total) VALUES %s
+                ON CONFLICT (user_guid, action, date) DO UPDATE SET total = "{daily}".total + EXCLUDED.total
+            """.format(daily=DailyUserActivityCount._meta.db_table), [
+                (user_guid, action, date, count) for (user_guid, action, date), (count, ) in sorted(counts.items())
+            ])
+            execute_values(cursor, """
+                INSERT INTO "{counter}" (_id, action, date, total, created, modified) VALUES %s
+                ON CONFLICT (_id) DO UPDATE SET total = "{counter}".total + EXCLUDED.total, modified = EXCLUDED.modified
+            """.format(counter=cls._meta.db_table), [
+                (user_guid, '{}', '{}', total, now, now) for user_guid, total in sorted(totals.items())
+            ])
+
+
+class DailyUserActivityCount(models.Model):
+    """Number of times a user performed an action on a day, written by `UserActivityCounter.flush_counts`."""
+    user_guid = models.CharField(max_length=5)  # UserActivityCounter._id
+    action = models.CharField(max_length=255)
+    date = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user_guid', 'action', 'date')
+
 
 class PageCounter(BaseModel):
     primary_identifier_name = '_id'
@@ -73,67 +88,72 @@ class PageCounter(BaseModel):
 
     @classmethod
     def update_counter(cls, page, node_info):
+        """Count a visit of `page` by the current session. The counts are buffered,
+        so they are only visible once flushed.
+        """
         cleaned_page = cls.clean_page(page)
         date = timezone.now()
         date_string = date.strftime('%Y/%m/%d')
         visited_by_date = session.data.get('visited_by_date', {'date': date_string, 'pages': []})
 
-        with transaction.atomic():
-            model_instance, created = cls.objects.select_for_update().get_or_create(_id=cleaned_page)
-
-            # if they visited something today
-            if date_string == visited_by_date['date']:
-                # if they haven't visited this page today
-                if cleaned_page not in visited_by_date['pages']:
-                    # if the model_instance has today in it
-                    if date_string in model_instance.date.keys():
-                        # increment the number of unique visitors for today
-                        model_instance.date[date_string]['unique'] += 1
-                    else:
-                        # set the number of unique visitors for today to 1
-                        model_instance.date[date_string] = dict(unique=1)
-            # if they haven't visited something today
-            else:
-                # set their visited by date to blank
-                visited_by_date['date'] = date_string
-                visited_by_date['pages'] = []
-                # if the model_instance has today in it
-                if date_string in model_instance.date.keys():
-                    # increment the number of unique visitors for today
-                    model_instance.date[date_string]['unique'] += 1
-                else:
-                    # set the number of unique visitors to 1
-                    model_instance.date[date_string] = dict(unique=1)
-
-            # update their sessions
-            visited_by_date['pages'].append(cleaned_page)
-            session.data['visited_by_date'] = visited_by_date
-
-            if date_string in model_instance.date.keys():
-                if 'total' not in model_instance.date[date_string].keys():
-                    model_instance.date[date_string].update(total=0)
-                model_instance.date[date_string]['total'] += 1
-            else:
-                model_instance.date[date_string] = dict(total=1)
-
-            # if a download counter is being updated, only perform the update
-            # if the user who is downloading isn't a contributor to the project
-            page_type = cleaned_page.split(':')[0]
-            if page_type in ('download', 'view') and node_info:
-                if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
-                    model_instance.save()
-                    return
-
-            visited = session.data.get('visited', [])
-            if page not in visited:
-                model_instance.unique += 1
-                visited.append(page)
-                session.data['visited'] = visited
-
-            session.save()
-            model_instance.total += 1
-
-            model_instance.save()
+        # if they haven't visited something today
+        if date_string != visited_by_date['date']:
+            # set their visited by date to blank
+            visited_by_date['date'] = date_string
+            visited_by_date['pages'] = []
+        # count them as a unique visitor for today if they haven't visited this page today
+        day_unique = int(cleaned_page not in visited_by_date['pages'])
+
+        # update their sessions
+        visited_by_date['pages'].append(cleaned_page)
+        session.data['visited_by_date'] = visited_by_date
+
+        # if a download counter is being updated, only perform the update
+        # if the user who is downloading isn't a contributor to the project
+        page_type = cleaned_page.split(':')[0]
+        if page_type in ('download', 'view') and node_info:
+            if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
+                page_counter_buffer.add((cleaned_page, date.date()), (1, day_unique, 0, 0))
+                return
+
+        visited = session.data.get('visited', [])
+        unique = int(page not in visited)
+        if unique:
+            visited.append(page)
+            session.data['visited'] = visited
+
+        session.save()
+        page_counter_buffer.add((cleaned_page, date.date()), (1, day_unique, 1, unique))
+
+    @classmethod
+    def flush_counts(cls, counts):
+        """Add buffered {(page, date): (day total, day unique, total, unique)} to the daily
+        rows and to the totals read by `get_basic_counters`.
+        """
+        now = timezone.now()
+        totals = {}
+        for (page, date), (_, _, total, unique) in counts.items():
+            page_total, page_unique = totals.get(page, (0, 0))
+            totals[page] = (page_total + total, page_unique + unique)
+        with connection.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO "{daily}" (page, date, total, "unique") VALUES %s
+                ON CONFLICT (page, date) DO UPDATE SET
+                    total = "{daily}".total + EXCLUDED.total,
+                    "unique" = "{daily}"."unique" + EXCLUDED."unique"
+            """.format(daily=DailyPageCount._meta.db_table), [
+                (page, date, day_total, day_unique) for (page, date), (day_total, day_unique, _, _) in sorted(counts.items())
+            ])
+            # Sorted, so that concurrent flushes lock rows in the same order
+            execute_values(cursor, """
+                INSERT INTO "{counter}" (_id, date, total, "unique", created, modified) VALUES %s
+                ON CONFLICT (_id) DO UPDATE SET
+                    total = "{counter}".total + EXCLUDED.total,
+                    "unique" = "{counter}"."unique" + EXCLUDED."unique",
+                    modified = EXCLUDED.modified
+            """.format(counter=cls._meta.db_table), [
+                (page, '{}', total, unique, now, now) for page, (total, unique) in sorted(totals.items())
+            ])
 
     @classmethod
     def get_basic_counters(cls, page):
@@ -142,3 +162,20 @@ class PageCounter(BaseModel):
             return (counter.unique, counter.total)
         except cls.DoesNotExist:
             return (None, None)
+
+
+class DailyPageCount(models.Model):
+    """Visits of a page on a day, written by `PageCounter.flush_counts`. Unlike
+    `PageCounter.total`, `total` includes downloads by contributors.
+    """
+    page = models.CharField(max_length=300)  # PageCounter._id
+    date = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+    unique = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('page', 'date')
+
+
+activity_buffer = buffer.register('user activity', lambda counts: UserActivityCounter.flush_counts(counts), 1)
+page_counter_buffer = buffer.register('page', lambda counts: PageCounter.flush_counts(counts), 4)
@@ -40,6 +40,20 @@ def generate_guid(length=5):
             return guid_id
 
 
+def generate_guids(count, length=5):
+    """Generate `count` distinct, unused guids, checking them in batches."""
+    guid_ids = set()
+    while len(guid_ids) < count:
+        candidates = set()
+        while len(candidates) < count - len(guid_ids):
+            candidates.add(''.join(random.sample(ALPHABET, length)))
+        candidates -= guid_ids
+        candidates -= set(BlackListGuid.objects.filter(guid__in=candidates).values_list('guid', flat=True))
+        candidates -= set(Guid.objects.filter(_id__in=candidates).values_list('_id', flat=True))
+        guid_ids |= candidates
+    return list(guid_ids)
+
+
 def generate_object_id():
     return str(bson.ObjectId())
 
@@ -6,12 +6,14 @@ import os
 import requests
 from dateutil.parser import parse as parse_date
 from django.apps import apps
-from django.db import models, IntegrityError
+from django.db import connection, models, IntegrityError
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
 from django.db.models import Manager
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.dispatch import receiver
 from typedmodels.models import TypedModel, TypedModelManager
 from include import IncludeManager
 
@@ -90,6 +92,11 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
     _history = DateTimeAwareJSONField(default=list, blank=True)
     # A concrete version of a FileNode, must have an identifier
     versions = models.ManyToManyField('FileVersion')
+    # Summary of `versions` so that listings do not have to aggregate them per file.
+    # Maintained by the signal listeners at the bottom of this module; null until backfilled
+    latest_version = models.ForeignKey('FileVersion', blank=True, null=True, related_name='+', on_delete=models.SET_NULL)
+    earliest_version = models.ForeignKey('FileVersion', blank=True, null=True, related_name='+', on_delete=models.SET_NULL)
+    version_count = models.PositiveIntegerField(blank=True, null=True)
 
     target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     target_object_id = models.PositiveIntegerField()
@@ -789,3 +796,67 @@ class FileVersion(ObjectIDMixin, BaseModel):
 
     class Meta:
         ordering = ('-created',)
+
+
+# Recomputes the version summary fields of BaseFileNode. Ties on `created` are broken by id
+# so the result does not depend on the plan
+UPDATE_VERSION_SUMMARIES_SQL = """
+    UPDATE "osf_basefilenode" AS F
+    SET version_count = S.version_count,
+        latest_version_id = S.latest_version_id,
+        earliest_version_id = S.earliest_version_id
+    FROM (
+        SELECT
+            N.id,
+            COUNT(V.id) AS version_count,
+            (array_agg(V.id ORDER BY V.created DESC, V.id DESC))[1] AS latest_version_id,
+            (array_agg(V.id ORDER BY V.created ASC, V.id ASC))[1] AS earliest_version_id
+        FROM "osf_basefilenode" AS N
+            LEFT JOIN "osf_basefilenode_versions" AS NV ON NV.basefilenode_id = N.id
+            LEFT JOIN "osf_fileversion" AS V ON V.id = NV.fileversion_id
+        WHERE N.id = ANY(%s)
+        GROUP BY N.id
+    ) AS S
+    WHERE F.id = S.id;
+"""
+
+def update_version_summaries(file_ids):
+    """Recompute `latest_version`, `earliest_version` and `version_count` of the given files.
+
+    :param list file_ids: BaseFileNode pks
+    :return int: Number of files updated
+    """
+    file_ids = list(file_ids)
+    if not file_ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_VERSION_SUMMARIES_SQL, [file_ids])
+        return cursor.rowcount
+
+
+##### Signal listeners #####
+@receiver(m2m_changed, sender=BaseFileNode.versions.through)
+def update_version_summaries_on_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if reverse:
+        # `instance` is a FileVersion, `pk_set` the files
+        if action == 'pre_clear':
+            instance._version_summary_file_ids = list(instance.basefilenode_set.values_list('id', flat=True))
+        elif action == 'post_clear':
+            update_version_summaries(getattr(instance, '_version_summary_file_ids', []))
+        elif action in ('post_add', 'post_remove'):
+            update_version_summaries(pk_set)
+        return
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        update_version_summaries([instance.pk])
+        # Callers tend to save the file right after adding a version, don't write back stale values
+        instance.refresh_from_db(fields=['latest_version', 'earliest_version', 'version_count'])
+
+
+@receiver(pre_delete, sender=FileVersion)
+def remember_versioned_files(sender, instance, **kwargs):
+    instance._version_summary_file_ids = list(instance.basefilenode_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=FileVersion)
+def update_version_summaries_on_delete(sender, instance, **kwargs):
+    update_version_summaries(getattr(instance, '_version_summary_file_ids', []))
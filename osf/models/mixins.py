@@ -1,9 +1,11 @@
+from collections import defaultdict
+
 import pytz
 
 from django.apps import apps
 from django.contrib.auth.models import Group
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.utils import timezone
 from django.utils.functional import cached_property
 from guardian.shortcuts import assign_perm
@@ -182,6 +184,12 @@ class AddonModelMixin(models.Model):
     ADDONS_AVAILABLE = sorted([config for config in apps.get_app_configs() if config.name.startswith('addons.') and
         config.label != 'base'])
 
+    # Finds the settings of every addon of the owners in one query
+    ADDON_SETTINGS_SQL = 'SELECT %s, "{owner}", "id" FROM "{table}" WHERE "{owner}" = ANY(%s)'
+
+    # Short name -> settings (deleted or not) or None, for every addon; see `prefetch_addons`
+    _addon_settings = None
+
     class Meta:
         abstract = True
 
@@ -189,11 +197,62 @@ class AddonModelMixin(models.Model):
     def get_addon_key(cls, config):
         return 2 << cls.ADDONS_AVAILABLE.index(config)
 
+    @classmethod
+    def prefetch_addons(cls, owners):
+        """Load the addon settings of `owners` with one query to find them and one query
+        per addon in use, and cache them on each owner for `get_addon` and `get_addons`.
+        Adding or deleting an addon drops the cache, saving its settings updates it.
+
+        :param list owners: Saved nodes or users
+        :return list: `owners`
+        """
+        owners = [owner for owner in owners if owner.pk]
+        settings_models = {}
+        for config in cls.ADDONS_AVAILABLE:
+            settings_model = getattr(config, '{}_settings'.format(cls.settings_type), None)
+            if settings_model:
+                settings_models[config.short_name] = settings_model
+        if not owners or not settings_models:
+            return owners
+
+        owner_ids = list({owner.pk for owner in owners})
+        sql, params = [], []
+        for short_name, settings_model in settings_models.items():
+            sql.append(cls.ADDON_SETTINGS_SQL.format(
+                table=settings_model._meta.db_table,
+                owner=settings_model._meta.get_field('owner').column,
+            ))
+            params.extend([short_name, owner_ids])
+        settings_ids = defaultdict(list)
+        with connection.cursor() as cursor:
+            cursor.execute(' UNION ALL '.join(sql), params)
+            for short_name, owner_id, settings_id in cursor.fetchall():
+                settings_ids[short_name].append(settings_id)
+
+        found = defaultdict(dict)  # Owner id -> short name -> settings
+        for short_name, ids in settings_ids.items():
+            for settings_obj in settings_models[short_name].objects.filter(id__in=ids):
+                found[settings_obj.owner_id][short_name] = settings_obj
+        for owner in owners:
+            owner._addon_settings = {short_name: found[owner.pk].get(short_name) for short_name in settings_models}
+            for settings_obj in found[owner.pk].values():
+                settings_obj.owner = owner
+        return owners
+
+    def clear_addon_cache(self):
+        self._addon_settings = None
+
+    def refresh_from_db(self, **kwargs):
+        super(AddonModelMixin, self).refresh_from_db(**kwargs)
+        self.clear_addon_cache()
+
     @property
     def addons(self):
         return self.get_addons()
 
     def get_addons(self):
+        if self._addon_settings is None:
+            self.prefetch_addons([self])
         return filter(None, [
             self.get_addon(config.short_name)
             for config in self.ADDONS_AVAILABLE
@@ -221,6 +280,11 @@ class AddonModelMixin(models.Model):
         return self.add_addon(name, *args, **kwargs)
 
     def get_addon(self, name, deleted=False):
+        if self._addon_settings is not None and name in self._addon_settings:
+            settings_obj = self._addon_settings[name]
+            if settings_obj and (not settings_obj.deleted or deleted):
+                return settings_obj
+            return None
         try:
             settings_model = self._settings_model(name)
         except LookupError:
@@ -252,6 +316,7 @@ class AddonModelMixin(models.Model):
 
         # Reactivate deleted add-on if present
         addon = self.get_addon(addon_name, deleted=True)
+        self.clear_addon_cache()
         if addon:
             if addon.deleted:
                 addon.undelete(save=True)
@@ -298,6 +363,7 @@ class AddonModelMixin(models.Model):
         if getattr(addon, 'external_account', None):
             addon.deauthorize(auth=auth)
         addon.delete(save=True)
+        self.clear_addon_cache()
         return True
 
     def _settings_model(self, addon_model, config=None):
@@ -7,7 +7,7 @@ import warnings
 import markupsafe
 
 import bson
-from django.db.models import Q
+from django.db.models import OuterRef, Q, Subquery
 from dirtyfields import DirtyFieldsMixin
 from django.apps import apps
 from django.contrib.auth.models import AnonymousUser
@@ -23,7 +23,6 @@ from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.functional import cached_property
 from keen import scoped_keys
-from psycopg2._psycopg import AsIs
 from typedmodels.models import TypedModel, TypedModelManager
 from include import IncludeManager
 
@@ -39,10 +38,11 @@ from osf.models.identifiers import Identifier, IdentifierMixin
 from osf.models.licenses import NodeLicenseRecord
 from osf.models.mixins import (AddonModelMixin, CommentableMixin, Loggable,
                                NodeLinkMixin, Taggable, TaxonomizableMixin)
-from osf.models.node_relation import NodeRelation
+from osf.models.node_relation import NodeClosure, NodeRelation
 from osf.models.nodelog import NodeLog
 from osf.models.sanctions import RegistrationApproval
 from osf.models.private_link import PrivateLink
+from osf.models.readable_node import ReadableNode
 from osf.models.spam import SpamMixin
 from osf.models.tag import Tag
 from osf.models.user import OSFUser
@@ -51,10 +51,11 @@ from framework.auth.core import Auth, get_user
 from addons.wiki import utils as wiki_utils
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
+from osf.utils.node_tree import NodeTree
 from osf.utils.requests import DummyRequest, get_request_and_user_id
 from osf.utils import sanitize
 from osf.utils.workflows import DefaultStates
-from website import language, settings
+from website import settings
 from website.citations.utils import datetime_to_csl
 from website.exceptions import (InvalidTagError, NodeStateError,
                                 TagNotFoundError, UserNotAffiliatedError)
@@ -66,7 +67,7 @@ from website.project.model import NodeUpdateError
 from website.identifiers.tasks import update_doi_metadata_on_change
 from website.identifiers.clients import DataCiteClient
 from osf.utils.requests import get_headers_from_request
-from osf.utils.permissions import (ADMIN, CREATOR_PERMISSIONS,
+from osf.utils.permissions import (ADMIN,
                                       DEFAULT_CONTRIBUTOR_PERMISSIONS, READ,
                                       WRITE, expand_permissions,
                                       reduce_permissions)
@@ -91,44 +92,18 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
                 query = query.filter(is_deleted=False)
             return query
         else:
-            sql = """
-                WITH RECURSIVE descendants AS (
-                SELECT
-                    parent_id,
-                    child_id,
-                    1 AS LEVEL,
-                    ARRAY[parent_id] as pids
-                FROM %s
-                %s
-                WHERE is_node_link IS FALSE AND parent_id = %s %s
-                UNION ALL
-                SELECT
-                    d.parent_id,
-                    s.child_id,
-                    d.level + 1,
-                    d.pids || s.parent_id
-                FROM descendants AS d
-                    JOIN %s AS s
-                    ON d.child_id = s.parent_id
-                WHERE s.is_node_link IS FALSE AND %s = ANY(pids)
-                ) SELECT array_agg(DISTINCT child_id)
-                FROM descendants
-                WHERE parent_id = %s;
-            """
-            with connection.cursor() as cursor:
-                node_relation_table = AsIs(NodeRelation._meta.db_table)
-                cursor.execute(sql, [
-                    node_relation_table,
-                    AsIs('LEFT JOIN osf_abstractnode ON {}.child_id = osf_abstractnode.id'.format(node_relation_table) if active else ''),
-                    root.pk,
-                    AsIs('AND osf_abstractnode.is_deleted IS FALSE' if active else ''),
-                    node_relation_table,
-                    root.pk,
-                    root.pk])
-                row = cursor.fetchone()[0]
-                if not row:
-                    return AbstractNode.objects.none()
-                return AbstractNode.objects.filter(id__in=row)
+            descendant_ids = NodeClosure.objects.filter(ancestor_id=root.pk).values('descendant_id')
+            query = AbstractNode.objects.filter(id__in=descendant_ids)
+            if active:
+                # Only the first level is filtered: deleted children are left out with
+                # everything below them
+                deleted_child_ids = NodeRelation.objects.filter(
+                    parent_id=root.pk, is_node_link=False, child__is_deleted=True
+                ).values('child_id')
+                query = query.exclude(id__in=deleted_child_ids).exclude(
+                    id__in=NodeClosure.objects.filter(ancestor_id__in=deleted_child_ids).values('descendant_id')
+                )
+            return query
 
     def can_view(self, user=None, private_link=None):
         qs = self.filter(is_public=True)
@@ -147,23 +122,7 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
             if not isinstance(user, int):
                 raise TypeError('"user" must be either {} or {}. Got {!r}'.format(int, OSFUser, user))
 
-            sqs = Contributor.objects.filter(node=models.OuterRef('pk'), user__id=user, read=True)
-            qs |= self.annotate(can_view=models.Exists(sqs)).filter(can_view=True)
-            qs |= self.extra(where=["""
-                "osf_abstractnode".id in (
-                    WITH RECURSIVE implicit_read AS (
-                        SELECT "osf_contributor"."node_id"
-                        FROM "osf_contributor"
-                        WHERE "osf_contributor"."user_id" = %s
-                        AND "osf_contributor"."admin" is TRUE
-                    UNION ALL
-                        SELECT "osf_noderelation"."child_id"
-                        FROM "implicit_read"
-                        LEFT JOIN "osf_noderelation" ON "osf_noderelation"."parent_id" = "implicit_read"."node_id"
-                        WHERE "osf_noderelation"."is_node_link" IS FALSE
-                    ) SELECT * FROM implicit_read
-                )
-            """], params=(user, ))
+            qs |= self.filter(id__in=ReadableNode.objects.filter(user_id=user).values('node_id'))
 
         return qs
 
@@ -901,10 +860,11 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         """
         if self.has_permission(user, permission):
             return True
-        for node in self.nodes_primary.filter(is_deleted=False):
-            if node.has_permission_on_children(user, permission):
-                return True
-        return False
+        tree = NodeTree(self, auth=Auth(user))
+        return any(
+            tree.has_permission(node, permission)
+            for node in tree.walk(primary_only=True, include_deleted=False)
+        )
 
     def is_admin_parent(self, user):
         if self.has_permission(user, 'admin', check_parent=False):
@@ -918,22 +878,19 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         """ Returns a generator of first descendant node(s) readable by <user>
         in each descendant branch.
         """
-        new_branches = []
-        for node in self.nodes_primary.filter(is_deleted=False):
-            if node.can_view(auth):
-                yield node
-            else:
-                new_branches.append(node)
-
-        for bnode in new_branches:
-            for node in bnode.find_readable_descendants(auth):
-                yield node
+        return NodeTree(self, auth=auth).find_readable()
 
     @property
     def parents(self):
-        if self.parent_node:
-            return [self.parent_node] + self.parent_node.parents
-        return []
+        """Ancestors of the node, closest first, loaded with one query."""
+        if not self.pk:
+            return []
+        depth = NodeClosure.objects.filter(ancestor_id=OuterRef('pk'), descendant_id=self.pk).values('depth')
+        return list(
+            AbstractNode.objects.filter(
+                pk__in=NodeClosure.objects.filter(descendant_id=self.pk).values('ancestor_id')
+            ).annotate(closure_depth=Subquery(depth[:1])).order_by('closure_depth')
+        )
 
     @property
     def admin_contributor_ids(self):
@@ -1685,39 +1642,13 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return self.private_links.filter(is_deleted=True).values_list('key', flat=True)
 
     def get_root(self):
-        sql = """
-            WITH RECURSIVE ascendants AS (
-              SELECT
-                parent_id,
-                child_id,
-                1 AS LEVEL,
-                ARRAY[child_id] as cids
-              FROM %s
-              WHERE is_node_link IS FALSE and child_id = %s
-              UNION ALL
-              SELECT
-                S.parent_id,
-                D.child_id,
-                D.level + 1,
-                D.cids || S.child_id
-              FROM ascendants AS D
-                JOIN %s AS S
-                  ON D.parent_id = S.child_id
-              WHERE S.is_node_link IS FALSE
-                AND %s = ANY(cids)
-            ) SELECT parent_id
-              FROM ascendants
-              WHERE child_id = %s
-              ORDER BY level DESC
-              LIMIT 1;
-        """
-        with connection.cursor() as cursor:
-            node_relation_table = AsIs(NodeRelation._meta.db_table)
-            cursor.execute(sql, [node_relation_table, self.pk, node_relation_table, self.pk, self.pk])
-            res = cursor.fetchone()
-            if res:
-                return AbstractNode.objects.get(pk=res[0])
-            return self
+        root_id = (NodeClosure.objects.filter(descendant_id=self.pk)
+                   .order_by('-depth')
+                   .values_list('ancestor_id', flat=True)
+                   .first())
+        if root_id:
+            return AbstractNode.objects.get(pk=root_id)
+        return self
 
     def find_readable_antecedent(self, auth):
         """ Returns first antecendant node readable by <user>.
@@ -1736,6 +1667,8 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             contrib.node = self
             contribs.append(contrib)
         Contributor.objects.bulk_create(contribs)
+        # bulk_create skips the signals that maintain ReadableNode
+        ReadableNode.refresh(self.id)
 
     def register_node(self, schema, auth, data, parent=None):
         """Make a frozen copy of a node.
@@ -1893,19 +1826,11 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
     def get_primary(self, node):
         return NodeRelation.objects.filter(parent=self, child=node, is_node_link=False).exists()
 
-    # TODO optimize me
     def get_descendants_recursive(self, primary_only=False):
-        query = self.nodes_primary if primary_only else self._nodes
-        for node in query.all():
-            yield node
-            if not primary_only:
-                primary = self.get_primary(node)
-                if primary:
-                    for descendant in node.get_descendants_recursive(primary_only=primary_only):
-                        yield descendant
-            else:
-                for descendant in node.get_descendants_recursive(primary_only=primary_only):
-                    yield descendant
+        """Yield every component below the node, parents before their components,
+        and, unless `primary_only`, the nodes they link to. Linked nodes aren't walked.
+        """
+        return NodeTree(self).walk(primary_only=primary_only)
 
     @property
     def nodes_primary(self):
@@ -1921,129 +1846,27 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         """Recursively checks whether the current node or any of its nodes
         contains a pointer.
         """
-        if self.linked_nodes.exists():
-            return True
-        for node in self.nodes_primary:
-            if node.has_pointers_recursive:
-                return True
-        return False
+        return NodeTree(self).has_node_links()
 
-    # TODO: Optimize me (e.g. use bulk create)
-    def fork_node(self, auth, title=None, parent=None):
-        """Recursively fork a node.
+    def fork_node(self, auth, title=None, progress=None):
+        """Fork a node and the components the user can read, in bulk. See `osf.utils.forks`.
 
         :param Auth auth: Consolidated authorization
-        :param str title: Optional text to prepend to forked title
-        :param Node parent: Sets parent, should only be non-null when recursing
+        :param str title: Optional title of the fork. Defaults to the node's title prefixed with "Fork of "
+        :param progress: Optional callable taking (stage, done, total), called as the fork proceeds
         :return: Forked node
         """
-        Registration = apps.get_model('osf.Registration')
-        PREFIX = 'Fork of '
+        from osf.utils.forks import fork_subtree
         user = auth.user
 
         # Non-contributors can't fork private nodes
         if not (self.is_public or self.has_permission(user, 'read')):
             raise PermissionsError('{0!r} does not have permission to fork node {1!r}'.format(user, self._id))
 
-        when = timezone.now()
-
-        original = self
-
-        if original.is_deleted:
+        if self.is_deleted:
             raise NodeStateError('Cannot fork deleted node.')
 
-        # Note: Cloning a node will clone each WikiPage on the node and all the related WikiVersions
-        # and point them towards the fork
-        forked = original.clone()
-        if isinstance(forked, Registration):
-            forked.recast('osf.node')
-
-        forked.is_fork = True
-        forked.forked_date = when
-        forked.forked_from = original
-        forked.creator = user
-        forked.node_license = original.license.copy() if original.license else None
-        forked.wiki_private_uuids = {}
-
-        # Forks default to private status
-        forked.is_public = False
-
-        # Need to save here in order to access m2m fields
-        forked.save()
-
-        forked.tags.add(*self.all_tags.values_list('pk', flat=True))
-        forked.subjects.add(*self.subjects.values_list('pk', flat=True))
-
-        if parent:
-            node_relation = NodeRelation.objects.get(parent=parent.forked_from, child=original)
-            NodeRelation.objects.get_or_create(_order=node_relation._order, parent=parent, child=forked)
-
-        for node_relation in original.node_relations.filter(child__is_deleted=False):
-            node_contained = node_relation.child
-            # Fork child nodes
-            if not node_relation.is_node_link:
-                try:  # Catch the potential PermissionsError above
-                    node_contained.fork_node(
-                        auth=auth,
-                        title='',
-                        parent=forked,
-                    )
-                except PermissionsError:
-                    pass  # If this exception is thrown omit the node from the result set
-            else:
-                # Copy linked nodes
-                NodeRelation.objects.get_or_create(
-                    is_node_link=True,
-                    parent=forked,
-                    child=node_contained
-                )
-
-        if title is None:
-            forked.title = PREFIX + original.title
-        elif title == '':
-            forked.title = original.title
-        else:
-            forked.title = title
-
-        if len(forked.title) > 200:
-            forked.title = forked.title[:200]
-
-        forked.add_contributor(
-            contributor=user,
-            permissions=CREATOR_PERMISSIONS,
-            log=False,
-            save=False
-        )
-
-        forked.root = None  # Recompute root on save
-
-        forked.save()
-
-        # Need to call this after save for the notifications to be created with the _primary_key
-        project_signals.contributor_added.send(forked, contributor=user, auth=auth, email_template='false')
-
-        forked.add_log(
-            action=NodeLog.NODE_FORKED,
-            params={
-                'parent_node': original.parent_id,
-                'node': original._primary_key,
-                'registration': forked._primary_key,  # TODO: Remove this in favor of 'fork'
-                'fork': forked._primary_key,
-            },
-            auth=auth,
-            log_date=when,
-            save=False,
-        )
-
-        # Clone each log from the original node for this fork.
-        self.clone_logs(forked)
-        forked.refresh_from_db()
-
-        # After fork callback
-        for addon in original.get_addons():
-            addon.after_fork(original, forked, user)
-
-        return forked
+        return fork_subtree(self, auth, title=title, progress=progress)
 
     def clone_logs(self, node, page_size=100):
         paginator = Paginator(self.logs.order_by('pk').all(), page_size)
@@ -2069,26 +1892,19 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             ]
             NodeLog.objects.bulk_create(logs_to_create)
 
-    def use_as_template(self, auth, changes=None, top_level=True, parent=None):
-        """Create a new project, using an existing project as a template.
+    def use_as_template(self, auth, changes=None, top_level=True, progress=None):
+        """Create a new project, using an existing project and the components the user
+        can read as a template, in bulk. See `osf.utils.forks`.
 
         :param auth: The user to be assigned as creator
         :param changes: A dictionary of changes, keyed by node id, which
                         override the attributes of the template project or its
                         children.
-        :param Bool top_level: indicates existence of parent TODO: deprecate
-        :param Node parent: parent template. Should only be passed in during recursion
+        :param Bool top_level: Whether to prefix an unchanged title with "Templated from "
+        :param progress: Optional callable taking (stage, done, total), called as the copy proceeds
         :return: The `Node` instance created.
         """
-        Registration = apps.get_model('osf.Registration')
-        changes = changes or dict()
-
-        # build the dict of attributes to change for the new node
-        try:
-            attributes = changes[self._id]
-            # TODO: explicitly define attributes which may be changed.
-        except (AttributeError, KeyError):
-            attributes = dict()
+        from osf.utils.forks import template_subtree
 
         if self.is_deleted:
             raise NodeStateError('Cannot use deleted node as template.')
@@ -2097,101 +1913,16 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         if not (self.is_public or self.has_permission(auth.user, 'read')):
             raise PermissionsError('{0!r} does not have permission to template node {1!r}'.format(auth.user, self._id))
 
-        new = self.clone()
-        if isinstance(new, Registration):
-            new.recast('osf.node')
-
-        new._is_templated_clone = True  # This attribute may be read in post_save handlers
-
-        # Clear quasi-foreign fields
-        new.wiki_private_uuids.clear()
-        new.file_guid_to_share_uuids.clear()
-
-        # set attributes which may be overridden by `changes`
-        new.is_public = False
-        new.description = ''
-
-        # apply `changes`
-        for attr, val in attributes.iteritems():
-            setattr(new, attr, val)
-
-        # set attributes which may NOT be overridden by `changes`
-        new.creator = auth.user
-        new.template_node = self
-        # Need to save in order to access contributors m2m table
-        new.save(suppress_log=True)
-        new.add_contributor(contributor=auth.user, permissions=CREATOR_PERMISSIONS, log=False, save=False)
-        new.is_fork = False
-        new.node_license = self.license.copy() if self.license else None
-
-        # If that title hasn't been changed, apply the default prefix (once)
-        if (
-            new.title == self.title and top_level and
-            language.TEMPLATED_FROM_PREFIX not in new.title
-        ):
-            new.title = ''.join((language.TEMPLATED_FROM_PREFIX, new.title,))
-
-        if len(new.title) > 200:
-            new.title = new.title[:200]
-
-        # Slight hack - created is a read-only field.
-        new.created = timezone.now()
-
-        new.save(suppress_log=True)
-
-        # Need to call this after save for the notifications to be created with the _primary_key
-        project_signals.contributor_added.send(new, contributor=auth.user, auth=auth, email_template='false')
-
-        # Log the creation
-        new.add_log(
-            NodeLog.CREATED_FROM,
-            params={
-                'node': new._primary_key,
-                'template_node': {
-                    'id': self._primary_key,
-                    'url': self.url,
-                    'title': self.title,
-                },
-            },
-            auth=auth,
-            log_date=new.created,
-            save=False,
-        )
-        new.save()
-
-        if parent:
-            node_relation = NodeRelation.objects.get(parent=parent.template_node, child=self)
-            NodeRelation.objects.get_or_create(_order=node_relation._order, parent=parent, child=new)
-
-        # deal with the children of the node, if any
-        for node_relation in self.node_relations.select_related('child').filter(child__is_deleted=False):
-            node_contained = node_relation.child
-            # template child nodes
-            if not node_relation.is_node_link:
-                try:  # Catch the potential PermissionsError above
-                    node_contained.use_as_template(auth, changes, top_level=False, parent=new)
-                except PermissionsError:
-                    pass
-
-        new.root = None
-        new.save()  # Recompute root on save()
-        return new
+        return template_subtree(self, auth, changes=changes, top_level=top_level, progress=progress)
 
     def next_descendants(self, auth, condition=lambda auth, node: True):
         """
-        Recursively find the first set of descedants under a given node that meet a given condition
+        Recursively find the first set of descedants under a given node that meet a given condition.
+        Linked nodes are checked, but not searched.
 
         returns a list of [(node, [children]), ...]
         """
-        ret = []
-        for node in self._nodes.order_by('created').all():
-            if condition(auth, node):
-                # base case
-                ret.append((node, []))
-            else:
-                ret.append((node, node.next_descendants(auth, condition)))
-        ret = [item for item in ret if item[1] or condition(auth, item[0])]  # prune empty branches
-        return ret
+        return NodeTree(self, auth=auth).find_next(condition)
 
     def node_and_primary_descendants(self):
         """Return an iterator for a node and all of its primary (non-pointer) descendants.
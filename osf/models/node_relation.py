@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connection, models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from .base import BaseModel, ObjectIDMixin
 
@@ -25,3 +27,109 @@ class NodeRelation(ObjectIDMixin, BaseModel):
         index_together = (
             ('is_node_link', 'child', 'parent'),
         )
+
+
+class NodeClosure(models.Model):
+    """Transitive closure of the non-link ``NodeRelation`` edges.
+
+    One row exists for every (ancestor, descendant) pair in the component tree,
+    with ``depth`` being the number of edges between the two. Nodes are never
+    their own ancestor. Rows are maintained by the ``NodeRelation`` signal handlers
+    below; use the ``backfill_node_closure`` management command to (re)build or verify
+    the table.
+    """
+    ancestor = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    descendant = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    ADD_EDGE_SQL = """
+        INSERT INTO "{closure}" (ancestor_id, descendant_id, depth)
+        SELECT A.ancestor_id, D.descendant_id, A.depth + D.depth + 1
+        FROM (
+            SELECT ancestor_id, depth FROM "{closure}" WHERE descendant_id = %(parent_id)s
+            UNION ALL SELECT %(parent_id)s, 0
+        ) AS A CROSS JOIN (
+            SELECT descendant_id, depth FROM "{closure}" WHERE ancestor_id = %(child_id)s
+            UNION ALL SELECT %(child_id)s, 0
+        ) AS D
+        WHERE A.ancestor_id <> D.descendant_id
+        ON CONFLICT (ancestor_id, descendant_id) DO NOTHING;
+    """
+
+    # NOTE: Assumes a node has at most one non-link parent, so every closure row
+    # crossing the removed edge has exactly one path
+    REMOVE_EDGE_SQL = """
+        DELETE FROM "{closure}"
+        WHERE ancestor_id IN (
+            SELECT ancestor_id FROM "{closure}" WHERE descendant_id = %(parent_id)s
+            UNION ALL SELECT %(parent_id)s
+        ) AND descendant_id IN (
+            SELECT descendant_id FROM "{closure}" WHERE ancestor_id = %(child_id)s
+            UNION ALL SELECT %(child_id)s
+        );
+    """
+
+    # Copies the rows between the nodes of a copied tree, e.g. a fork
+    COPY_SQL = """
+        INSERT INTO "{closure}" (ancestor_id, descendant_id, depth)
+        SELECT A.copy_id, D.copy_id, C.depth
+        FROM "{closure}" AS C
+            JOIN unnest(%(originals)s::int[], %(copies)s::int[]) AS A(original_id, copy_id)
+                ON C.ancestor_id = A.original_id
+            JOIN unnest(%(originals)s::int[], %(copies)s::int[]) AS D(original_id, copy_id)
+                ON C.descendant_id = D.original_id
+        ON CONFLICT (ancestor_id, descendant_id) DO NOTHING;
+    """
+
+    @classmethod
+    def copy_tree(cls, copies):
+        """Add the rows for nodes created with ``bulk_create`` as copies of other nodes.
+
+        :param dict copies: Original node id -> copy node id. Must contain every node
+            between any two originals in the tree.
+        """
+        if not copies:
+            return
+        originals, copy_ids = zip(*copies.items())
+        with connection.cursor() as cursor:
+            cursor.execute(cls.COPY_SQL.format(closure=cls._meta.db_table), {
+                'originals': list(originals),
+                'copies': list(copy_ids),
+            })
+
+    @classmethod
+    def _execute_edge_sql(cls, sql, parent_id, child_id):
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(closure=cls._meta.db_table), {
+                'parent_id': parent_id,
+                'child_id': child_id,
+            })
+
+    @classmethod
+    def add_edge(cls, parent_id, child_id):
+        cls._execute_edge_sql(cls.ADD_EDGE_SQL, parent_id, child_id)
+
+    @classmethod
+    def remove_edge(cls, parent_id, child_id):
+        cls._execute_edge_sql(cls.REMOVE_EDGE_SQL, parent_id, child_id)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        index_together = (
+            ('descendant', 'depth'),
+        )
+
+
+##### Signal listeners #####
+@receiver(post_save, sender=NodeRelation)
+def add_node_closure_edge(sender, instance, created, raw=False, **kwargs):
+    if raw or instance.is_node_link:
+        return
+    # Idempotent, so re-saving an existing relation (e.g. reordering) is harmless
+    NodeClosure.add_edge(instance.parent_id, instance.child_id)
+
+
+@receiver(post_delete, sender=NodeRelation)
+def remove_node_closure_edge(sender, instance, **kwargs):
+    if not instance.is_node_link:
+        NodeClosure.remove_edge(instance.parent_id, instance.child_id)
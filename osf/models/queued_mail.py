@@ -36,12 +36,13 @@ class QueuedMail(ObjectIDMixin, BaseModel):
             self._id, self.email_type, self.to_addr, self.send_at
         )
 
-    def send_mail(self):
+    def send_mail(self, mailer=None):
         """
         Grabs the data from this email, checks for user subscription to help mails,
 
         constructs the mail object and checks presend. Then attempts to send the email
         through send_mail()
+        :param mailer: Sends the email right away instead of through celery, e.g. a `BatchMailer`
         :return: boolean based on whether email was sent.
         """
         mail_struct = queue_mail_types[self.email_type]
@@ -53,7 +54,7 @@ class QueuedMail(ObjectIDMixin, BaseModel):
         )
         self.data['osf_url'] = osf_settings.DOMAIN
         if presend and self.user.is_active and self.user.osf_mailing_lists.get(osf_settings.OSF_HELP_LIST):
-            send_mail(self.to_addr or self.user.username, mail, mimetype='html', **(self.data or {}))
+            send_mail(self.to_addr or self.user.username, mail, mimetype='html', mailer=mailer, celery=mailer is None, **(self.data or {}))
             self.sent_at = timezone.now()
             self.save()
             return True
@@ -0,0 +1,92 @@
+from django.db import connection, models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from osf.models.contributor import Contributor
+from osf.models.node_relation import NodeClosure, NodeRelation
+
+
+class ReadableNode(models.Model):
+    """Denormalized index of the private nodes each user may read.
+
+    ``AbstractNodeQuerySet.can_view`` semi-joins against this table instead of
+    checking contributorships and walking the component tree at query time.
+    Public and private-link access are still read from the node itself, so
+    privacy changes need no maintenance here.
+
+    Rows are kept in sync by the ``Contributor`` and ``NodeRelation`` signal
+    handlers below. Code that bypasses signals (``bulk_create``, ``update``)
+    must call ``ReadableNode.refresh`` itself.
+    """
+    CONTRIBUTOR = 'contributor'
+    IMPLICIT_ADMIN = 'implicit_admin'
+    SOURCES = (
+        (CONTRIBUTOR, 'Read contributor'),
+        (IMPLICIT_ADMIN, 'Admin on an ancestor'),
+    )
+
+    user = models.ForeignKey('OSFUser', related_name='+', on_delete=models.CASCADE)
+    node = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    source = models.CharField(max_length=16, choices=SOURCES)
+
+    REFRESH_SQL = """
+        DELETE FROM "{readable}"
+        WHERE {delete_user_clause}
+            AND ((source = '{implicit_admin}' AND node_id IN ({subtree}))
+                OR (source = '{contributor}' AND node_id = %(node_id)s));
+
+        INSERT INTO "{readable}" (user_id, node_id, source)
+            SELECT C.user_id, C.node_id, '{contributor}'
+            FROM "{contributor_table}" AS C
+            WHERE {select_user_clause} AND C.node_id = %(node_id)s AND C.read IS TRUE
+        UNION
+            SELECT C.user_id, NC.descendant_id, '{implicit_admin}'
+            FROM "{closure_table}" AS NC
+                JOIN "{contributor_table}" AS C ON C.node_id = NC.ancestor_id
+            WHERE {select_user_clause} AND NC.descendant_id IN ({subtree}) AND C.admin IS TRUE
+        ON CONFLICT (user_id, node_id, source) DO NOTHING;
+    """
+
+    @classmethod
+    def refresh(cls, node_id, user_id=None):
+        """Rebuild the rows that depend on contributorships on or above `node_id`:
+        the node's own contributor rows and the implicit admin rows of the node
+        and all of its descendants. Only rows for `user_id` are rebuilt if given.
+        """
+        closure_table = NodeClosure._meta.db_table
+        sql = cls.REFRESH_SQL.format(
+            readable=cls._meta.db_table,
+            contributor_table=Contributor._meta.db_table,
+            closure_table=closure_table,
+            contributor=cls.CONTRIBUTOR,
+            implicit_admin=cls.IMPLICIT_ADMIN,
+            subtree='SELECT %(node_id)s UNION ALL SELECT descendant_id FROM "{}" WHERE ancestor_id = %(node_id)s'.format(closure_table),
+            delete_user_clause='TRUE' if user_id is None else 'user_id = %(user_id)s',
+            select_user_clause='TRUE' if user_id is None else 'C.user_id = %(user_id)s',
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'node_id': node_id, 'user_id': user_id})
+
+    class Meta:
+        unique_together = ('user', 'node', 'source')
+        index_together = (
+            ('node', 'user'),
+        )
+
+
+##### Signal listeners #####
+@receiver(post_save, sender=Contributor)
+@receiver(post_delete, sender=Contributor)
+def update_readable_nodes_for_contributor(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ReadableNode.refresh(instance.node_id, user_id=instance.user_id)
+
+
+@receiver(post_save, sender=NodeRelation)
+@receiver(post_delete, sender=NodeRelation)
+def update_readable_nodes_for_relation(sender, instance, raw=False, **kwargs):
+    # NodeClosure is updated by handlers connected before this one
+    if raw or instance.is_node_link:
+        return
+    ReadableNode.refresh(instance.child_id)
@@ -1,3 +1,6 @@
+import copy
+
+from framework.sessions.cache import cache_session, evict_sessions
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 
@@ -5,6 +8,30 @@ from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 class Session(ObjectIDMixin, BaseModel):
     data = DateTimeAwareJSONField(default=dict, blank=True)
 
+    _saved_data = None  # data as last loaded or saved
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        session = super(Session, cls).from_db(db, field_names, values)
+        session._saved_data = copy.deepcopy(session.data)
+        return session
+
+    @property
+    def data_changed(self):
+        return self.pk is None or self.data != self._saved_data
+
+    def save(self, *args, **kwargs):
+        # Sessions are saved on many requests without being changed
+        if not (args or kwargs or self.data_changed):
+            return
+        super(Session, self).save(*args, **kwargs)
+        self._saved_data = copy.deepcopy(self.data)
+        cache_session(self)
+
+    def delete(self, *args, **kwargs):
+        evict_sessions([self._id])
+        return super(Session, self).delete(*args, **kwargs)
+
     @property
     def is_authenticated(self):
         return 'auth_user_id' in self.data
@@ -0,0 +1,57 @@
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, models
+from django.utils import timezone
+
+from osf.utils.fields import NonNaiveDateTimeField
+
+
+class ShareOutboxEntry(models.Model):
+    """A node or preprint waiting to be sent to SHARE.
+
+    There is at most one entry per object: enqueueing an object that is already
+    waiting merges into the existing entry, so repeated updates are sent once.
+    The object is serialized when the entry is flushed by
+    ``website.share_outbox.flush_outbox``, so SHARE always gets its latest state.
+    """
+    NODE = 'node'
+    PREPRINT = 'preprint'
+    TARGET_TYPES = (
+        (NODE, 'Node or registration'),
+        (PREPRINT, 'Preprint'),
+    )
+
+    target_type = models.CharField(max_length=16, choices=TARGET_TYPES)
+    target_guid = models.CharField(max_length=255)
+    # Preprints only
+    share_type = models.CharField(max_length=255, null=True, blank=True)
+    old_subjects = ArrayField(models.IntegerField(), default=list, blank=True)
+
+    enqueued = NonNaiveDateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = NonNaiveDateTimeField(default=timezone.now, db_index=True)
+
+    ENQUEUE_SQL = """
+        INSERT INTO "{outbox}" (target_type, target_guid, share_type, old_subjects, enqueued, attempts, next_attempt)
+        VALUES (%(target_type)s, %(target_guid)s, %(share_type)s, %(old_subjects)s, %(now)s, 0, %(now)s)
+        ON CONFLICT (target_type, target_guid) DO UPDATE SET
+            share_type = COALESCE(EXCLUDED.share_type, "{outbox}".share_type),
+            old_subjects = ARRAY(SELECT DISTINCT unnest("{outbox}".old_subjects || EXCLUDED.old_subjects)),
+            enqueued = EXCLUDED.enqueued;
+    """
+
+    @classmethod
+    def enqueue(cls, target_type, target_guid, share_type=None, old_subjects=None):
+        """Add an object to the outbox, or merge into its waiting entry. A waiting
+        entry keeps its retry schedule.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(cls.ENQUEUE_SQL.format(outbox=cls._meta.db_table), {
+                'target_type': target_type,
+                'target_guid': target_guid,
+                'share_type': share_type,
+                'old_subjects': list(old_subjects or []),
+                'now': timezone.now(),
+            })
+
+    class Meta:
+        unique_together = ('target_type', 'target_guid')
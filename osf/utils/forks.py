@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""Set-based forking of a node and its components.
+
+`fork_subtree` copies a node, the components the forking user may read, their
+``NodeRelation`` edges, contributors, tags, subjects and logs with a few bulk inserts
+per table, inside a single transaction, instead of saving every object of every
+component in turn. Add-on settings are still copied node by node, through each
+add-on's ``after_fork``; the wiki add-on copies the pages of a node in bulk too.
+`template_subtree` makes a new project from a node and its components the same way.
+
+Pass a ``progress(stage, done, total)`` callable to follow a long fork, e.g. from the
+``website.project.tasks.fork_node_async`` task. ``stage`` is one of `STAGES`; ``done``
+and ``total`` count nodes.
+"""
+import binascii
+import logging
+import os
+import time
+from collections import defaultdict, deque
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import ForeignKey
+from django.utils import timezone
+
+from framework.analytics import increment_user_activity_counters
+from osf.models.base import Guid, generate_guids
+from osf.models.contributor import Contributor
+from osf.models.licenses import NodeLicenseRecord
+from osf.models.node_relation import NodeClosure, NodeRelation
+from osf.models.nodelog import NodeLog
+from osf.models.readable_node import ReadableNode
+from website import language, settings
+from website.project import signals as project_signals
+
+logger = logging.getLogger(__name__)
+
+NODES = 'nodes'
+RELATIONS = 'relations'
+CONTRIBUTORS = 'contributors'
+TAGS = 'tags'
+LOGS = 'logs'
+ADDONS = 'addons'
+STAGES = (NODES, RELATIONS, CONTRIBUTORS, TAGS, LOGS, ADDONS)
+
+FORK_PREFIX = 'Fork of '
+
+COPY_ROWS_SQL = """
+    INSERT INTO "{table}" ({columns})
+    SELECT {values}
+    FROM "{table}" AS R
+        JOIN unnest(%(originals)s::int[], %(copies)s::int[]) AS M(original_id, copy_id)
+            ON R."{column}" = M.original_id
+    ORDER BY {order_by};
+"""
+
+# Unique within a statement, and across statements thanks to the random prefix
+OBJECT_ID_SQL = "%(id_prefix)s || lpad(to_hex(row_number() OVER (ORDER BY {order_by})), 6, '0')"
+
+
+def object_id_prefix():
+    """The first 18 hex digits of ObjectIds generated by `OBJECT_ID_SQL`."""
+    return '{:08x}{}'.format(int(time.time()), binascii.hexlify(os.urandom(5)).decode())
+
+def copy_rows(model, column, copies, values=None, params=None, order_by='R.id'):
+    """Copy the rows of `model` that point at the original objects in `copies`
+    with `column`, pointing the new rows at the copies, with one INSERT ... SELECT.
+
+    :param dict copies: Original id -> copy id
+    :param dict values: SQL expressions, by column, for columns that aren't copied
+        as they are. The source row is ``R``.
+    :param dict params: Parameters used by `values`
+    :return int: Number of rows copied
+    """
+    if not copies:
+        return 0
+    values = dict(values or {}, **{column: 'M.copy_id'})
+    columns = [field.column for field in model._meta.concrete_fields if not field.primary_key]
+    sql = COPY_ROWS_SQL.format(
+        table=model._meta.db_table,
+        columns=', '.join('"{}"'.format(each) for each in columns),
+        values=', '.join(values.get(each, 'R."{}"'.format(each)) for each in columns),
+        column=column,
+        order_by=order_by,
+    )
+    originals, copy_ids = zip(*copies.items())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, dict(params or {}, originals=list(originals), copies=list(copy_ids)))
+        return cursor.rowcount
+
+def copy_m2m(field, copies):
+    """Copy the many-to-many relations of the original objects in `copies`."""
+    through = field.remote_field.through
+    return copy_rows(through, through._meta.get_field(field.m2m_field_name()).column, copies)
+
+def copied_fields(instance, exclude=()):
+    """The values `BaseModel.clone` keeps: all but the primary and foreign keys."""
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and not isinstance(field, ForeignKey) and field.name not in exclude
+    }
+
+
+class SubtreeFork(object):
+    """Fork of a node and the components `auth.user` may read. Use `fork_subtree`."""
+
+    # Whether node links are copied along with components
+    copy_node_links = True
+    log_action = NodeLog.NODE_FORKED
+    description = 'Forked'
+
+    def __init__(self, node, auth, title=None, progress=None):
+        self.node = node
+        self.auth = auth
+        self.user = auth.user
+        self.title = title
+        self.progress = progress
+        self.when = timezone.now()
+
+        self.originals = []  # Parents before their components
+        self.edges = []  # Component relations to copy
+        self.links = []  # Node link relations to copy
+        self.copies = {}  # Original id -> copy
+        self.parents = {}  # Original id -> original parent
+
+    def report(self, stage, done=None):
+        if self.progress:
+            total = len(self.originals)
+            self.progress(stage, total if done is None else done, total)
+
+    def load(self):
+        """Find the nodes to copy with a query for the subtree and one for its edges."""
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        nodes = {
+            node.id: node for node in
+            AbstractNode.objects.filter(
+                id__in=NodeClosure.objects.filter(ancestor_id=self.node.id).values('descendant_id'),
+                is_deleted=False,
+            )
+        }
+        nodes[self.node.id] = self.node
+        readable = set(
+            ReadableNode.objects.filter(user=self.user, node_id__in=list(nodes)).values_list('node_id', flat=True)
+        )
+        relations = defaultdict(list)
+        for relation in (NodeRelation.objects
+                         .filter(parent_id__in=list(nodes), child__is_deleted=False)
+                         .order_by('_order')
+                         .values('parent_id', 'child_id', 'is_node_link', '_order')):
+            relations[relation['parent_id']].append(relation)
+
+        queue = deque([self.node])
+        while queue:
+            original = queue.popleft()
+            self.originals.append(original)
+            for relation in relations[original.id]:
+                if relation['is_node_link']:
+                    if self.copy_node_links:
+                        self.links.append(relation)
+                    continue
+                child = nodes[relation['child_id']]
+                # Components the user can't read are left out, with their own components
+                if child.is_public or child.id in readable:
+                    self.edges.append(relation)
+                    self.parents[child.id] = original
+                    queue.append(child)
+
+    def copy_licenses(self):
+        """Give every copy its own copy of the license its original has or inherits."""
+        records = NodeLicenseRecord.objects.in_bulk([each.node_license_id for each in self.originals if each.node_license_id])
+        licenses = {}
+        for original in self.originals:
+            if original.node_license_id:
+                licenses[original.id] = records[original.node_license_id]
+            elif original.id == self.node.id:
+                licenses[original.id] = self.node.license
+            else:
+                licenses[original.id] = licenses[self.parents[original.id].id]
+
+        copies = {
+            original_id: NodeLicenseRecord(
+                node_license_id=record.node_license_id,
+                year=record.year,
+                copyright_holders=record.copyright_holders,
+            )
+            for original_id, record in licenses.items() if record
+        }
+        NodeLicenseRecord.objects.bulk_create(copies.values())
+        return copies
+
+    def make_copy(self, original):
+        """The unsaved copy of `original`, without its license."""
+        Node = apps.get_model('osf.Node')
+        fork = Node(**copied_fields(original, exclude=('type', )))
+        fork.is_fork = True
+        fork.forked_date = self.when
+        fork.forked_from_id = original.id
+        fork.wiki_private_uuids = {}
+        # Forks default to private status
+        fork.is_public = False
+        if original.id == self.node.id and self.title is None:
+            fork.title = FORK_PREFIX + original.title
+        elif original.id == self.node.id and self.title:
+            fork.title = self.title
+        return fork
+
+    def create_nodes(self):
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        Node = apps.get_model('osf.Node')
+
+        licenses = self.copy_licenses()
+        copies = []
+        for original in self.originals:
+            copy = self.make_copy(original)
+            copy.creator_id = self.user.id
+            copy.node_license = licenses.get(original.id)
+            copy.last_logged = self.when
+            copy.title = copy.title[:200]
+            copies.append(copy)
+        Node.objects.bulk_create(copies)
+
+        content_type = ContentType.objects.get_for_model(AbstractNode)
+        Guid.objects.bulk_create([
+            Guid(_id=guid, content_type=content_type, object_id=copy.id)
+            for copy, guid in zip(copies, generate_guids(len(copies)))
+        ])
+        copy_ids = [copy.id for copy in copies]
+        AbstractNode.objects.filter(id__in=copy_ids).update(root_id=copy_ids[0])
+        # Reload with their guids and root
+        reloaded = Node.objects.in_bulk(copy_ids)
+        self.copies = {original.id: reloaded[copy_id] for original, copy_id in zip(self.originals, copy_ids)}
+
+    def create_relations(self):
+        NodeRelation.objects.bulk_create([
+            NodeRelation(
+                parent=self.copies[relation['parent_id']],
+                # Node links still point at the linked node
+                child_id=relation['child_id'] if relation['is_node_link'] else self.copies[relation['child_id']].id,
+                is_node_link=relation['is_node_link'],
+                _order=relation['_order'],
+            ) for relation in self.edges + self.links
+        ])
+        NodeClosure.copy_tree({original_id: copy.id for original_id, copy in self.copies.items()})
+
+    def create_contributors(self):
+        Contributor.objects.bulk_create([
+            Contributor(user=self.user, node=copy, visible=True, read=True, write=True, admin=True, _order=0)
+            for copy in self.copies.values()
+        ])
+        ReadableNode.objects.bulk_create([
+            ReadableNode(user=self.user, node=copy, source=ReadableNode.CONTRIBUTOR)
+            for copy in self.copies.values()
+        ])
+        ReadableNode.refresh(self.copies[self.node.id].id, user_id=self.user.id)
+
+    def copy_tags(self):
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        copies = {original_id: copy.id for original_id, copy in self.copies.items()}
+        copy_m2m(AbstractNode._meta.get_field('tags'), copies)
+        copy_m2m(AbstractNode._meta.get_field('subjects'), copies)
+
+    def copy_logs(self):
+        copy_rows(
+            NodeLog, NodeLog._meta.get_field('node').column,
+            {original_id: copy.id for original_id, copy in self.copies.items()},
+            values={
+                '_id': OBJECT_ID_SQL.format(order_by='R.id'),
+                'created': '%(now)s',
+                'modified': '%(now)s',
+            },
+            params={'id_prefix': object_id_prefix(), 'now': self.when},
+        )
+        NodeLog.objects.bulk_create([
+            NodeLog(
+                action=NodeLog.NODE_FORKED,
+                params={
+                    'parent_node': self.parents[original.id]._id if original.id in self.parents else self.node.parent_id,
+                    'node': original._id,
+                    'registration': self.copies[original.id]._id,  # TODO: Remove this in favor of 'fork'
+                    'fork': self.copies[original.id]._id,
+                },
+                user=self.user,
+                node=self.copies[original.id],
+                original_node=original,
+                date=self.when,
+            ) for original in self.originals
+        ])
+
+    def copy_addons(self):
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        AbstractNode.prefetch_addons(self.originals)
+        for done, original in enumerate(self.originals, 1):
+            for addon in original.get_addons():
+                addon.after_fork(original, self.copies[original.id], self.user)
+            self.report(ADDONS, done)
+
+    def notify(self):
+        """Do what saving and logging each copy would have triggered."""
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        saved_fields = sorted(AbstractNode.SEARCH_UPDATE_FIELDS)
+        for original in self.originals:
+            copy = self.copies[original.id]
+            copy.update_or_enqueue_on_node_updated(self.user._id, True, saved_fields)
+            project_signals.contributor_added.send(copy, contributor=self.user, auth=self.auth, email_template='false')
+            increment_user_activity_counters(self.user._primary_key, self.log_action, self.when.isoformat())
+
+    def run(self):
+        start = time.time()
+        with transaction.atomic():
+            self.load()
+            self.create_nodes()
+            self.report(NODES)
+            self.create_relations()
+            self.report(RELATIONS)
+            self.create_contributors()
+            self.report(CONTRIBUTORS)
+            self.copy_tags()
+            self.report(TAGS)
+            self.copy_logs()
+            self.report(LOGS)
+            self.copy_addons()
+            self.notify()
+
+        copy = self.copies[self.node.id]
+        logger.info('{} {} node(s) of {} as {} in {:.1f}s'.format(self.description, len(self.originals), self.node._id, copy._id, time.time() - start))
+        return copy
+
+
+class SubtreeTemplate(SubtreeFork):
+    """New project made from a node and the components `auth.user` may read, like
+    `SubtreeFork` but starting afresh: node links, tags, logs, wiki pages and add-on
+    settings are not copied. Use `template_subtree`.
+    """
+
+    copy_node_links = False
+    log_action = NodeLog.CREATED_FROM
+    description = 'Templated'
+
+    def __init__(self, node, auth, changes=None, top_level=True, progress=None):
+        super(SubtreeTemplate, self).__init__(node, auth, progress=progress)
+        self.changes = changes or {}
+        self.top_level = top_level
+
+    def make_copy(self, original):
+        Node = apps.get_model('osf.Node')
+        new = Node(**copied_fields(original, exclude=('type', )))
+        new.is_fork = False
+        new.forked_date = None
+        new.wiki_private_uuids = {}
+        new.file_guid_to_share_uuids = {}
+
+        # set attributes which may be overridden by `changes`
+        new.is_public = False
+        new.description = ''
+        for attr, val in self.changes.get(original._id, {}).items():
+            setattr(new, attr, val)
+
+        # set attributes which may NOT be overridden by `changes`
+        new.template_node_id = original.id
+        new.created = self.when
+        # If that title hasn't been changed, apply the default prefix (once)
+        if (
+            original.id == self.node.id and self.top_level and
+            new.title == original.title and language.TEMPLATED_FROM_PREFIX not in new.title
+        ):
+            new.title = language.TEMPLATED_FROM_PREFIX + new.title
+        return new
+
+    def copy_tags(self):
+        pass
+
+    def copy_logs(self):
+        NodeLog.objects.bulk_create([
+            NodeLog(
+                action=NodeLog.CREATED_FROM,
+                params={
+                    'node': self.copies[original.id]._id,
+                    'template_node': {
+                        'id': original._id,
+                        'url': original.url,
+                        'title': original.title,
+                    },
+                },
+                user=self.user,
+                node=self.copies[original.id],
+                original_node=self.copies[original.id],
+                date=self.when,
+            ) for original in self.originals
+        ])
+
+    def copy_addons(self):
+        """Add the default add-ons, as for a new project."""
+        default_addons = [addon.short_name for addon in settings.ADDONS_AVAILABLE if 'node' in addon.added_default]
+        for done, original in enumerate(self.originals, 1):
+            for addon_name in default_addons:
+                self.copies[original.id].add_addon(addon_name, auth=None, log=False)
+            self.report(ADDONS, done)
+
+
+def fork_subtree(node, auth, title=None, progress=None):
+    """Fork `node` and the components `auth.user` may read. Permissions and the
+    state of `node` are checked by `AbstractNode.fork_node`.
+
+    :param str title: Title of the fork. Defaults to the node's title prefixed with "Fork of "
+    :param progress: Optional callable taking (stage, done, total)
+    :return Node: The fork of `node`
+    """
+    return SubtreeFork(node, auth, title=title, progress=progress).run()
+
+
+def template_subtree(node, auth, changes=None, top_level=True, progress=None):
+    """Create a new project from `node` and the components `auth.user` may read.
+    Permissions and the state of `node` are checked by `AbstractNode.use_as_template`.
+
+    :param dict changes: Attributes to set on the new nodes, keyed by the id of their template
+    :param bool top_level: Whether to prefix an unchanged title with "Templated from "
+    :param progress: Optional callable taking (stage, done, total)
+    :return Node: The node made from `node`
+    """
+    return SubtreeTemplate(node, auth, changes=changes, top_level=top_level, progress=progress).run()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""In-memory walks over the components of a node.
+
+`NodeTree` loads every component below a node, and the nodes those components link
+to, with a single query. Each loaded node is annotated with the relation that attaches
+it to its parent and, given an ``Auth``, with what the user may do with it, so the
+recursive helpers of ``AbstractNode`` (``get_descendants_recursive``,
+``find_readable_descendants``, ``has_permission_on_children``...) can walk the tree
+without querying every level.
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.db.models import Exists, F, OuterRef, Q
+
+from osf.models.contributor import Contributor
+from osf.models.node_relation import NodeClosure
+from osf.models.private_link import PrivateLink
+from osf.models.readable_node import ReadableNode
+
+
+class NodeTree(object):
+    """The components below `root`, deleted ones included, and their node links.
+
+    Every loaded node has ``tree_parent_id``, ``tree_is_node_link`` and ``tree_order``
+    attributes. A linked node is loaded once per link to it, and is a leaf of the tree:
+    its own components are only loaded if they are components of `root` too.
+
+    :param AbstractNode root:
+    :param Auth auth: Optional; loads the permissions of ``auth.user`` and whether
+        ``auth.private_key`` grants access, for `has_permission` and `can_view`
+    """
+
+    def __init__(self, root, auth=None):
+        self.root = root
+        self.auth = auth
+        self.user = auth.user if auth else None
+        self.anonymous_link = bool(auth and auth.private_key and getattr(auth.private_link, 'anonymous', False))
+        self.children = defaultdict(list)  # Parent id -> child nodes
+        if root.pk:
+            for node in self.get_queryset():
+                self.children[node.tree_parent_id].append(node)
+        for nodes in self.children.values():
+            nodes.sort(key=lambda node: node.tree_order)
+
+    def get_queryset(self):
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        descendant_ids = NodeClosure.objects.filter(ancestor_id=self.root.id).values('descendant_id')
+        queryset = AbstractNode.objects.filter(
+            Q(_parents__parent_id=self.root.id) | Q(_parents__parent_id__in=descendant_ids)
+        ).annotate(
+            tree_parent_id=F('_parents__parent_id'),
+            tree_is_node_link=F('_parents__is_node_link'),
+            tree_order=F('_parents___order'),
+        )
+        if self.user:
+            contributor = Contributor.objects.filter(node_id=OuterRef('pk'), user_id=self.user.id)
+            queryset = queryset.annotate(
+                # Matches has_permission(user, 'read'), implicit admins of parents included
+                tree_read=Exists(ReadableNode.objects.filter(node_id=OuterRef('pk'), user_id=self.user.id)),
+                tree_write=Exists(contributor.filter(write=True)),
+                tree_admin=Exists(contributor.filter(admin=True)),
+            )
+        if self.auth and self.auth.private_key:
+            queryset = queryset.annotate(tree_private_link=Exists(
+                PrivateLink.objects.filter(nodes=OuterRef('pk'), key=self.auth.private_key, is_deleted=False)
+            ))
+        return queryset
+
+    def get_children(self, node=None, primary_only=False, include_deleted=True):
+        """The children of `node`, or of the root, in their display order."""
+        return [
+            child for child in self.children[(node or self.root).id]
+            if not (primary_only and child.tree_is_node_link) and (include_deleted or not child.is_deleted)
+        ]
+
+    def walk(self, node=None, primary_only=False, include_deleted=True):
+        """Yield the descendants of `node`, or of the root, depth first, parents before
+        their children. Linked nodes are yielded unless `primary_only`, but not walked.
+        Deleted nodes and their components are skipped unless `include_deleted`.
+        """
+        for child in self.get_children(node, primary_only=primary_only, include_deleted=include_deleted):
+            yield child
+            if not child.tree_is_node_link:
+                for descendant in self.walk(child, primary_only=primary_only, include_deleted=include_deleted):
+                    yield descendant
+
+    def has_permission(self, node, permission):
+        """Whether the user has `permission` on a loaded node, as
+        ``node.has_permission(user, permission)`` would say.
+        """
+        return getattr(node, 'tree_{}'.format(permission), False)
+
+    def can_view(self, node):
+        """Whether the auth can view a loaded node, as ``node.can_view(auth)`` would say."""
+        private_link = getattr(node, 'tree_private_link', False)
+        if self.anonymous_link:
+            return private_link
+        if not self.auth:
+            return node.is_public
+        return node.is_public or self.has_permission(node, 'read') or private_link
+
+    def find_readable(self, node=None):
+        """Yield the first readable node(s) in each branch below `node`, or the root,
+        skipping deleted components.
+        """
+        branches = []
+        for child in self.get_children(node, primary_only=True, include_deleted=False):
+            if self.can_view(child):
+                yield child
+            else:
+                branches.append(child)
+        for branch in branches:
+            for readable in self.find_readable(branch):
+                yield readable
+
+    def find_next(self, condition, node=None):
+        """The first nodes meeting `condition` in each branch below `node`, or the root,
+        as a list of ``(node, [(child, [...]), ...])``, oldest first.
+        """
+        ret = []
+        for child in sorted(self.get_children(node), key=lambda each: each.created):
+            if condition(self.auth, child) or child.tree_is_node_link:
+                ret.append((child, []))
+            else:
+                ret.append((child, self.find_next(condition, child)))
+        return [item for item in ret if item[1] or condition(self.auth, item[0])]  # prune empty branches
+
+    def has_node_links(self):
+        """Whether the root or any of its components, deleted ones included, links to a node."""
+        nodes = [self.root] + list(self.walk(primary_only=True))
+        return any(child.tree_is_node_link for node in nodes for child in self.children[node.id])
@@ -0,0 +1,75 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from addons.github.tests.factories import GitHubNodeSettingsFactory
+from framework.auth.core import Auth
+from osf.models import AbstractNode
+from osf_tests.factories import AuthUserFactory, ProjectFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestAddonSettingsCache:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def project(self, user):
+        return AbstractNode.load(ProjectFactory(creator=user)._id)
+
+    def test_get_addons_queries(self, project):
+        with CaptureQueriesContext(connection) as ctx:
+            addons = project.get_addons()
+        # One query to find the settings, one per addon
+        assert len(ctx.captured_queries) == 1 + len(addons)
+        assert {'osfstorage', 'wiki'} <= set(project.get_addon_names())
+
+        with CaptureQueriesContext(connection) as ctx:
+            project.get_addons()
+            project.get_addon('wiki')
+            project.get_addon('github')
+            project.get_oauth_addons()
+        assert len(ctx.captured_queries) == 0
+
+    def test_prefetch_addons_for_many_owners(self, user):
+        projects = [AbstractNode.load(ProjectFactory(creator=user)._id) for _ in range(10)]
+        with CaptureQueriesContext(connection) as ctx:
+            AbstractNode.prefetch_addons(projects)
+            addon_names = [project.get_addon_names() for project in projects]
+        assert len(ctx.captured_queries) == 1 + len(addon_names[0])
+        assert all(names == addon_names[0] for names in addon_names)
+        assert projects[3].get_addon('osfstorage').owner is projects[3]
+
+    def test_user_addons(self, user):
+        user.add_addon('github')
+        user = user.__class__.objects.get(pk=user.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            assert 'github' in user.get_addon_names()
+        assert len(ctx.captured_queries) == 1 + len(user.get_addons())
+
+    def test_add_addon_drops_cache(self, user, project):
+        project.get_addons()
+        project.add_addon('github', auth=Auth(user))
+        assert 'github' in project.get_addon_names()
+
+    def test_delete_addon_drops_cache(self, user, project):
+        project.add_addon('github', auth=Auth(user))
+        project.get_addons()
+        project.delete_addon('github', auth=Auth(user))
+        assert 'github' not in project.get_addon_names()
+        assert project.get_addon('github', deleted=True).deleted
+
+    def test_saving_settings_updates_cache(self, project):
+        project.get_addons()
+        node_settings = GitHubNodeSettingsFactory(owner=project)
+        assert project.get_addon('github') == node_settings
+
+    def test_refresh_from_db_drops_cache(self, project):
+        project.get_addons()
+        GitHubNodeSettingsFactory(owner=AbstractNode.objects.get(pk=project.pk))
+        assert project.get_addon('github') is None
+        project.refresh_from_db()
+        assert project.get_addon('github') is not None
@@ -5,6 +5,7 @@ Unit tests for analytics logic in framework/analytics/__init__.py
 
 import unittest
 
+import mock
 import pytest
 from django.utils import timezone
 from nose.tools import *  # flake8: noqa  (PEP8 asserts)
@@ -14,7 +15,8 @@ from datetime import datetime
 
 from framework import analytics, sessions
 from framework.sessions import session
-from osf.models import PageCounter, Session
+from osf.models import DailyPageCount, DailyUserActivityCount, PageCounter, Session, UserActivityCounter
+from osf.models.analytics import activity_buffer, page_counter_buffer
 
 from tests.base import OsfTestCase
 from osf_tests.factories import UserFactory, ProjectFactory
@@ -42,3 +44,62 @@ class TestAnalytics(OsfTestCase):
         assert_equal(user.get_activity_points(), 0)
         analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
         assert_equal(user.get_activity_points(), 1)
+
+    def test_activity_is_counted_per_day(self):
+        user = UserFactory()
+        date = timezone.now()
+        analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+        analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+
+        daily = DailyUserActivityCount.objects.get(user_guid=user._id)
+        assert_equal((daily.action, daily.date, daily.total), ('project_created', date.date(), 2))
+
+
+@mock.patch('framework.analytics.buffer.settings.COUNTER_FLUSH_INTERVAL', 60)
+class TestCounterBuffer(OsfTestCase):
+
+    def setUp(self):
+        super(TestCounterBuffer, self).setUp()
+        self.session = mock.patch('osf.models.analytics.session').start()
+        self.session.data = {}
+        # Flushed by hand, so no flusher thread
+        self.ensure_flusher = mock.patch.object(page_counter_buffer, '_ensure_flusher').start()
+        mock.patch.object(activity_buffer, '_ensure_flusher').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        page_counter_buffer.flush()
+        activity_buffer.flush()
+        super(TestCounterBuffer, self).tearDown()
+
+    def test_counts_are_buffered_until_flushed(self):
+        for i in range(3):
+            PageCounter.update_counter('download:abc12:xyz', None)
+        assert_true(self.ensure_flusher.called)
+        assert_equal(PageCounter.get_basic_counters('download:abc12:xyz'), (None, None))
+
+        assert_equal(page_counter_buffer.flush(), 1)
+        assert_equal(PageCounter.get_basic_counters('download:abc12:xyz'), (1, 3))
+        daily = DailyPageCount.objects.get(page='download:abc12:xyz')
+        assert_equal((daily.date, daily.total, daily.unique), (timezone.now().date(), 3, 1))
+
+    def test_flushes_add_up(self):
+        PageCounter.update_counter('download:abc12:xyz', None)
+        page_counter_buffer.flush()
+        PageCounter.update_counter('download:abc12:xyz', None)
+        page_counter_buffer.flush()
+        assert_equal(PageCounter.get_basic_counters('download:abc12:xyz'), (1, 2))
+        assert_equal(DailyPageCount.objects.get(page='download:abc12:xyz').total, 2)
+
+    def test_failed_flush_keeps_counts(self):
+        PageCounter.update_counter('download:abc12:xyz', None)
+        with mock.patch.object(page_counter_buffer, 'flush_func', side_effect=Exception('db down')):
+            assert_equal(page_counter_buffer.flush(), 0)
+        assert_equal(page_counter_buffer.pending().values(), [(1, 1, 1, 1)])
+
+    def test_activity_is_buffered(self):
+        user = UserFactory()
+        analytics.increment_user_activity_counters(user._id, 'project_created', timezone.now().isoformat())
+        assert_equal(UserActivityCounter.get_total_activity_count(user._id), 0)
+        activity_buffer.flush()
+        assert_equal(UserActivityCounter.get_total_activity_count(user._id), 1)
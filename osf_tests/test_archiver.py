@@ -40,6 +40,7 @@ from website import mails
 from website import settings
 from osf.models import RegistrationSchema, Registration
 from osf.utils.sanitize import strip_html
+from addons.base.exceptions import FileTreeSizeExceeded
 from addons.base.models import BaseStorageAddon
 from api.base.utils import waterbutler_api_url_for
 
@@ -193,7 +194,7 @@ class MockAddon(object):
     def __init__(self, **kwargs):
         self._id = fake.md5()
 
-    def _get_file_tree(self, user, version):
+    def _get_file_tree(self, user, version, **kwargs):
         return FILE_TREE
 
     def after_register(self, *args):
@@ -458,6 +459,58 @@ class TestStorageAddonBase(ArchiverTestCase):
         for addon in [a for a in settings.ADDONS_ARCHIVABLE if a not in ['wiki', 'forward']]:
             self._test_addon(addon)
 
+    def _mock_listings(self, file_tree):
+        # Serve the children of each folder in `file_tree`, like WaterButler does
+        listings = {}
+        folders = [file_tree]
+        while folders:
+            folder = folders.pop()
+            listings[folder['path']] = [
+                {key: value for key, value in child.items() if key != 'children'}
+                for child in folder['children']
+            ]
+            folders.extend(child for child in folder['children'] if child['kind'] == 'folder')
+
+        def list_children(filenode, user, cookie=None, version=None):
+            return copy.deepcopy(listings[filenode['path']])
+        return mock.patch.object(BaseStorageAddon, '_get_fileobj_child_metadata', side_effect=list_children)
+
+    def test_get_file_tree_lists_every_folder(self):
+        file_tree = file_tree_factory(3, 3, 3)
+        addon = self.src.get_addon('osfstorage')
+        progress = mock.Mock()
+        with self._mock_listings(file_tree) as mock_list:
+            result = addon._get_file_tree(copy.deepcopy(file_tree), self.user, version='latest', progress=progress)
+
+        assert_equal(result, file_tree)
+        assert_equal(mock_list.call_count, 4)
+        assert_true(all(each[1]['version'] == 'latest' for each in mock_list.call_args_list))
+        expected = archiver_utils.aggregate_file_tree_metadata('osfstorage', file_tree, self.user)
+        assert_equal(progress.call_args, call(expected['num_files'], expected['disk_usage']))
+
+    def test_get_file_tree_stops_at_max_size(self):
+        file_tree = file_tree_factory(3, 3, 3)
+        addon = self.src.get_addon('osfstorage')
+        with self._mock_listings(file_tree) as mock_list:
+            with assert_raises(FileTreeSizeExceeded) as e:
+                addon._get_file_tree(copy.deepcopy(file_tree), self.user, max_size=1)
+
+        assert_equal(mock_list.call_count, 1)
+        assert_greater(e.exception.size, 1)
+        assert_equal(len(e.exception.file_tree['children']), 4)
+        assert_not_in('children', e.exception.file_tree['children'][-1])
+
+    @mock.patch('website.archiver.tasks.settings.MAX_ARCHIVE_SIZE', 100)
+    def test_stat_addon_stops_at_max_archive_size(self):
+        file_tree = file_tree_factory(3, 3, 3)
+        file_tree['children'][0]['size'] = 101
+        with self._mock_listings(file_tree) as mock_list:
+            with assert_raises(ArchiverSizeExceeded) as e:
+                stat_addon('osfstorage', self.archive_job._id)
+
+        assert_equal(mock_list.call_count, 1)
+        assert_greater(e.exception.result['disk_usage'], 100)
+
 class TestArchiverTasks(ArchiverTestCase):
 
     @mock.patch('framework.celery_tasks.handlers.enqueue_task')
@@ -512,7 +565,7 @@ class TestArchiverTasks(ArchiverTestCase):
     def test_archive_node_does_not_archive_empty_addons(self, mock_archive_addon, mock_send):
         with mock.patch('osf.models.mixins.AddonModelMixin.get_addon') as mock_get_addon:
             mock_addon = MockAddon()
-            def empty_file_tree(user, version):
+            def empty_file_tree(user, version, **kwargs):
                 return {
                     'path': '/',
                     'kind': 'folder',
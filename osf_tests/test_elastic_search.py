@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import os
+import tempfile
 import time
 import unittest
 import logging
@@ -16,6 +18,7 @@ from website import settings
 import website.search.search as search
 from website.search import elastic_search
 from website.search.util import build_query
+from website.search_migration import parallel
 from website.search_migration.migrate import migrate, migrate_collected_metadata
 from osf.models import (
     Retraction,
@@ -1271,3 +1274,60 @@ class TestSearchFiles(OsfTestCase):
 
         find = query_file('GreenLight.mp3')['results']
         assert_equal(len(find), 0)
+
+    def test_update_node_indexes_files_in_one_bulk_request(self):
+        for i in range(5):
+            self.root.append_file('Track {}.wav'.format(i))
+        with mock.patch.object(elastic_search.client(), 'bulk', wraps=elastic_search.client().bulk) as mock_bulk:
+            elastic_search.update_node(self.node, index=elastic_search.INDEX)
+        assert_equal(mock_bulk.call_count, 1)
+        find = query_file('Track')['results']
+        assert_equal(len(find), 5)
+
+    def test_update_node_removes_files_of_private_node(self):
+        self.root.append_file('Shake.wav')
+        self.node.is_public = False
+        self.node.save()
+        elastic_search.update_node(self.node, index=elastic_search.INDEX)
+        find = query_file('Shake.wav')['results']
+        assert_equal(len(find), 0)
+
+
+class TestParallelMigrate(unittest.TestCase):
+
+    def test_bulk_with_backoff_retries_rejected_documents(self):
+        actions = [{'_id': 1}, {'_id': 2}, {'_id': 3}]
+        attempts = []
+
+        def streaming_bulk(client, pending, **kwargs):
+            attempts.append([action['_id'] for action in pending])
+            for action in pending:
+                if len(attempts) == 1 and action['_id'] == 2:
+                    yield False, {'index': {'status': 429}}
+                else:
+                    yield True, {'index': {'status': 201}}
+
+        with mock.patch('website.search_migration.parallel.helpers.streaming_bulk', side_effect=streaming_bulk), \
+                mock.patch('website.search_migration.parallel.time.sleep') as mock_sleep:
+            assert_equal(parallel.bulk_with_backoff(actions, initial_backoff=1), 3)
+        assert_equal(attempts, [[1, 2, 3], [2]])
+        mock_sleep.assert_called_once_with(1)
+
+    def test_bulk_with_backoff_gives_up(self):
+        rejected = lambda client, pending, **kwargs: ((False, {'index': {'status': 429}}) for _ in pending)
+        with mock.patch('website.search_migration.parallel.helpers.streaming_bulk', side_effect=rejected), \
+                mock.patch('website.search_migration.parallel.time.sleep'):
+            with assert_raises(parallel.BulkRejectedError):
+                parallel.bulk_with_backoff([{'_id': 1}], max_retries=2)
+
+    def test_checkpoint_resumes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        checkpoint = parallel.Checkpoint(path)
+        checkpoint.index = 'website_v2'
+        checkpoint.mark_done(parallel.range_key('nodes', 'update', 0, 100))
+
+        resumed = parallel.Checkpoint(path)
+        assert_equal(resumed.index, 'website_v2')
+        assert_equal(resumed.done, {'nodes:update:0:100'})
+        resumed.remove()
+        assert_false(os.path.exists(path))
@@ -0,0 +1,207 @@
+import mock
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from addons.wiki.tests.factories import WikiFactory, WikiVersionFactory
+from framework.auth.core import Auth
+from osf.management.commands.backfill_node_closure import verify_node_closure
+from osf.models import Contributor, NodeClosure, NodeLog, NodeRelation, ReadableNode
+from osf.utils import forks
+from osf_tests.factories import AuthUserFactory, NodeFactory, ProjectFactory
+from website import mails
+from website.project.tasks import fork_node_async
+
+pytestmark = pytest.mark.django_db
+
+
+def inserts_into(ctx, model):
+    prefix = 'INSERT INTO "{}"'.format(model._meta.db_table)
+    return len([query for query in ctx.captured_queries if query['sql'].startswith(prefix)])
+
+
+class TestForkSubtree:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def auth(self, user):
+        return Auth(user)
+
+    @pytest.fixture()
+    def project(self, user):
+        project = ProjectFactory(creator=user, title='Project')
+        project.add_tag('Project tag', auth=Auth(user))
+        return project
+
+    @pytest.fixture()
+    def components(self, user, project):
+        first = NodeFactory(creator=user, parent=project, title='First')
+        second = NodeFactory(creator=user, parent=project, title='Second')
+        nested = NodeFactory(creator=user, parent=first, title='Nested')
+        nested.add_tag('Nested tag', auth=Auth(user))
+        return first, second, nested
+
+    def test_copies_the_tree(self, user, auth, project, components):
+        first, second, nested = components
+        linked = ProjectFactory(is_public=True)
+        first.add_pointer(linked, auth=auth)
+
+        fork = project.fork_node(auth)
+
+        assert fork.title == 'Fork of Project'
+        assert [child.title for child in fork.nodes] == ['First', 'Second']
+        fork_first = fork.nodes[0]
+        fork_nested = fork_first.get_nodes(is_node_link=False)[0]
+        assert fork_nested.title == 'Nested'
+        assert fork_nested.forked_from == nested
+        assert fork_nested.root == fork
+        assert fork_nested.parent_node == fork_first
+        assert list(fork_first.linked_nodes.all()) == [linked]
+        assert fork_nested.tags.get().name == 'Nested tag'
+        assert fork_nested.logs.count() == nested.logs.count() + 1
+        assert fork_nested.logs.latest().params['parent_node'] == first._id
+
+        assert verify_node_closure() == (0, 0)
+        assert set(NodeClosure.objects.filter(ancestor=fork).values_list('descendant_id', 'depth')) == {
+            (fork_first.id, 1),
+            (fork.nodes[1].id, 1),
+            (fork_nested.id, 2),
+        }
+        for each in (fork, fork_first, fork_nested):
+            assert each.is_fork
+            assert each.is_public is False
+            assert list(each.contributors) == [user]
+            assert each.can_view(auth)
+            assert ReadableNode.objects.filter(user=user, node=each, source=ReadableNode.CONTRIBUTOR).exists()
+
+    def test_inserts_each_table_once(self, auth, project, components):
+        for component in components:
+            NodeFactory(creator=auth.user, parent=component)
+
+        with CaptureQueriesContext(connection) as ctx:
+            fork = project.fork_node(auth)
+
+        assert len(list(fork.get_descendants_recursive())) == 6
+        assert inserts_into(ctx, NodeRelation) == 1
+        assert inserts_into(ctx, Contributor) == 1
+        assert inserts_into(ctx, NodeClosure) == 1
+        # Copied logs, and the fork logs
+        assert inserts_into(ctx, NodeLog) == 2
+
+    def test_unreadable_components_are_left_out(self, auth, project, components):
+        first, second, nested = components
+        hidden = NodeFactory(parent=project, title='Hidden')
+        NodeFactory(parent=hidden, creator=hidden.creator)
+        reader = AuthUserFactory()
+        project.add_contributor(reader, permissions=['read'], auth=auth, save=True)
+        first.add_contributor(reader, permissions=['read'], auth=auth, save=True)
+
+        fork = project.fork_node(Auth(reader))
+
+        assert [child.title for child in fork.nodes] == ['First']
+        assert fork.nodes[0].nodes == []
+
+    def test_copies_wiki_pages(self, auth, project):
+        wiki_page = WikiFactory(user=auth.user, node=project)
+        WikiVersionFactory(wiki_page=wiki_page)
+        WikiVersionFactory(wiki_page=wiki_page, identifier=2, content='Newer')
+
+        fork = project.fork_node(auth)
+
+        fork_page = fork.wikis.get()
+        assert fork_page._id != wiki_page._id
+        assert fork_page.user == auth.user
+        assert list(fork_page.get_versions().values_list('identifier', flat=True)) == [2, 1]
+        current = fork.get_wiki_version(wiki_page.page_name)
+        assert current.rendered_html is None
+        assert 'Newer' in current.html(fork)
+
+    def test_reports_progress(self, auth, project, components):
+        progress = mock.Mock()
+        project.fork_node(auth, progress=progress)
+
+        calls = [call[0] for call in progress.call_args_list]
+        assert [stage for stage, _, _ in calls if stage != forks.ADDONS] == list(forks.STAGES[:-1])
+        assert [(done, total) for stage, done, total in calls if stage == forks.ADDONS] == [(1, 4), (2, 4), (3, 4), (4, 4)]
+
+    @mock.patch('website.project.tasks.mails.send_mail')
+    def test_fork_node_async(self, mock_send_mail, auth, project, components):
+        fork_id = fork_node_async.delay(project._id, auth.user._id, title='Async fork').get()
+        fork = project.forks.get()
+        assert fork._id == fork_id
+        assert fork.title == 'Async fork'
+        assert len(list(fork.get_descendants_recursive())) == 3
+        assert mock_send_mail.call_args[0][1] == mails.FORK_COMPLETED
+        assert mock_send_mail.call_args[1]['guid'] == fork._id
+
+    @mock.patch('website.project.tasks.mails.send_mail')
+    def test_fork_node_async_failure(self, mock_send_mail, auth, project):
+        with mock.patch.object(forks.SubtreeFork, 'copy_logs', side_effect=ValueError):
+            with pytest.raises(ValueError):
+                fork_node_async.delay(project._id, auth.user._id).get()
+        assert not project.forks.exists()
+        assert mock_send_mail.call_args[0][1] == mails.FORK_FAILED
+
+
+class TestTemplateSubtree:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def auth(self, user):
+        return Auth(user)
+
+    @pytest.fixture()
+    def project(self, user):
+        project = ProjectFactory(creator=user, title='Project', description='Description')
+        project.add_tag('Project tag', auth=Auth(user))
+        return project
+
+    @pytest.fixture()
+    def components(self, user, project):
+        first = NodeFactory(creator=user, parent=project, title='First')
+        second = NodeFactory(creator=user, parent=project, title='Second')
+        nested = NodeFactory(creator=user, parent=first, title='Nested')
+        return first, second, nested
+
+    def test_copies_the_tree(self, user, auth, project, components):
+        first, second, nested = components
+        first.add_pointer(ProjectFactory(is_public=True), auth=auth)
+
+        new = project.use_as_template(auth, changes={second._id: {'title': 'Changed'}})
+
+        assert new.title == 'Templated from Project'
+        assert new.description == ''
+        assert [child.title for child in new.nodes] == ['First', 'Changed']
+        new_first = new.nodes[0]
+        assert new_first.linked_nodes.count() == 0
+        new_nested = new_first.get_nodes(is_node_link=False)[0]
+        assert new_nested.template_node == nested
+        assert new_nested.root == new
+
+        assert verify_node_closure() == (0, 0)
+        for each in (new, new_first, new_nested):
+            assert not each.is_fork
+            assert each.is_public is False
+            assert list(each.contributors) == [user]
+            assert not each.tags.exists()
+            assert list(each.logs.values_list('action', flat=True)) == [NodeLog.CREATED_FROM]
+            assert each.has_addon('osfstorage')
+
+    def test_inserts_each_table_once(self, auth, project, components):
+        for component in components:
+            NodeFactory(creator=auth.user, parent=component)
+
+        with CaptureQueriesContext(connection) as ctx:
+            new = project.use_as_template(auth)
+
+        assert len(list(new.get_descendants_recursive())) == 6
+        assert inserts_into(ctx, NodeRelation) == 1
+        assert inserts_into(ctx, Contributor) == 1
+        assert inserts_into(ctx, NodeClosure) == 1
+        assert inserts_into(ctx, NodeLog) == 1
@@ -1,10 +1,11 @@
+import gzip
 import os
 
 import pytest
 import mock
 import shutil
 import tempfile
-import xml
+import xml.etree.ElementTree
 import urlparse
 
 from scripts import generate_sitemap
@@ -13,22 +14,32 @@ from osf_tests.factories import (AuthUserFactory, ProjectFactory, RegistrationFa
 from website import settings
 
 
+def read_sitemap_urls():
+    # Note: namespace was defined in the XML file, therefore necessary to include in tag
+    namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+    sitemap_dir = os.path.join(settings.STATIC_FOLDER, 'sitemaps')
+
+    # Parse the index, then every gzipped shard it lists
+    with open(os.path.join(sitemap_dir, 'sitemap_index.xml')) as f:
+        index = xml.etree.ElementTree.parse(f)
+    urls = []
+    for loc in index.iter(namespace + 'loc'):
+        with gzip.open(os.path.join(sitemap_dir, loc.text.rsplit('/', 1)[-1])) as f:
+            tree = xml.etree.ElementTree.parse(f)
+        urls.extend(element.text for element in tree.iter(namespace + 'loc'))
+
+    return urls
+
+
 def get_all_sitemap_urls():
     # Create temporary directory for the sitemaps to be generated
 
     generate_sitemap.main()
 
-    # Parse the generated XML sitemap file
-    with open(os.path.join(settings.STATIC_FOLDER, 'sitemaps/sitemap_0.xml')) as f:
-        tree = xml.etree.ElementTree.parse(f)
+    urls = read_sitemap_urls()
 
     shutil.rmtree(settings.STATIC_FOLDER)
 
-    # Get all the urls in the sitemap
-    # Note: namespace was defined in the XML file, therefore necessary to include in tag
-    namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
-    urls = [element.text for element in tree.iter(namespace + 'loc')]
-
     return urls
 
 
@@ -175,3 +186,17 @@ class TestGenerateSitemap:
             urls = get_all_sitemap_urls()
 
         assert urlparse.urljoin(settings.DOMAIN, project_deleted.url) not in urls
+
+    def test_incremental_rewrites_changed_shards(self, project_private, all_included_links, create_tmp_directory):
+
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory):
+            generate_sitemap.main()
+            project_private.is_public = True
+            project_private.save()
+            with mock.patch.object(generate_sitemap, 'write_shard', wraps=generate_sitemap.write_shard) as write_shard:
+                generate_sitemap.main(incremental=True)
+            urls = read_sitemap_urls()
+            shutil.rmtree(settings.STATIC_FOLDER)
+
+        assert 'preprint' not in {call[0][1] for call in write_shard.call_args_list}
+        assert set(urls) == set(all_included_links + [urlparse.urljoin(settings.DOMAIN, project_private.url)])
@@ -234,6 +234,18 @@ class TestParentNode:
         assert result.count() == 1
         assert grandchild in result
 
+    def test_get_children_active_leaves_out_deleted_children_and_their_components(self):
+        root = ProjectFactory()
+        child = NodeFactory(parent=root)
+        live = NodeFactory(parent=child)
+        deleted = NodeFactory(parent=child)
+        live_under_deleted = NodeFactory(parent=deleted)
+        deleted.is_deleted = True
+        deleted.save()
+
+        assert set(Node.objects.get_children(child)) == {live, deleted, live_under_deleted}
+        assert set(Node.objects.get_children(child, active=True)) == {live}
+
     def test_get_children_with_links(self):
         root = ProjectFactory()
         child = NodeFactory(parent=root)
@@ -2356,6 +2368,20 @@ class TestNodeTraversals:
         assert len(descendants[0][1]) == 1  # only one visible child of comp1
         assert len(descendants[1][1]) == 0  # don't auto-include comp2's children
 
+    def test_next_descendants_does_not_search_linked_nodes(self, root, user, auth):
+        comp = ProjectFactory(creator=user, parent=root, title='Component')
+        linked = ProjectFactory(creator=user, title='Linked')
+        ProjectFactory(creator=user, parent=linked, title='Wanted')
+        matching_link = ProjectFactory(creator=user, title='Wanted link')
+        comp.add_pointer(linked, auth=auth)
+        comp.add_pointer(matching_link, auth=auth)
+        # A cycle of node links
+        linked.add_pointer(root, auth=auth)
+
+        descendants = root.next_descendants(auth, condition=lambda auth, node: node.title.startswith('Wanted'))
+        # Linked nodes are checked, but the components below them are not
+        assert descendants == [(comp, [(matching_link, [])])]
+
     @mock.patch('osf.models.node.AbstractNode.update_search')
     def test_delete_registration_tree(self, mock_update_search):
         proj = NodeFactory()
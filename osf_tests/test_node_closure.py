@@ -0,0 +1,77 @@
+import pytest
+
+from framework.auth.core import Auth
+from osf.management.commands.backfill_node_closure import backfill_node_closure, verify_node_closure
+from osf.models import AbstractNode, NodeClosure, NodeRelation
+from osf_tests.factories import (
+    AuthUserFactory,
+    NodeFactory,
+    ProjectFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def closure_pairs():
+    return set(NodeClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+
+class TestNodeClosure:
+
+    @pytest.fixture()
+    def root(self):
+        return ProjectFactory()
+
+    @pytest.fixture()
+    def child(self, root):
+        return NodeFactory(parent=root)
+
+    @pytest.fixture()
+    def grandchild(self, child):
+        return NodeFactory(parent=child)
+
+    def test_rows_created_for_components(self, root, child, grandchild):
+        assert closure_pairs() == {
+            (root.id, child.id, 1),
+            (root.id, grandchild.id, 2),
+            (child.id, grandchild.id, 1),
+        }
+
+    def test_node_links_are_not_included(self, root, child):
+        linked = ProjectFactory()
+        child.add_node_link(linked, auth=Auth(child.creator), save=True)
+        assert not NodeClosure.objects.filter(descendant=linked).exists()
+        assert not NodeClosure.objects.filter(ancestor=linked).exists()
+
+    def test_rows_removed_with_relation(self, root, child, grandchild):
+        NodeRelation.objects.get(parent=root, child=child).delete()
+        assert closure_pairs() == {(child.id, grandchild.id, 1)}
+
+    def test_subtree_attached_to_new_parent(self, root, child, grandchild):
+        new_root = ProjectFactory()
+        NodeRelation.objects.get(parent=root, child=child).delete()
+        NodeRelation.objects.create(parent=new_root, child=child)
+        assert set(NodeClosure.objects.filter(ancestor=new_root).values_list('descendant_id', 'depth')) == {
+            (child.id, 1),
+            (grandchild.id, 2),
+        }
+        assert not NodeClosure.objects.filter(ancestor=root).exists()
+
+    def test_get_root_and_children(self, root, child, grandchild):
+        assert grandchild.get_root() == root
+        assert root.get_root() == root
+        assert list(AbstractNode.objects.get_children(child)) == [grandchild]
+
+    def test_implicit_admin_read(self, root, child, grandchild):
+        admin = AuthUserFactory()
+        root.add_contributor(admin, permissions=['read', 'write', 'admin'], auth=Auth(root.creator), save=True)
+        viewable = AbstractNode.objects.can_view(user=admin)
+        assert {root, child, grandchild} <= set(viewable)
+
+    def test_backfill_and_verify(self, root, child, grandchild):
+        expected = closure_pairs()
+        NodeClosure.objects.all().delete()
+        assert verify_node_closure() == (3, 0)
+        backfill_node_closure()
+        assert closure_pairs() == expected
+        assert verify_node_closure() == (0, 0)
@@ -0,0 +1,100 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from framework.auth.core import Auth
+from osf.utils.node_tree import NodeTree
+from osf_tests.factories import AuthUserFactory, NodeFactory, PrivateLinkFactory, ProjectFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def count_queries(func, *args, **kwargs):
+    with CaptureQueriesContext(connection) as ctx:
+        func(*args, **kwargs)
+    return len(ctx.captured_queries)
+
+
+class TestNodeTree:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def project(self, user):
+        return ProjectFactory(creator=user)
+
+    @pytest.fixture()
+    def components(self, user, project):
+        # 20 components of 9 components each
+        components = []
+        for _ in range(20):
+            component = NodeFactory(creator=user, parent=project)
+            components.append(component)
+            components.extend(NodeFactory(creator=user, parent=component) for _ in range(9))
+        return components
+
+    @pytest.fixture()
+    def reader(self, components):
+        reader = AuthUserFactory()
+        components[-1].add_contributor(reader, permissions=['read'], save=True)
+        return reader
+
+    def test_get_descendants_recursive(self, project, components):
+        linked = ProjectFactory(is_public=True)
+        components[-1].add_pointer(linked, auth=Auth(project.creator))
+
+        assert count_queries(lambda: list(project.get_descendants_recursive())) == 1
+        descendants = list(project.get_descendants_recursive())
+        assert descendants[:3] == [components[0], components[1], components[2]]
+        assert descendants[-1] == linked
+        assert list(project.get_descendants_recursive(primary_only=True)) == components
+
+    def test_has_pointers_recursive(self, user, project, components):
+        assert count_queries(lambda: project.has_pointers_recursive) == 1
+        assert project.has_pointers_recursive is False
+
+        components[-1].add_pointer(ProjectFactory(), auth=Auth(user))
+        assert project.has_pointers_recursive is True
+
+    def test_find_readable_descendants(self, project, components, reader):
+        auth = Auth(reader)
+        assert count_queries(lambda: list(project.find_readable_descendants(auth))) == 1
+        assert list(project.find_readable_descendants(auth)) == [components[-1]]
+
+    def test_find_readable_descendants_with_private_link(self, user, project, components):
+        link = PrivateLinkFactory(creator=user)
+        link.nodes.add(components[12])
+        auth = Auth(private_key=link.key)
+        assert list(project.find_readable_descendants(auth)) == [components[12]]
+
+    def test_has_permission_on_children(self, project, components, reader):
+        own = count_queries(project.has_permission, reader, 'read')
+        assert count_queries(project.has_permission_on_children, reader, 'read') == own + 1
+        assert project.has_permission_on_children(reader, 'read') is True
+        assert project.has_permission_on_children(reader, 'write') is False
+
+        components[-1].remove_node(Auth(project.creator))
+        assert project.has_permission_on_children(reader, 'read') is False
+
+    def test_next_descendants(self, project, components, reader):
+        def condition(auth, node):
+            return node.is_public
+        assert count_queries(project.next_descendants, Auth(reader), condition=condition) == 1
+
+        components[11].is_public = True
+        components[11].save()
+        descendants = project.next_descendants(Auth(reader), condition=condition)
+        assert descendants == [(components[10], [(components[11], [])])]
+
+    def test_parents(self, project, components):
+        assert count_queries(lambda: components[-1].parents) == 1
+        assert components[-1].parents == [components[-10], project]
+        assert project.parents == []
+
+    def test_deleted_components_are_loaded(self, user, project, components):
+        components[0].remove_node(Auth(user))
+        tree = NodeTree(project)
+        assert len(list(tree.walk())) == 200
+        assert len(list(tree.walk(include_deleted=False))) == 190
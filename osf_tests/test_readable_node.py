@@ -0,0 +1,68 @@
+import pytest
+
+from framework.auth.core import Auth
+from osf.models import AbstractNode, NodeRelation, ReadableNode
+from osf.utils.permissions import ADMIN, READ, WRITE
+from osf_tests.factories import (
+    AuthUserFactory,
+    NodeFactory,
+    ProjectFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def readable_rows(user):
+    return set(ReadableNode.objects.filter(user=user).values_list('node_id', 'source'))
+
+
+class TestReadableNode:
+
+    @pytest.fixture()
+    def user(self):
+        return AuthUserFactory()
+
+    @pytest.fixture()
+    def project(self):
+        return ProjectFactory()
+
+    @pytest.fixture()
+    def component(self, project):
+        return NodeFactory(parent=project, creator=project.creator)
+
+    def test_creator_has_contributor_row(self, project):
+        assert (project.id, ReadableNode.CONTRIBUTOR) in readable_rows(project.creator)
+
+    def test_read_contributor(self, project, component, user):
+        project.add_contributor(user, permissions=[READ], auth=Auth(project.creator), save=True)
+        assert readable_rows(user) == {(project.id, ReadableNode.CONTRIBUTOR)}
+        assert list(AbstractNode.objects.filter(id__in=[project.id, component.id]).can_view(user)) == [project]
+
+    def test_admin_contributor_reads_components(self, project, component, user):
+        project.add_contributor(user, permissions=[READ, WRITE, ADMIN], auth=Auth(project.creator), save=True)
+        assert readable_rows(user) == {
+            (project.id, ReadableNode.CONTRIBUTOR),
+            (component.id, ReadableNode.IMPLICIT_ADMIN),
+        }
+
+    def test_permission_changes_are_tracked(self, project, component, user):
+        project.add_contributor(user, permissions=[READ, WRITE, ADMIN], auth=Auth(project.creator), save=True)
+        project.set_permissions(user, [READ, WRITE], save=True)
+        assert readable_rows(user) == {(project.id, ReadableNode.CONTRIBUTOR)}
+
+        project.remove_contributor(user, auth=Auth(project.creator))
+        assert readable_rows(user) == set()
+
+    def test_relation_changes_are_tracked(self, project, component, user):
+        project.add_contributor(user, permissions=[READ, WRITE, ADMIN], auth=Auth(project.creator), save=True)
+        grandchild = NodeFactory(parent=component, creator=project.creator)
+        assert (grandchild.id, ReadableNode.IMPLICIT_ADMIN) in readable_rows(user)
+
+        NodeRelation.objects.get(parent=project, child=component).delete()
+        assert readable_rows(user) == {(project.id, ReadableNode.CONTRIBUTOR)}
+
+    def test_node_links_do_not_grant_access(self, project, user):
+        linked = ProjectFactory()
+        project.add_contributor(user, permissions=[READ, WRITE, ADMIN], auth=Auth(project.creator), save=True)
+        project.add_node_link(linked, auth=Auth(project.creator), save=True)
+        assert linked not in AbstractNode.objects.can_view(user)
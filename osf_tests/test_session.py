@@ -1,9 +1,14 @@
+import mock
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from framework.sessions import utils
+from framework.sessions import cache, utils
+from framework.utils import is_shared_cache
 from tests.base import DbTestCase
-from osf_tests.factories import SessionFactory, UserFactory
+from osf_tests.factories import AuthUserFactory, SessionFactory, UserFactory
 from osf.models import OSFUser, Session
+from website import settings
 
 @pytest.mark.django_db
 class TestSession:
@@ -74,3 +79,105 @@ class SessionUtilsTestCase(DbTestCase):
         assert Session.objects.all().count() == 1
         utils.remove_session(session)
         assert Session.objects.all().count() == 0
+
+
+@pytest.mark.django_db
+class TestSessionCache:
+
+    @pytest.fixture(autouse=True)
+    def enable_cache(self):
+        # The tests run in one process, so the locmem cache is as good as a shared one
+        with mock.patch.object(settings, 'SESSION_CACHE_ENABLED', True), \
+                mock.patch('framework.sessions.cache.is_shared_cache', return_value=True):
+            cache.clear_session_cache()
+            yield
+            cache.clear_session_cache()
+
+    @pytest.fixture()
+    def session(self):
+        return SessionFactory(user=UserFactory())
+
+    def test_load_session_does_not_query(self, session):
+        with CaptureQueriesContext(connection) as ctx:
+            loaded = cache.load_session(session._id)
+        assert len(ctx.captured_queries) == 0
+        assert loaded == session
+        assert loaded.data == session.data
+        assert loaded.created == session.created
+
+    def test_loaded_sessions_are_copies(self, session):
+        cache.load_session(session._id).data['status'] = ['message']
+        assert 'status' not in cache.load_session(session._id).data
+
+    def test_shared_tier(self, session):
+        cache._local.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            assert cache.load_session(session._id) == session
+        assert len(ctx.captured_queries) == 0
+
+    def test_load_from_database(self, session):
+        cache.clear_session_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            assert cache.load_session(session._id) == session
+            assert cache.load_session(session._id) == session
+        assert len(ctx.captured_queries) == 1
+        assert cache.load_session('notasession') is None
+
+    def test_unchanged_session_is_not_saved(self, session):
+        loaded = cache.load_session(session._id)
+        with CaptureQueriesContext(connection) as ctx:
+            loaded.save()
+        assert len(ctx.captured_queries) == 0
+
+        loaded.data['status'] = ['message']
+        loaded.save()
+        assert Session.load(session._id).data['status'] == ['message']
+        assert cache.load_session(session._id).data['status'] == ['message']
+
+    def test_removed_sessions_are_evicted(self, session):
+        user = OSFUser.load(session.data['auth_user_id'])
+        cache.load_session(session._id)
+        utils.remove_sessions_for_user(user)
+        assert cache.load_session(session._id) is None
+
+        session = SessionFactory(user=user)
+        utils.remove_session(session)
+        assert cache.load_session(session._id) is None
+
+        session = SessionFactory(user=user)
+        session.delete()
+        assert cache.load_session(session._id) is None
+
+    def test_per_process_cache_is_not_used(self, session):
+        with mock.patch('framework.sessions.cache.is_shared_cache', return_value=False):
+            assert cache.is_enabled() is False
+            with CaptureQueriesContext(connection) as ctx:
+                assert cache.load_session(session._id) == session
+            assert len(ctx.captured_queries) == 1
+
+    def test_default_cache_is_per_process(self):
+        assert is_shared_cache(settings.SESSION_CACHE) is False
+
+    @mock.patch.object(settings, 'SESSION_CACHE_LOCAL_SIZE', 2)
+    def test_local_tier_is_bounded(self):
+        sessions = [SessionFactory() for _ in range(3)]
+        assert list(cache._local) == [sessions[1]._id, sessions[2]._id]
+
+    def test_basic_auth_credentials_are_cached(self):
+        user = AuthUserFactory()
+        user.set_password('password')
+        user.save()
+        with mock.patch.object(OSFUser, 'check_password', autospec=True, side_effect=OSFUser.check_password) as check:
+            assert cache.get_basic_auth_user(user.username, 'password') == user
+            assert cache.get_basic_auth_user(user.username, 'password') == user
+            assert cache.get_basic_auth_user(user.username, 'wrong') is False
+        assert check.call_count == 2
+
+    def test_password_change_invalidates_credentials(self):
+        user = AuthUserFactory()
+        user.set_password('password')
+        user.save()
+        assert cache.get_basic_auth_user(user.username, 'password') == user
+        user.set_password('changed')
+        user.save()
+        assert cache.get_basic_auth_user(user.username, 'password') is False
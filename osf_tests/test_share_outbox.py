@@ -0,0 +1,212 @@
+from datetime import timedelta
+
+import mock
+import pytest
+from django.utils import timezone
+
+from framework.auth import Auth
+from osf.models import ShareOutboxEntry
+from osf_tests.factories import PreprintFactory, ProjectFactory, RegistrationFactory, SubjectFactory
+from tests.utils import stub_share_server
+from website import share_outbox
+from website.preprints.tasks import update_preprint_share
+from website.project.tasks import on_node_updated, update_node_share
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def outbox_settings():
+    with mock.patch.multiple(
+        'website.settings',
+        SHARE_OUTBOX_ENABLED=True,
+        SHARE_API_TOKEN='Token',
+        SHARE_OUTBOX_MAX_REQUESTS_PER_SECOND=0,
+    ):
+        yield
+
+@pytest.fixture()
+def share():
+    with stub_share_server() as server:
+        yield server
+
+@pytest.fixture()
+def projects():
+    return [ProjectFactory(is_public=True) for _ in range(3)]
+
+@pytest.fixture()
+def preprint():
+    preprint = PreprintFactory()
+    preprint.provider.access_token = 'Snowmobiling'
+    preprint.provider.save()
+    return preprint
+
+
+class TestEnqueue:
+
+    def test_updates_are_coalesced(self, share, projects):
+        for _ in range(3):
+            update_node_share(projects[0])
+        assert not share.requests
+        assert ShareOutboxEntry.objects.filter(target_guid=projects[0]._id).count() == 1
+
+    def test_old_subjects_are_merged(self, share, preprint):
+        first, second = SubjectFactory(), SubjectFactory()
+        update_preprint_share(preprint, old_subjects=[first.id])
+        update_preprint_share(preprint, old_subjects=[first.id, second.id])
+        entry = ShareOutboxEntry.objects.get()
+        assert sorted(entry.old_subjects) == sorted([first.id, second.id])
+        assert entry.share_type == preprint.provider.share_publish_type
+
+    @mock.patch('website.settings.SHARE_URL', None)
+    def test_not_enqueued_without_share_url(self, projects):
+        update_node_share(projects[0])
+        assert not ShareOutboxEntry.objects.exists()
+
+
+class TestFlush:
+
+    def test_sends_batches_over_one_connection(self, share, projects):
+        for project in projects:
+            update_node_share(project)
+        with mock.patch('website.settings.SHARE_OUTBOX_BATCH_SIZE', 2):
+            assert share_outbox.flush_outbox() == (3, 0)
+
+        assert [len(request['graph']) for request in share.requests] == [4, 2]
+        assert share.connections == 1
+        assert all(request['token'] == 'Token' for request in share.requests)
+        for project in projects:
+            graph, = share.graphs_for(project._id)
+            assert any(item.get('is_deleted') is False for item in graph)
+        assert not ShareOutboxEntry.objects.exists()
+
+    def test_batches_are_split_by_endpoint_and_token(self, share, projects, preprint):
+        update_node_share(projects[0])
+        update_preprint_share(preprint)
+        share_outbox.flush_outbox()
+        assert sorted((request['path'], request['token']) for request in share.requests) == [
+            ('/api/normalizeddata/', 'Token'),
+            ('/api/v2/normalizeddata/', 'Snowmobiling'),
+        ]
+
+    def test_server_errors_are_retried_later(self, share, projects):
+        update_node_share(projects[0])
+        share.statuses.append(503)
+        assert share_outbox.flush_outbox() == (0, 1)
+
+        entry = ShareOutboxEntry.objects.get()
+        assert entry.attempts == 1
+        assert entry.next_attempt > timezone.now()
+        assert share_outbox.flush_outbox() == (0, 0)
+        assert len(share.requests) == 1
+
+    @mock.patch('website.project.tasks.send_desk_share_error')
+    def test_rejected_batch_is_resent_one_by_one(self, mock_mail, share, projects):
+        for project in projects:
+            update_node_share(project)
+        share.statuses.extend([400, 202, 400, 202])
+        assert share_outbox.flush_outbox() == (2, 1)
+
+        assert len(share.requests) == 4
+        assert mock_mail.call_count == 1
+        assert not ShareOutboxEntry.objects.exists()
+
+    @mock.patch('website.project.tasks.send_desk_share_error')
+    def test_gives_up_after_max_attempts(self, mock_mail, share, projects):
+        update_node_share(projects[0])
+        ShareOutboxEntry.objects.update(attempts=4)
+        share.statuses.append(500)
+        with mock.patch('website.settings.SHARE_OUTBOX_MAX_ATTEMPTS', 5):
+            share_outbox.flush_outbox()
+        assert mock_mail.called
+        assert not ShareOutboxEntry.objects.exists()
+
+    def test_entries_are_leased_while_sent(self, share, projects):
+        update_node_share(projects[0])
+        send_batch = share_outbox.send_batch
+
+        def send_while_flushing_again(*args, **kwargs):
+            entry = ShareOutboxEntry.objects.get()
+            assert entry.next_attempt > timezone.now()
+            # Another flush skips the entry being sent
+            assert share_outbox.flush_outbox() == (0, 0)
+            return send_batch(*args, **kwargs)
+
+        with mock.patch('website.share_outbox.send_batch', side_effect=send_while_flushing_again):
+            assert share_outbox.flush_outbox() == (1, 0)
+        assert len(share.requests) == 1
+        assert not ShareOutboxEntry.objects.exists()
+
+    def test_expired_lease_is_claimed_again(self, share, projects):
+        update_node_share(projects[0])
+        assert len(share_outbox.claim(10)) == 1
+        assert share_outbox.claim(10) == []
+        # The flush that claimed it died; its lease runs out
+        ShareOutboxEntry.objects.update(next_attempt=timezone.now())
+        assert share_outbox.flush_outbox() == (1, 0)
+
+    def test_updates_made_while_sending_are_sent_again(self, share, projects):
+        update_node_share(projects[0])
+        send_batch = share_outbox.send_batch
+
+        def send_and_update(*args, **kwargs):
+            resp = send_batch(*args, **kwargs)
+            update_node_share(projects[0])
+            return resp
+
+        with mock.patch('website.share_outbox.send_batch', side_effect=send_and_update):
+            assert share_outbox.flush_outbox(max_batches=1) == (1, 0)
+        entry = ShareOutboxEntry.objects.get()
+        assert entry.next_attempt <= timezone.now()
+
+        assert share_outbox.flush_outbox() == (1, 0)
+        assert len(share.requests) == 2
+        assert not ShareOutboxEntry.objects.exists()
+
+    @mock.patch('website.share_outbox.logger')
+    def test_serialization_errors_do_not_hold_back_the_batch(self, mock_logger, share, projects):
+        for project in projects:
+            update_node_share(project)
+        format_node = mock.Mock(side_effect=[ValueError, [], []])
+        with mock.patch('website.project.tasks.format_node', format_node):
+            assert share_outbox.flush_outbox() == (2, 1)
+
+        assert mock_logger.exception.called
+        entry = ShareOutboxEntry.objects.get()
+        assert entry.target_guid == projects[0]._id
+        assert entry.attempts == 1
+        assert entry.next_attempt < timezone.now() + timedelta(minutes=15)
+
+    def test_deleted_objects_are_dropped(self, share):
+        ShareOutboxEntry.enqueue(ShareOutboxEntry.NODE, 'abc12')
+        assert share_outbox.flush_outbox() == (0, 0)
+        assert not share.requests
+        assert not ShareOutboxEntry.objects.exists()
+
+
+@mock.patch('osf.models.node.AbstractNode.update_search')
+class TestProductionPath:
+    """Node updates reach SHARE through the outbox, as with the default settings."""
+
+    def test_public_project(self, mock_update_search, share):
+        project = ProjectFactory(is_public=True)
+        on_node_updated(project._id, project.creator._id, False, {'is_public'})
+        assert not share.requests
+
+        assert share_outbox.flush_outbox() == (1, 0)
+        graph, = share.graphs_for(project._id)
+        assert any(item.get('is_deleted') is False for item in graph)
+
+    def test_project_made_private(self, mock_update_search, share):
+        project = ProjectFactory(is_public=True)
+        project.set_privacy('private', auth=Auth(project.creator))
+        share_outbox.flush_outbox()
+        graph, = share.graphs_for(project._id)
+        assert any(item.get('is_deleted') is True for item in graph)
+
+    def test_registration(self, mock_update_search, share):
+        registration = RegistrationFactory(is_public=True)
+        on_node_updated(registration._id, registration.creator._id, False, {'is_public'})
+        assert share_outbox.flush_outbox() == (1, 0)
+        assert share.requests[0]['path'] == '/api/normalizeddata/'
+        assert any(item.get('@type') == 'registration' for item in share.requests[0]['graph'])
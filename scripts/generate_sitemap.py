@@ -1,22 +1,40 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-"""Generate a sitemap for osf.io"""
+"""Generate a sitemap for osf.io
+
+Urls are split into gzipped shards by section (static pages, users, nodes, preprints) and
+primary key range, e.g. `sitemap_node_3.xml.gz` holds the nodes with
+3 * SITEMAP_URL_MAX <= pk < 4 * SITEMAP_URL_MAX. Shards are streamed straight to disk by a
+pool of `settings.SITEMAP_WORKERS` processes.
+
+Because a shard always covers the same range, an incremental run only rewrites the shards
+containing objects modified since the previous run, which is recorded in
+`sitemap_manifest.json`. Changes that do not touch `modified` (e.g. hard deletes or preprint
+provider domains) are picked up by the next full run.
+"""
 import boto3
-import datetime
 import gzip
+import json
+import multiprocessing
 import os
 import shutil
 import urlparse
-import xml
+from collections import OrderedDict
+from xml.sax.saxutils import escape
 
 import django
 django.setup()
 import logging
 import tempfile
 
+from dateutil.parser import parse as parse_date
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
 from framework import sentry
 from framework.celery_tasks import app as celery_app
-from osf.models import OSFUser, AbstractNode, PreprintService, PreprintProvider
+from osf.models import OSFUser, AbstractNode, PreprintService
 from scripts import utils as script_utils
 from website import settings
 from website.app import init_app
@@ -24,12 +42,225 @@ from website.app import init_app
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+MANIFEST_NAME = 'sitemap_manifest.json'
+MAX_SHARD_ERRORS = 1000
+
+
+class SitemapWriter(object):
+    """Streams a urlset into a gzipped file, which only replaces `path` once closed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.url_count = 0
+        self._file = gzip.open(path + '.tmp', 'wb')
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+
+    def add_url(self, config, **values):
+        """Write a url with the tags of `config`, overriding their text with `values`."""
+        tags = [
+            u'<{0}>{1}</{0}>'.format(tag, escape(values.get(tag, default)))
+            for tag, default in config.items()
+        ]
+        self._file.write(u'<url>{}</url>\n'.format(u''.join(tags)).encode('utf-8'))
+        self.url_count += 1
+
+    def close(self):
+        self._file.write('</urlset>\n')
+        self._file.close()
+        os.rename(self.path + '.tmp', self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.path + '.tmp')
+
+
+class Section(object):
+    """Urls for one type of object, sharded by primary key."""
+    name = None
+    model = None
+    urls_per_object = 1
+
+    @property
+    def shard_size(self):
+        return settings.SITEMAP_URL_MAX // self.urls_per_object
+
+    def all_shards(self):
+        max_id = self.model.objects.aggregate(max_id=Max('id'))['max_id']
+        return range(max_id // self.shard_size + 1) if max_id is not None else []
+
+    def changed_shards(self, since):
+        return {pk // self.shard_size for pk in self.changed_ids(since).iterator()}
+
+    def changed_ids(self, since):
+        return self.model.objects.filter(modified__gte=since).values_list('id', flat=True)
+
+    def objects(self, start, end):
+        """Objects with `start` <= pk < `end` that belong in the sitemap."""
+        raise NotImplementedError
+
+    def urls(self, obj):
+        """A list of (config, values) pairs, see `SitemapWriter.add_url`."""
+        raise NotImplementedError
+
+    def object_id(self, obj):
+        return obj._id
+
+
+class StaticSection(Section):
+    name = 'static'
+
+    def all_shards(self):
+        return [0]
+
+    def changed_shards(self, since):
+        return [0]
+
+    def objects(self, start, end):
+        return settings.SITEMAP_STATIC_URLS
+
+    def urls(self, config):
+        return [(config, {'loc': urlparse.urljoin(settings.DOMAIN, config['loc'])})]
+
+    def object_id(self, config):
+        return config['loc']
+
+
+class UserSection(Section):
+    name = 'user'
+    model = OSFUser
+
+    def objects(self, start, end):
+        return (OSFUser.objects
+            .filter(id__gte=start, id__lt=end, is_active=True)
+            .exclude(date_confirmed__isnull=True)
+            .order_by('id')
+            .values_list('guids___id', flat=True))
+
+    def urls(self, guid):
+        return [(settings.SITEMAP_USER_CONFIG, {'loc': urlparse.urljoin(settings.DOMAIN, '/{}/'.format(guid))})]
+
+    def object_id(self, guid):
+        return guid
+
+
+class NodeSection(Section):
+    """Nodes and Registrations, no Collections"""
+    name = 'node'
+    model = AbstractNode
+
+    def objects(self, start, end):
+        return (AbstractNode.objects
+            .filter(id__gte=start, id__lt=end, is_public=True, is_deleted=False, retraction_id__isnull=True)
+            .exclude(type__in=['osf.collection', 'osf.quickfilesnode'])
+            .order_by('id')
+            .values('guids___id', 'modified'))
+
+    def urls(self, obj):
+        return [(settings.SITEMAP_NODE_CONFIG, {
+            'loc': urlparse.urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id'])),
+            'lastmod': obj['modified'].strftime('%Y-%m-%d'),
+        })]
+
+    def object_id(self, obj):
+        return obj['guids___id']
+
+
+class PreprintSection(Section):
+    name = 'preprint'
+    model = PreprintService
+    urls_per_object = 2  # The preprint and its file
+
+    def changed_ids(self, since):
+        # Deleting or making the node private hides the preprint
+        return (PreprintService.objects
+            .filter(Q(modified__gte=since) | Q(node__modified__gte=since))
+            .values_list('id', flat=True))
+
+    def objects(self, start, end):
+        return (PreprintService.objects
+            .filter(id__gte=start, id__lt=end, node__isnull=False, node__is_deleted=False, node__is_public=True, is_published=True)
+            .select_related('node', 'provider', 'node__preprint_file')
+            .order_by('id'))
+
+    def urls(self, obj):
+        preprint_date = obj.modified.strftime('%Y-%m-%d')
+        provider = obj.provider
+        domain = provider.domain if (provider.domain_redirect_enabled and provider.domain) else settings.DOMAIN
+        preprint_url = '/preprints/{}/'.format(obj._id) if provider._id == 'osf' else obj.url
+        return [
+            (settings.SITEMAP_PREPRINT_CONFIG, {
+                'loc': urlparse.urljoin(domain, preprint_url),
+                'lastmod': preprint_date,
+            }),
+            # Preprint file url
+            (settings.SITEMAP_PREPRINT_FILE_CONFIG, {
+                'loc': urlparse.urljoin(provider.domain or settings.DOMAIN, os.path.join(obj._id, 'download', '?format=pdf')),
+                'lastmod': preprint_date,
+            }),
+        ]
+
+
+SECTIONS = OrderedDict(
+    (section.name, section)
+    for section in (StaticSection(), UserSection(), NodeSection(), PreprintSection())
+)
+
+
+def shard_name(section_name, number):
+    return 'sitemap_{}_{}.xml.gz'.format(section_name, number)
+
+def log_errors(obj, obj_id, error, errors):
+    if not errors:
+        script_utils.add_file_logger(logger, __file__)
+    logger.info('Error on {}, {}:'.format(obj, obj_id))
+    logger.exception(error)
+
+    if errors < 10:
+        sentry.log_message('Sitemap Error: {}'.format(error))
+
+def write_shard(sitemap_dir, section_name, number):
+    """Write the shard `number` of a section. A shard without any urls is removed.
+
+    :return tuple: (shard name, url count, error count)
+    """
+    section = SECTIONS[section_name]
+    name = shard_name(section_name, number)
+    path = os.path.join(sitemap_dir, name)
+    start = number * section.shard_size
+    writer = SitemapWriter(path)
+    errors = 0
+    try:
+        for obj in section.objects(start, start + section.shard_size):
+            try:
+                for config, values in section.urls(obj):
+                    writer.add_url(config, **values)
+            except Exception as e:
+                log_errors(section_name.upper(), section.object_id(obj), e, errors)
+                errors += 1
+                if errors == MAX_SHARD_ERRORS:
+                    sentry.log_message('ERROR: generate_sitemap stopped execution after reaching {} errors in {}. See logs for details.'.format(errors, name))
+                    raise Exception('Too many errors generating sitemap.')
+    except Exception:
+        writer.abort()
+        raise
+    if not writer.url_count:
+        writer.abort()
+        if os.path.exists(path):
+            os.remove(path)
+        return name, 0, errors
+    writer.close()
+    logger.info('Wrote `{}`: url_count = {}'.format(path, writer.url_count))
+    return name, writer.url_count, errors
+
+def _write_shard(args):
+    return write_shard(*args)
+
 
 class Sitemap(object):
     def __init__(self):
-        self.sitemap_count = 0
+        self.url_count = 0
         self.errors = 0
-        self.new_doc()
         if not settings.SITEMAP_TO_S3:
             self.sitemap_dir = os.path.join(settings.STATIC_FOLDER, 'sitemaps')
             if not os.path.exists(self.sitemap_dir):
@@ -51,53 +282,6 @@ class Sitemap(object):
         if settings.SITEMAP_TO_S3:
             shutil.rmtree(self.sitemap_dir)
 
-    def new_doc(self):
-        """Creates new sitemap document and resets the url_count."""
-        self.doc = xml.dom.minidom.Document()
-        self.urlset = self.doc.createElement('urlset')
-        self.urlset.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        self.doc.appendChild(self.urlset)
-        self.url_count = 0
-
-    def add_tag(self, name, text):
-        """Adds a tag to the current url"""
-        tag = self.doc.createElement(name)
-        self.url.appendChild(tag)
-        tag_text = self.doc.createTextNode(text)
-        tag.appendChild(tag_text)
-
-    def add_url(self, config):
-        """Adds a url to the current urlset"""
-        if self.url_count >= settings.SITEMAP_URL_MAX:
-            self.write_doc()
-            self.new_doc()
-        self.url = self.doc.createElement('url')
-        self.urlset.appendChild(self.url)
-
-        for k, v in config.iteritems():
-            self.add_tag(k, v)
-        self.url_count += 1
-
-    def write_doc(self):
-        """Writes and gzips each sitemap xml file"""
-        file_name = 'sitemap_{}.xml'.format(str(self.sitemap_count))
-        file_path = os.path.join(self.sitemap_dir, file_name)
-        zip_file_name = file_name + '.gz'
-        zip_file_path = file_path + '.gz'
-        print('Writing and gzipping `{}`: url_count = {}'.format(file_path, str(self.url_count)))
-
-        xml_str = self.doc.toprettyxml(indent='  ', encoding='utf-8')
-        with open(file_path, 'wb') as f:
-            f.write(xml_str)
-
-        # Write zipped file
-        with open(file_path, 'rb') as f_in, gzip.open(zip_file_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        if settings.SITEMAP_TO_S3:
-            self.ship_to_s3(file_name, file_path)
-            self.ship_to_s3(zip_file_name, zip_file_path)
-        self.sitemap_count += 1
-
     def ship_to_s3(self, name, path):
         data = open(path, 'rb')
         try:
@@ -108,145 +292,109 @@ class Sitemap(object):
             sentry.log_message('ERROR: Sitemaps could not be uploaded to s3, see `generate_sitemap` logs')
         data.close()
 
-    def write_sitemap_index(self):
-        """Writes the index file for all of the sitemap files"""
-        doc = xml.dom.minidom.Document()
-        sitemap_index = self.doc.createElement('sitemapindex')
-        sitemap_index.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        doc.appendChild(sitemap_index)
-
-        for f in range(self.sitemap_count):
-            sitemap = doc.createElement('sitemap')
-            sitemap_index.appendChild(sitemap)
-
-            loc = doc.createElement('loc')
-            sitemap.appendChild(loc)
-            loc_text = self.doc.createTextNode(urlparse.urljoin(settings.DOMAIN, 'sitemaps/sitemap_{}.xml'.format(str(f))))
-            loc.appendChild(loc_text)
-
-            datemod = doc.createElement('lastmod')
-            sitemap.appendChild(datemod)
-            datemod_text = self.doc.createTextNode(datetime.datetime.now().strftime('%Y-%m-%d'))
-            datemod.appendChild(datemod_text)
+    def load_manifest(self):
+        """The manifest of the previous run, or None if there is none."""
+        try:
+            if settings.SITEMAP_TO_S3:
+                body = self.s3.Object(settings.SITEMAP_AWS_BUCKET, 'sitemaps/{}'.format(MANIFEST_NAME)).get()['Body'].read()
+            else:
+                with open(os.path.join(self.sitemap_dir, MANIFEST_NAME)) as f:
+                    body = f.read()
+            return json.loads(body)
+        except Exception as e:
+            logger.info('No usable sitemap manifest found: {}'.format(e))
+            return None
 
+    def write_manifest(self, generated, shards):
+        file_path = os.path.join(self.sitemap_dir, MANIFEST_NAME)
+        with open(file_path, 'w') as f:
+            json.dump({'generated': generated.isoformat(), 'shards': shards}, f)
+        if settings.SITEMAP_TO_S3:
+            self.ship_to_s3(MANIFEST_NAME, file_path)
+
+    def remove_shards(self):
+        """Remove the files of earlier full runs, whose shards may no longer exist."""
+        for name in os.listdir(self.sitemap_dir):
+            if name.startswith('sitemap_') and name != MANIFEST_NAME:
+                os.remove(os.path.join(self.sitemap_dir, name))
+
+    def write_shards(self, tasks):
+        if settings.SITEMAP_WORKERS <= 1:
+            return [write_shard(*task) for task in tasks]
+        # Workers open their own DB connections
+        connections.close_all()
+        pool = multiprocessing.Pool(settings.SITEMAP_WORKERS)
+        try:
+            results = pool.map(_write_shard, tasks, chunksize=1)
+            pool.close()
+        except Exception:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return results
+
+    def write_sitemap_index(self, shards):
+        """Writes the index file for all of the sitemap files
+
+        :param dict shards: shard name -> lastmod date
+        """
         print('Writing `sitemap_index.xml`')
         file_name = 'sitemap_index.xml'
         file_path = os.path.join(self.sitemap_dir, file_name)
-        xml_str = doc.toprettyxml(indent='  ', encoding='utf-8')
         with open(file_path, 'wb') as f:
-            f.write(xml_str)
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+            for name in sorted(shards):
+                f.write('<sitemap><loc>{}</loc><lastmod>{}</lastmod></sitemap>\n'.format(
+                    escape(urlparse.urljoin(settings.DOMAIN, 'sitemaps/{}'.format(name))),
+                    shards[name],
+                ))
+            f.write('</sitemapindex>\n')
         if settings.SITEMAP_TO_S3:
             self.ship_to_s3(file_name, file_path)
 
-    def log_errors(self, obj, obj_id, error):
-        if not self.errors:
-            script_utils.add_file_logger(logger, __file__)
-        self.errors += 1
-        logger.info('Error on {}, {}:'.format(obj, obj_id))
-        logger.exception(error)
-
-        if self.errors <= 10:
-            sentry.log_message('Sitemap Error: {}'.format(error))
-
-        if self.errors == 1000:
-            sentry.log_message('ERROR: generate_sitemap stopped execution after reaching 1000 errors. See logs for details.')
-            raise Exception('Too many errors generating sitemap.')
-
-    def generate(self):
-        print('Generating Sitemap')
-
-        # Progress bar
-        progress = script_utils.Progress(precision=0)
-
-        # Static urls
-        progress.start(len(settings.SITEMAP_STATIC_URLS), 'STAT: ')
-        for config in settings.SITEMAP_STATIC_URLS:
-            config['loc'] = urlparse.urljoin(settings.DOMAIN, config['loc'])
-            self.add_url(config)
-            progress.increment()
-        progress.stop()
-
-        # User urls
-        objs = OSFUser.objects.filter(is_active=True).exclude(date_confirmed__isnull=True).values_list('guids___id', flat=True)
-        progress.start(objs.count(), 'USER: ')
-        for obj in objs:
-            try:
-                config = settings.SITEMAP_USER_CONFIG
-                config['loc'] = urlparse.urljoin(settings.DOMAIN, '/{}/'.format(obj))
-                self.add_url(config)
-            except Exception as e:
-                self.log_errors('USER', obj, e)
-            progress.increment()
-        progress.stop()
-
-        # AbstractNode urls (Nodes and Registrations, no Collections)
-        objs = (AbstractNode.objects
-            .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
-            .exclude(type__in=['osf.collection', 'osf.quickfilesnode'])
-            .values('guids___id', 'modified'))
-        progress.start(objs.count(), 'NODE: ')
-        for obj in objs:
-            try:
-                config = settings.SITEMAP_NODE_CONFIG
-                config['loc'] = urlparse.urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id']))
-                config['lastmod'] = obj['modified'].strftime('%Y-%m-%d')
-                self.add_url(config)
-            except Exception as e:
-                self.log_errors('NODE', obj['guids___id'], e)
-            progress.increment()
-        progress.stop()
-
-        # Preprint urls
-        objs = (PreprintService.objects
-                    .filter(node__isnull=False, node__is_deleted=False, node__is_public=True, is_published=True)
-                    .select_related('node', 'provider', 'node__preprint_file'))
-        progress.start(objs.count() * 2, 'PREP: ')
-        osf = PreprintProvider.objects.get(_id='osf')
-        for obj in objs:
-            try:
-                preprint_date = obj.modified.strftime('%Y-%m-%d')
-                config = settings.SITEMAP_PREPRINT_CONFIG
-                preprint_url = obj.url
-                provider = obj.provider
-                domain = provider.domain if (provider.domain_redirect_enabled and provider.domain) else settings.DOMAIN
-                if provider == osf:
-                    preprint_url = '/preprints/{}/'.format(obj._id)
-                config['loc'] = urlparse.urljoin(domain, preprint_url)
-                config['lastmod'] = preprint_date
-                self.add_url(config)
-
-                # Preprint file urls
-                try:
-                    file_config = settings.SITEMAP_PREPRINT_FILE_CONFIG
-                    file_config['loc'] = urlparse.urljoin(
-                        obj.provider.domain or settings.DOMAIN,
-                        os.path.join(
-                            obj._id,
-                            'download',
-                            '?format=pdf'
-                        )
-                    )
-                    file_config['lastmod'] = preprint_date
-                    self.add_url(file_config)
-                except Exception as e:
-                    self.log_errors(obj.primary_file, obj.primary_file._id, e)
-            except Exception as e:
-                self.log_errors(obj, obj._id, e)
-            progress.increment(2)
-        progress.stop()
+    def generate(self, incremental=False):
+        """Write every shard, or with `incremental`, the shards changed since the last run."""
+        started = timezone.now()
+        manifest = self.load_manifest() if incremental else None
+        if manifest:
+            since = parse_date(manifest['generated'])
+            shards = manifest['shards']
+            print('Generating Sitemap for changes since {}'.format(manifest['generated']))
+        else:
+            since = None
+            shards = {}
+            print('Generating Sitemap')
+            if not settings.SITEMAP_TO_S3:
+                self.remove_shards()
+
+        tasks = []
+        for section in SECTIONS.values():
+            numbers = section.all_shards() if since is None else section.changed_shards(since)
+            tasks.extend((self.sitemap_dir, section.name, number) for number in sorted(numbers))
+        print('Writing {} shards'.format(len(tasks)))
+
+        lastmod = started.strftime('%Y-%m-%d')
+        for name, url_count, errors in self.write_shards(tasks):
+            self.errors += errors
+            self.url_count += url_count
+            if url_count:
+                shards[name] = lastmod
+                if settings.SITEMAP_TO_S3:
+                    self.ship_to_s3(name, os.path.join(self.sitemap_dir, name))
+            else:
+                shards.pop(name, None)
 
-        # Final write
-        self.write_doc()
         # Create index file
-        self.write_sitemap_index()
+        self.write_sitemap_index(shards)
+        self.write_manifest(started, shards)
 
         # TODO: once the sitemap is validated add a ping to google with sitemap index file location
-        # TODO: server side cursor query wrapper might be useful as the index gets larger.
         # Sitemap indexable limit check
-        if self.sitemap_count > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
+        if len(shards) > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
             sentry.log_message('WARNING: Max sitemaps nearly reached.')
-        print('Total url_count = {}'.format((self.sitemap_count - 1) * settings.SITEMAP_URL_MAX + self.url_count))
-        print('Total sitemap_count = {}'.format(str(self.sitemap_count)))
+        print('Total url_count written = {}'.format(self.url_count))
+        print('Total sitemap_count = {}'.format(len(shards)))
         if self.errors:
             sentry.log_message('WARNING: Generate sitemap encountered errors. See logs for details.')
             print('Total errors = {}'.format(str(self.errors)))
@@ -254,12 +402,13 @@ class Sitemap(object):
             print('No errors')
 
 @celery_app.task(name='scripts.generate_sitemap')
-def main():
+def main(incremental=False):
     init_app(routes=False)  # Sets the storage backends on all models
     sitemap = Sitemap()
-    sitemap.generate()
+    sitemap.generate(incremental=incremental)
     sitemap.cleanup()
 
 if __name__ == '__main__':
+    import sys
     init_app(set_backends=True, routes=False)
-    main()
+    main(incremental='--incremental' in sys.argv)
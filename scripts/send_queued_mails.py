@@ -6,6 +6,7 @@ from django.utils import timezone
 django.setup()
 
 from framework.celery_tasks import app as celery_app
+from framework.email.tasks import BatchMailer
 
 from osf.models.queued_mail import QueuedMail
 from website.app import init_app
@@ -31,11 +32,13 @@ def main(dry_run=True):
 
     logger.info('Emails being sent at {0}'.format(timezone.now().isoformat()))
 
+    # Sent from here over one pooled connection, rather than one celery task and connection each
+    mailer = BatchMailer('queued mails')
     for mail in emails_to_be_sent:
         if not dry_run:
             with transaction.atomic():
                 try:
-                    sent_ = mail.send_mail()
+                    sent_ = mail.send_mail(mailer=mailer)
                     message = 'Email of type {0} sent to {1}'.format(mail.email_type, mail.to_addr) if sent_ else \
                         'Email of type {0} failed to be sent to {1}'.format(mail.email_type, mail.to_addr)
                     logger.info(message)
@@ -45,6 +48,7 @@ def main(dry_run=True):
                     pass
         else:
             logger.info('Email of type {} will be sent to {}'.format(mail.email_type, mail.to_addr))
+    mailer.close()
 
 
 def find_queued_mails_ready_to_be_sent():
@@ -169,11 +169,15 @@ def celery_beat(ctx, level='debug', schedule=None):
     ctx.run(bin_prefix(cmd), pty=True)
 
 @task
-def migrate_search(ctx, delete=True, remove=False, index=settings.ELASTIC_INDEX):
-    """Migrate the search-enabled models."""
+def migrate_search(ctx, delete=True, remove=False, index=settings.ELASTIC_INDEX, workers=0, checkpoint=None):
+    """Migrate the search-enabled models.
+
+    Pass --workers to reindex in parallel; an interrupted parallel run resumes from --checkpoint.
+    """
     from website.app import init_app
     init_app(routes=False, set_backends=False)
     from website.search_migration.migrate import migrate
+    from website.search_migration.parallel import parallel_migrate
 
     # NOTE: Silence the warning:
     # "InsecureRequestWarning: Unverified HTTPS request is being made. Adding certificate verification is strongly advised."
@@ -181,7 +185,10 @@ def migrate_search(ctx, delete=True, remove=False, index=settings.ELASTIC_INDEX)
     for logger in SILENT_LOGGERS:
         logging.getLogger(logger).setLevel(logging.ERROR)
 
-    migrate(delete, remove=remove, index=index)
+    if workers:
+        parallel_migrate(delete, index=index, remove=remove, workers=int(workers), checkpoint_path=checkpoint)
+    else:
+        migrate(delete, remove=remove, index=index)
 
 @task
 def rebuild_search(ctx):
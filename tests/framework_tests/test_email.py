@@ -6,9 +6,10 @@ import mock
 from nose.tools import *  # flake8: noqa (PEP8 asserts)
 import sendgrid
 
-from framework.email.tasks import send_email, _send_with_sendgrid
+from framework.email.tasks import BatchMailer, send_batch, send_email, _send_with_sendgrid
 from website import settings
 from tests.base import fake
+from tests.utils import mock_smtp
 from osf_tests.factories import fake_email
 
 # Check if local mail server is running
@@ -77,5 +78,59 @@ class TestEmail(unittest.TestCase):
         assert_false(ret)
 
 
+@mock.patch('website.settings.USE_EMAIL', True)
+@mock.patch('website.settings.SENDGRID_API_KEY', None)
+class TestPooledSMTP(unittest.TestCase):
+
+    def message(self, **kwargs):
+        return dict(dict(from_addr=fake_email(), to_addr=fake_email(), subject=fake.bs(), message=fake.text()), **kwargs)
+
+    def test_send_email_reuses_connection(self):
+        with mock_smtp() as sink:
+            assert_true(send_email(**self.message()))
+            assert_true(send_email(**self.message()))
+        assert_equal(len(sink.messages), 2)
+        assert_equal(len(sink.connections), 1)
+        assert_equal(sink.logins, 1)
+
+    def test_send_batch(self):
+        messages = [self.message() for i in range(5)]
+        with mock_smtp() as sink:
+            assert_equal(send_batch(messages), [True] * 5)
+        assert_equal([to_addrs for _, to_addrs, _ in sink.messages], [[message['to_addr']] for message in messages])
+        assert_equal(len(sink.connections), 1)
+
+    def test_reconnects_when_disconnected(self):
+        with mock_smtp() as sink:
+            send_email(**self.message())
+            sink.disconnect_all()
+            assert_true(send_email(**self.message()))
+        assert_equal(len(sink.messages), 2)
+        assert_equal(len(sink.connections), 2)
+
+    def test_idle_connections_expire(self):
+        with mock_smtp() as sink, mock.patch('website.settings.MAIL_POOL_IDLE_TIMEOUT', 0):
+            send_email(**self.message())
+            send_email(**self.message())
+        assert_equal(len(sink.connections), 2)
+        assert_false(sink.connections[0].connected)
+
+    def test_connections_are_per_login(self):
+        with mock_smtp() as sink:
+            send_email(username='one', password='secret', **self.message())
+            send_email(username='two', password='secret', **self.message())
+            send_email(username='one', password='secret', **self.message())
+        assert_equal(len(sink.connections), 2)
+
+    def test_batch_mailer_stats(self):
+        mailer = BatchMailer('test')
+        with mock_smtp():
+            mailer(**self.message())
+            with mock.patch('framework.email.tasks._send_with_smtp', return_value=None):
+                mailer(**self.message())
+        stats = mailer.close()
+        assert_equal((stats['sent'], stats['failed']), (1, 1))
+
+
 if __name__ == '__main__':
     unittest.main()
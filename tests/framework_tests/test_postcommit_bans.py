@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+import requests
+from nose.tools import *  # flake8: noqa (PEP8 asserts)
+from requests.adapters import HTTPAdapter
+
+from framework.postcommit_tasks import bans
+from framework.postcommit_tasks.bans import coalesce_paths, enqueue_bans, flush_ban_queue, group_ban_urls
+
+
+class TestCoalescePaths(unittest.TestCase):
+
+    def test_siblings_are_merged(self):
+        patterns = coalesce_paths(['/v2/nodes/abc12/', '/v2/nodes/def34/', '/v2/users/ghi56/'])
+        assert_equal(patterns, ['/v2/nodes/(?:abc12|def34)/.*', '/v2/users/ghi56/.*'])
+
+    def test_covered_paths_are_dropped(self):
+        patterns = coalesce_paths(['/v2/nodes/abc12/comments/', '/v2/nodes/abc12/', '/v2/nodes/abc12/'])
+        assert_equal(patterns, ['/v2/nodes/abc12/.*'])
+
+    def test_alternations_are_chunked(self):
+        paths = ['/v2/nodes/n{}/'.format(i) for i in range(5)]
+        patterns = coalesce_paths(paths, max_patterns=2)
+        assert_equal(patterns, [
+            '/v2/nodes/(?:n0|n1)/.*',
+            '/v2/nodes/(?:n2|n3)/.*',
+            '/v2/nodes/n4/.*',
+        ])
+
+
+class TestBanQueue(unittest.TestCase):
+
+    def setUp(self):
+        bans.start_ban_queue()
+
+    def tearDown(self):
+        bans.clear_ban_queue()
+
+    def test_group_ban_urls(self):
+        queue = group_ban_urls([
+            'http://varnish-1:8080/v2/nodes/abc12/.*',
+            'http://varnish-2:8080/v2/nodes/abc12/.*',
+        ], 'api.osf.io')
+        assert_equal(dict(queue), {
+            ('http://varnish-1:8080', 'api.osf.io'): {'/v2/nodes/abc12/'},
+            ('http://varnish-2:8080', 'api.osf.io'): {'/v2/nodes/abc12/'},
+        })
+
+    @mock.patch('framework.postcommit_tasks.bans.settings.ENABLE_VARNISH', True)
+    @mock.patch('framework.postcommit_tasks.bans.get_session')
+    def test_flush_sends_one_ban_per_host(self, mock_get_session):
+        mock_get_session.return_value.request.return_value.ok = True
+        enqueue_bans(['http://varnish:8080/v2/nodes/abc12/.*'], 'api.osf.io')
+        enqueue_bans(['http://varnish:8080/v2/nodes/def34/.*'], 'api.osf.io')
+
+        assert_equal(flush_ban_queue(), (1, 0))
+        mock_get_session.return_value.request.assert_called_once_with(
+            'BAN', 'http://varnish:8080/',
+            timeout=bans.settings.VARNISH_BAN_TIMEOUT,
+            headers={'Host': 'api.osf.io', 'X-Ban-Url': '/v2/nodes/(?:abc12|def34)/.*'}
+        )
+        assert_equal(bans.ban_queue(), {})
+
+    @mock.patch('framework.postcommit_tasks.bans.settings.ENABLE_VARNISH', True)
+    @mock.patch('framework.postcommit_tasks.bans.get_session')
+    def test_flush_counts_failures(self, mock_get_session):
+        mock_get_session.return_value.request.side_effect = Exception('timed out')
+        enqueue_bans(['http://varnish:8080/v2/nodes/abc12/.*'], 'api.osf.io')
+        assert_equal(flush_ban_queue(), (1, 1))
+
+    @mock.patch('framework.postcommit_tasks.bans.settings.ENABLE_VARNISH', True)
+    @mock.patch.object(HTTPAdapter, 'send')
+    def test_pattern_is_sent_unencoded(self, mock_send):
+        def send(request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b''
+            response.request = request
+            return response
+        mock_send.side_effect = send
+        bans._sessions.clear()
+        enqueue_bans(['http://varnish:8080/v2/nodes/abc12/.*'], 'api.osf.io')
+        enqueue_bans(['http://varnish:8080/v2/nodes/def34/.*'], 'api.osf.io')
+
+        assert_equal(flush_ban_queue(), (1, 0))
+        request = mock_send.call_args[0][0]
+        assert_equal(request.method, 'BAN')
+        assert_equal(request.url, 'http://varnish:8080/')
+        assert_equal(request.headers['Host'], 'api.osf.io')
+        # Matched against the cached urls as it is, by tests/test_files/varnish.vcl
+        assert_equal(request.headers['X-Ban-Url'], '/v2/nodes/(?:abc12|def34)/.*')
+
+    @mock.patch('framework.postcommit_tasks.bans.settings.ENABLE_VARNISH', True)
+    @mock.patch('framework.postcommit_tasks.bans.send_bans')
+    def test_bans_are_sent_right_away_outside_of_a_request(self, mock_send_bans):
+        # e.g. from a postcommit greenlet or a celery task
+        bans.clear_ban_queue()
+        enqueue_bans(['http://varnish:8080/v2/nodes/abc12/.*'], 'api.osf.io')
+        mock_send_bans.assert_called_once_with({('http://varnish:8080', 'api.osf.io'): {'/v2/nodes/abc12/'}})
+        assert_equal(bans.ban_queue(), {})
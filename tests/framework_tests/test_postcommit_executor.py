@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import functools
+import unittest
+
+import gevent
+import mock
+from nose.tools import *  # flake8: noqa (PEP8 asserts)
+
+from framework.postcommit_tasks import executor
+from framework.postcommit_tasks.executor import PostcommitExecutor, get_executor
+
+
+def add_to(results, value):
+    results.append(value)
+
+
+class TestPostcommitExecutor(unittest.TestCase):
+
+    def setUp(self):
+        executor.reset_latency_histograms()
+
+    def test_get_executor_is_shared(self):
+        assert_is(get_executor(), get_executor())
+
+    def test_run_all_runs_every_task(self):
+        results = []
+        PostcommitExecutor(2, 10).run_all([functools.partial(add_to, results, i) for i in range(5)], timeout=1)
+        assert_equal(sorted(results), range(5))
+
+    def test_run_all_reraises(self):
+        def boom():
+            raise ValueError('boom')
+        with assert_raises(ValueError):
+            PostcommitExecutor(2, 10).run_all([boom], timeout=1)
+
+    def test_runs_inline_past_max_queue_depth(self):
+        results = []
+        pool = PostcommitExecutor(1, 0)
+        assert_is_none(pool.submit(functools.partial(add_to, results, 'inline')))
+        assert_equal(results, ['inline'])
+        assert_equal(pool.ran_inline, 1)
+
+    def test_concurrency_is_capped(self):
+        running = {'now': 0, 'max': 0}
+
+        def task():
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            gevent.sleep(0.01)
+            running['now'] -= 1
+
+        PostcommitExecutor(3, 100).run_all([task] * 10, timeout=5)
+        assert_equal(running['max'], 3)
+
+    def test_latency_is_recorded(self):
+        results = []
+        PostcommitExecutor(1, 10).run_all([functools.partial(add_to, results, 1)], timeout=1)
+        histograms = executor.get_latency_histograms()
+        assert_equal(sum(histograms['{}.add_to'.format(__name__)].values()), 1)
+
+    @mock.patch('framework.postcommit_tasks.executor.time.time')
+    def test_latency_buckets(self, mock_time):
+        mock_time.side_effect = [0, 0.3]
+        PostcommitExecutor(1, 10)._run(lambda: None)
+        histogram = executor.get_latency_histograms().values()[0]
+        assert_equal(histogram, {0.5: 1})
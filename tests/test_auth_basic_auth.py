@@ -4,13 +4,17 @@
 
 from __future__ import absolute_import
 
+import mock
 import pytest
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from nose.tools import *  # noqa PEP8 asserts
 from datetime import timedelta
 
 from addons.twofactor.tests import _valid_code
+from framework.sessions.cache import clear_session_cache
+from osf.models import Session
 from website import settings
 
 from tests.base import OsfTestCase
@@ -105,3 +109,23 @@ class TestAuthBasicAuthentication(OsfTestCase):
         res = self.app.get(self.reachable_url)
         assert_equal(res.status_code, 302)
         assert_in('login', res.location)
+
+    @pytest.mark.enable_bookmark_creation
+    def test_cached_session_does_no_session_queries(self):
+        cookie = self.user1.get_or_create_cookie()
+        self.app.set_cookie(settings.COOKIE_NAME, str(cookie))
+        with mock.patch.object(settings, 'SESSION_CACHE_ENABLED', True), \
+                mock.patch('framework.sessions.cache.is_shared_cache', return_value=True):
+            clear_session_cache()
+            self.app.get(self.reachable_url)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.app.get(self.reachable_url)
+            clear_session_cache()
+        assert_equal(res.status_code, 200)
+        assert_false([query for query in ctx.captured_queries if 'osf_session' in query['sql']])
+
+    @pytest.mark.enable_bookmark_creation
+    def test_basic_auth_does_not_save_session(self):
+        res = self.app.get(self.reachable_url, auth=self.user1.auth)
+        assert_equal(res.status_code, 200)
+        assert_false(Session.objects.exists())
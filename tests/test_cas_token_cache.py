@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import unittest
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import mock
+from django.core.cache import caches
+from nose.tools import *  # flake8: noqa (PEP8 asserts)
+
+from framework.auth import cas
+from website import settings
+
+
+class FakeCASHandler(BaseHTTPRequestHandler):
+    """Answers the profile and revocation requests of the OAuth2 API of CAS."""
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def respond(self, status, body=''):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.profile_requests += 1
+        token = self.headers.get('Authorization', '').replace('Bearer ', '')
+        if token not in self.server.tokens:
+            return self.respond(401, json.dumps({'error': 'invalid_token'}))
+        self.respond(200, json.dumps({
+            'id': self.server.tokens[token],
+            'attributes': {},
+            'scope': ['osf.full_read'],
+        }))
+
+    def do_POST(self):
+        payload = urlparse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])))
+        for token in payload.get('token', []):
+            self.server.tokens.pop(token, None)
+        self.respond(204)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeCAS(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeCASHandler)
+        self.tokens = {}  # Access token -> user guid
+        self.connections = 0
+        self.profile_requests = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class TestCASTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cas = FakeCAS()
+        self.cas.tokens['valid-token'] = 'abc12'
+        thread = threading.Thread(target=self.cas.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.client = cas.CasClient(self.cas.url)
+
+        patcher = mock.patch.object(settings, 'CAS_TOKEN_CACHE_ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # The tests run in one process, so the locmem cache is as good as a shared one
+        patcher = mock.patch('framework.auth.cas.is_shared_cache', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cas._session = None
+        caches[cas.TOKEN_CACHE].clear()
+
+    def tearDown(self):
+        self.cas.shutdown()
+        self.cas.server_close()
+        cas._session = None
+
+    def test_profile_is_cached(self):
+        for _ in range(3):
+            resp = self.client.profile('valid-token')
+            assert_true(resp.authenticated)
+            assert_equal(resp.user, 'abc12')
+            assert_equal(resp.attributes['accessToken'], 'valid-token')
+            assert_equal(resp.attributes['accessTokenScope'], {'osf.full_read'})
+        assert_equal(self.cas.profile_requests, 1)
+
+    def test_token_is_not_stored(self):
+        self.client.profile('valid-token')
+        cached = caches[cas.TOKEN_CACHE].get(cas.token_cache_key('valid-token'))
+        assert_not_in('accessToken', cached.attributes)
+
+    def test_invalid_token_is_cached(self):
+        for _ in range(3):
+            with assert_raises(cas.CasHTTPError) as ctx:
+                self.client.profile('invalid-token')
+            assert_equal(ctx.exception.code, 401)
+        assert_equal(self.cas.profile_requests, 1)
+
+    def test_revoked_token_is_evicted(self):
+        self.client.profile('valid-token')
+        assert_true(self.client.revoke_tokens({'token': 'valid-token'}))
+        with assert_raises(cas.CasHTTPError):
+            self.client.profile('valid-token')
+        assert_equal(self.cas.profile_requests, 2)
+
+    def test_revoking_application_tokens_evicts_all_tokens(self):
+        self.client.profile('valid-token')
+        self.client.revoke_application_tokens('client-id', 'client-secret')
+        self.client.profile('valid-token')
+        assert_equal(self.cas.profile_requests, 2)
+        self.client.profile('valid-token')
+        assert_equal(self.cas.profile_requests, 2)
+
+    def test_revoking_application_tokens_keeps_other_cache_entries(self):
+        # With a shared backend, other caches may live in the same database
+        token_cache = caches[cas.TOKEN_CACHE]
+        token_cache.set('sessions:abc12', 'session')
+        self.client.revoke_application_tokens('client-id', 'client-secret')
+        assert_equal(token_cache.get('sessions:abc12'), 'session')
+
+    def test_connections_are_reused(self):
+        for i in range(5):
+            self.cas.tokens['token-{}'.format(i)] = 'abc12'
+            self.client.profile('token-{}'.format(i))
+        assert_equal(self.cas.profile_requests, 5)
+        assert_equal(self.cas.connections, 1)
+
+    @mock.patch.object(settings, 'CAS_TOKEN_CACHE_ENABLED', False)
+    def test_disabled(self):
+        self.client.profile('valid-token')
+        self.client.profile('valid-token')
+        assert_equal(self.cas.profile_requests, 2)
+
+    def test_per_process_cache_is_not_used(self):
+        with mock.patch('framework.auth.cas.is_shared_cache', return_value=False):
+            self.client.profile('valid-token')
+            self.client.profile('valid-token')
+        assert_equal(self.cas.profile_requests, 2)
+
+    def test_forked_process_gets_new_session(self):
+        session = cas.get_session()
+        assert_is(cas.get_session(), session)
+        with mock.patch('framework.auth.cas.os.getpid', return_value=-1):
+            assert_is_not(cas.get_session(), session)
@@ -2,10 +2,12 @@
 import os
 import json
 
+import mock
 from django.utils import timezone
 from nose.tools import *  # flake8: noqa
 
-from api.citations.utils import render_citation
+from api.citations import utils as citation_utils
+from api.citations.utils import render_citation, render_citations, render_citation_styles
 from osf_tests.factories import UserFactory, PreprintFactory
 from tests.base import OsfTestCase
 from osf.models import OSFUser
@@ -174,3 +176,63 @@ class TestCiteprocpyMLA(OsfTestCase):
                 self.formated_date)
         )
 
+
+
+class TestCitationCaches(OsfTestCase):
+
+    def setUp(self):
+        super(TestCitationCaches, self).setUp()
+        UserFactory(fullname='Henrique Harman')
+        self.node = Node()
+        self.node.visible_contributors = OSFUser.objects.filter(fullname='Henrique Harman')
+        citation_utils.clear_style_cache()
+        citation_utils.get_citation_cache().clear()
+
+    def test_styles_are_parsed_once(self):
+        with mock.patch('api.citations.utils.CitationStylesStyle', wraps=citation_utils.CitationStylesStyle) as parse:
+            first = citation_utils.get_style('apa')
+            second = citation_utils.get_style('apa')
+        assert_is(first, second)
+        assert_equal(parse.call_count, 1)
+
+    def test_changed_styles_are_parsed_again(self):
+        first = citation_utils.get_style('apa')
+        first.mtime -= 1
+        assert_is_not(citation_utils.get_style('apa'), first)
+
+    def test_least_recently_used_styles_are_dropped(self):
+        with mock.patch('django.conf.settings.CITATION_STYLE_CACHE_SIZE', 2):
+            apa = citation_utils.get_style('apa')
+            citation_utils.get_style('modern-language-association')
+            citation_utils.get_style('apa')
+            citation_utils.get_style('chicago-author-date')
+        assert_equal(list(citation_utils._styles), ['apa', 'chicago-author-date'])
+        assert_is(citation_utils.get_style('apa'), apa)
+
+    def test_unknown_style(self):
+        with assert_raises(ValueError):
+            render_citation(self.node, 'not-a-style')
+
+    def test_citations_are_cached_by_csl(self):
+        citation = render_citation(self.node, 'apa')
+        with mock.patch('api.citations.utils._render') as render:
+            assert_equal(render_citation(self.node, 'apa'), citation)
+        assert_false(render.called)
+
+        self.node.csl = dict(Node.csl, title=u'The study of coffee')
+        assert_in(u'The study of coffee', render_citation(self.node, 'apa'))
+
+    def test_render_citation_styles(self):
+        styles = ['apa', 'modern-language-association', 'chicago-author-date']
+        citations = render_citation_styles(self.node, styles)
+        citation_utils.get_citation_cache().clear()
+        assert_equal(citations, {style: render_citation(self.node, style) for style in styles})
+
+    def test_render_citations(self):
+        other = Node()
+        other.visible_contributors = self.node.visible_contributors
+        other.csl = dict(Node.csl, title=u'The study of coffee')
+        citations = render_citations([self.node, other], 'apa')
+        assert_equal(len(citations), 2)
+        assert_in(Node.csl['title'], citations[0])
+        assert_in(u'The study of coffee', citations[1])
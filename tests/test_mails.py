@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+from mako.template import Template
+from nose.tools import *  # noqa (PEP8 asserts)
+
+from website import mails
+
+
+class TestMailTemplates(unittest.TestCase):
+
+    def test_subject_is_compiled_once(self):
+        mail = mails.Mail('test', subject='Compiled once for ${name}')
+        with mock.patch('website.mails.mails.Template', wraps=Template) as template:
+            assert_equal(mail.subject(name='Freddie'), 'Compiled once for Freddie')
+            assert_equal(mail.subject(name='Brian'), 'Compiled once for Brian')
+        assert_equal(template.call_count, 1)
+
+    def test_render_batch(self):
+        rendered = mails.TEST.render_batch([{'name': 'Freddie'}, {'name': 'Brian'}])
+        assert_equal(rendered, [
+            ('A test email to Freddie', mails.render_message('test.html.mako', name='Freddie')),
+            ('A test email to Brian', mails.render_message('test.html.mako', name='Brian')),
+        ])
+        assert_equal(rendered[0][1], 'Hello <p>Freddie</p>\n')
+
+    def test_render_messages(self):
+        assert_equal(
+            mails.render_messages('test.html.mako', [{'name': 'Freddie'}, {'name': 'Brian'}]),
+            [mails.render_message('test.html.mako', name='Freddie'), mails.render_message('test.html.mako', name='Brian')]
+        )
+
+    def test_precompile_templates(self):
+        with mock.patch.object(mails.mails, '_subject_templates', {}) as subjects:
+            assert_true(mails.precompile_templates() > 0)
+        assert_in(mails.TEST._subject, subjects)
+        assert_in(mails.TEST.tpl_name, mails.mails._tpl_lookup._collection)
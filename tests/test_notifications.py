@@ -2,6 +2,8 @@ import collections
 import mock
 from babel import dates, Locale
 from schema import Schema, And, Use, Or
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from nose.tools import *  # noqa PEP8 asserts
@@ -1243,6 +1245,42 @@ class TestCompileSubscriptions(NotificationTestCase):
         assert_equal(subs, {'email_transactional': [], 'email_digest': [self.user_1._id], 'none': []})
 
 
+    def test_query_count_does_not_grow_with_depth_or_subscribers(self):
+        def count_queries(node):
+            with CaptureQueriesContext(connection) as ctx:
+                emails.compile_subscriptions(node, 'file_updated')
+            return len(ctx.captured_queries)
+
+        self.base_sub.email_transactional.add(self.user_1)
+        shallow_queries = count_queries(self.shared_node)
+
+        node = self.shared_node
+        for i in range(5):
+            node = factories.NodeFactory(parent=node, creator=self.user_1)
+            subscription = factories.NotificationSubscriptionFactory(
+                _id=node._id + '_file_updated',
+                node=node,
+                event_name='file_updated'
+            )
+            subscriber = factories.UserFactory()
+            self.base_project.add_contributor(subscriber, permissions='admin')
+            subscription.email_digest.add(subscriber)
+
+        assert_equal(count_queries(node), shallow_queries)
+        assert_equal(len(emails.compile_subscriptions(node, 'file_updated')['email_digest']), 5)
+
+    @mock.patch('website.notifications.emails.get_current_request')
+    def test_memoized_for_the_request(self, mock_get_current_request):
+        mock_get_current_request.return_value = mock.Mock(spec=[])
+        self.base_sub.email_transactional.add(self.user_1)
+        result = emails.compile_subscriptions(self.shared_node, 'file_updated')
+        result['email_transactional'].remove(self.user_1._id)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = emails.compile_subscriptions(self.shared_node, 'file_updated')
+        assert_equal(len(ctx.captured_queries), 0)
+        assert_equal(result['email_transactional'], [self.user_1._id])
+
 class TestMoveSubscription(NotificationTestCase):
     def setUp(self):
         super(TestMoveSubscription, self).setUp()
@@ -1771,12 +1809,13 @@ class TestSendDigest(OsfTestCase):
     @mock.patch('website.mails.send_mail')
     def test_send_users_email_called_with_correct_args(self, mock_send_mail):
         send_type = 'email_transactional'
+        project = factories.ProjectFactory()
         d = factories.NotificationDigestFactory(
             send_type=send_type,
             event='comment_replies',
             timestamp=timezone.now(),
             message='Hello',
-            node_lineage=[factories.ProjectFactory()._id]
+            node_lineage=[project._id]
         )
         d.save()
         user_groups = list(get_users_emails(send_type))
@@ -1794,6 +1833,9 @@ class TestSendDigest(OsfTestCase):
         assert_equal(kwargs['mail'], mails.DIGEST)
         assert_equal(kwargs['name'], user.fullname)
         assert_equal(kwargs['can_change_node_preferences'], True)
+        # Worker threads get the guid, not the node
+        assert_equal(kwargs['node_id'], project._id)
+        assert_not_in('node', kwargs)
         message = group_by_node(user_groups[last_user_index]['info'])
         assert_equal(kwargs['message'], message)
 
@@ -1819,6 +1861,78 @@ class TestSendDigest(OsfTestCase):
         send_users_email(send_type)
         assert_false(mock_send_mail.called)
 
+    @mock.patch('website.notifications.tasks.settings.NOTIFICATION_DIGEST_BATCH_SIZE', 1)
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_in_batches_removes_sent_digests(self, mock_send_mail):
+        send_type = 'email_transactional'
+        for user in (self.user_1, self.user_2):
+            for i in range(2):
+                factories.NotificationDigestFactory(
+                    user=user,
+                    send_type=send_type,
+                    event='comment_replies',
+                    timestamp=self.timestamp,
+                    message='Hello',
+                    node_lineage=[self.project._id]
+                )
+
+        send_users_email(send_type)
+        assert_equal(
+            sorted(call[1]['to_addr'] for call in mock_send_mail.call_args_list),
+            sorted([self.user_1.username, self.user_2.username])
+        )
+        assert_false(NotificationDigest.objects.filter(send_type=send_type).exists())
+
+    @mock.patch('website.notifications.tasks.log_exception')
+    @mock.patch('website.notifications.tasks.settings.NOTIFICATION_DIGEST_BATCH_SIZE', 1)
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_in_a_transaction(self, mock_send_mail, mock_log_exception):
+        # e.g. run eagerly by celery, inside the transaction of a request
+        send_type = 'email_transactional'
+        user_3 = factories.UserFactory()
+        for user in (self.user_1, self.user_2, user_3):
+            factories.NotificationDigestFactory(
+                user=user,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=self.timestamp,
+                message='Hello',
+                node_lineage=[self.project._id]
+            )
+        mock_send_mail.side_effect = lambda **kwargs: self._fail_for(kwargs, self.user_2)
+
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as ctx:
+                send_users_email(send_type)
+
+        assert_equal(mock_send_mail.call_count, 3)
+        # Digests are read one batch of users at a time, and the last query finds no more
+        assert_equal(len([query for query in ctx.captured_queries if 'WITH users AS' in query['sql']]), 4)
+        assert_equal(list(NotificationDigest.objects.filter(send_type=send_type).values_list('user_id', flat=True)), [self.user_2.id])
+
+    @staticmethod
+    def _fail_for(kwargs, user):
+        if kwargs['to_addr'] == user.username:
+            raise Exception('connection refused')
+
+    @mock.patch('website.notifications.tasks.log_exception')
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_keeps_digests_that_failed(self, mock_send_mail, mock_log_exception):
+        mock_send_mail.side_effect = Exception('connection refused')
+        send_type = 'email_transactional'
+        d = factories.NotificationDigestFactory(
+            user=self.user_1,
+            send_type=send_type,
+            event='comment_replies',
+            timestamp=self.timestamp,
+            message='Hello',
+            node_lineage=[self.project._id]
+        )
+
+        send_users_email(send_type)
+        assert_true(mock_log_exception.called)
+        assert_true(NotificationDigest.objects.filter(_id=d._id).exists())
+
     def test_remove_sent_digest_notifications(self):
         d = factories.NotificationDigestFactory(
             event='comment_replies',
@@ -16,7 +16,7 @@ from osf_tests.factories import RegistrationFactory, UserFactory, fake_email
 
 from framework.auth.utils import generate_csl_given_name
 from framework.routing import Rule, json_renderer
-from framework.utils import secure_filename, throttle_period_expired
+from framework.utils import RateLimiter, secure_filename, throttle_period_expired
 from api.base.utils import waterbutler_api_url_for
 from osf.utils.functional import rapply
 from website.routes import process_rules, OsfWebRenderer
@@ -55,6 +55,24 @@ class TestTimeUtils(unittest.TestCase):
         is_expired = throttle_period_expired(timestamp=(timestamp - 31), throttle=30)
         assert_true(is_expired)
 
+    @mock.patch('framework.utils.time')
+    def test_rate_limiter_spaces_calls(self, mock_time):
+        mock_time.time.side_effect = [100.0, 100.1, 101.1]
+        limiter = RateLimiter(2)
+        limiter.wait()
+        limiter.wait()
+        assert_equal(mock_time.sleep.call_count, 1)
+        assert_almost_equal(mock_time.sleep.call_args[0][0], 0.4)
+        limiter.wait()
+        assert_equal(mock_time.sleep.call_count, 1)
+
+    @mock.patch('framework.utils.time')
+    def test_rate_limiter_without_rate(self, mock_time):
+        limiter = RateLimiter(0)
+        limiter.wait()
+        limiter.wait()
+        assert_false(mock_time.sleep.called)
+
 class TestUrlForHelpers(unittest.TestCase):
 
     def setUp(self):
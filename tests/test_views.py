@@ -896,6 +896,39 @@ class TestProjectViews(OsfTestCase):
         assert_in('fork_count', res.json['node'])
         assert_equal(1, res.json['node']['fork_count'])
 
+    @mock.patch('website.project.tasks.mails.send_mail')
+    def test_fork_async(self, mock_send_mail):
+        url = self.project.api_url_for('project_fork_async')
+        res = self.app.post_json(url, {'title': 'Background fork'}, auth=self.user2.auth)
+        assert_equal(res.status_code, 202)
+        assert_true(res.json['task_id'])
+        fork = self.project.forks.get()
+        assert_equal(fork.title, 'Background fork')
+        assert_equal(fork.creator, self.user2)
+        assert_true(mock_send_mail.called)
+
+    def test_fork_async_requires_read_permission(self):
+        url = self.project.api_url_for('project_fork_async')
+        res = self.app.post_json(url, {}, auth=AuthUserFactory().auth, expect_errors=True)
+        assert_equal(res.status_code, 403)
+        assert_false(self.project.forks.exists())
+
+    @mock.patch('website.project.views.node.fork_node_async.AsyncResult')
+    def test_fork_async_status(self, mock_async_result):
+        url = self.project.api_url_for('project_fork_async_status', task_id='abc')
+        mock_async_result.return_value = mock.Mock(state='PROGRESS', info={'stage': 'logs', 'done': 1, 'total': 1})
+        res = self.app.get(url, auth=self.auth)
+        assert_equal(res.json, {'state': 'PROGRESS', 'stage': 'logs', 'done': 1, 'total': 1})
+
+        fork = self.project.fork_node(self.consolidate_auth1)
+        mock_async_result.return_value = mock.Mock(state='SUCCESS', result=fork._id, **{'successful.return_value': True})
+        res = self.app.get(url, auth=self.auth)
+        assert_equal(res.json, {'state': 'SUCCESS', 'url': fork.url})
+
+        # Only the user who can see the fork gets its url
+        res = self.app.get(url, auth=self.auth2)
+        assert_equal(res.json, {'state': 'SUCCESS'})
+
     def test_registration_retraction_redirect(self):
         url = self.project.web_url_for('node_registration_retraction_redirect')
         res = self.app.get(url, auth=self.auth)
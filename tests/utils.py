@@ -1,7 +1,12 @@
+import BaseHTTPServer
 import contextlib
 import datetime
 import functools
+import json
 import mock
+import smtplib
+import SocketServer
+import threading
 
 from django.http import HttpRequest
 from django.utils import timezone
@@ -234,3 +239,144 @@ def unique(factory):
 def run_celery_tasks():
     yield
     celery_teardown_request()
+
+
+class FakeSMTPConnection(object):
+    """Stands in for an `smtplib.SMTP` connection, delivering to a `FakeSMTPSink`."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.connected = True
+
+    def _check_connected(self):
+        if not self.connected:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+    def ehlo(self, name=''):
+        self._check_connected()
+        return 250, 'fake'
+
+    def starttls(self, *args, **kwargs):
+        self._check_connected()
+        return 220, 'Ready to start TLS'
+
+    def login(self, user, password):
+        self._check_connected()
+        self.sink.logins += 1
+        return 235, 'Authentication successful'
+
+    def sendmail(self, from_addr, to_addrs, msg, *args, **kwargs):
+        self._check_connected()
+        self.sink.messages.append((from_addr, to_addrs, msg))
+        return {}
+
+    def quit(self):
+        self.close()
+        return 221, 'Bye'
+
+    def close(self):
+        self.connected = False
+
+
+class FakeSMTPSink(object):
+    """Collects the messages sent over the connections it opens in place of `smtplib.SMTP`."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = []
+        self.logins = 0
+
+    def __call__(self, host='', port=0, *args, **kwargs):
+        connection = FakeSMTPConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def disconnect_all(self):
+        """Drop every connection, like a server closing idle ones."""
+        for connection in self.connections:
+            connection.close()
+
+@contextlib.contextmanager
+def mock_smtp():
+    """Send mail over SMTP to a `FakeSMTPSink` that is yielded. Pooled connections are
+    closed before and after, so none are shared with other tests.
+    """
+    from framework.email.tasks import smtp_pool
+
+    sink = FakeSMTPSink()
+    smtp_pool.close_all()
+    try:
+        with mock.patch('smtplib.SMTP', sink):
+            yield sink
+    finally:
+        smtp_pool.close_all()
+
+
+class StubShareHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep-alive, like SHARE
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        stub = self.server
+        body = self.rfile.read(int(self.headers.getheader('Content-Length', 0)))
+        stub.requests.append({
+            'path': self.path,
+            'token': self.headers.getheader('Authorization', '').replace('Bearer ', '', 1),
+            'graph': json.loads(body)['data']['attributes']['data']['@graph'],
+        })
+        status = stub.statuses.pop(0) if stub.statuses else 202
+        content = json.dumps({'data': {'type': 'NormalizedData'}})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/vnd.api+json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubShareServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """A local HTTP server standing in for SHARE. It records the requests it gets and
+    answers them with the statuses queued in `statuses`, then with 202 Accepted.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubShareHandler)
+        self.requests = []
+        self.statuses = []
+        self.connections = 0
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address)
+
+    def graphs_for(self, guid):
+        """The graph items of the requests that sent the object with `guid`."""
+        return [
+            request['graph'] for request in self.requests
+            if any(guid in item.get('uri', '') for item in request['graph'])
+        ]
+
+@contextlib.contextmanager
+def stub_share_server():
+    """Point SHARE_URL at a `StubShareServer` that is yielded."""
+    from website.share_outbox import close_session
+
+    server = StubShareServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    close_session()
+    try:
+        with mock.patch('website.settings.SHARE_URL', server.url):
+            yield server
+    finally:
+        close_session()
+        server.shutdown()
+        server.server_close()
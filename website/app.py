@@ -22,6 +22,7 @@ from framework.logging import logger as root_logger  # noqa
 from framework.postcommit_tasks import handlers as postcommit_handlers
 from framework.sentry import sentry
 from framework.transactions import handlers as transaction_handlers
+from website import mails
 # Imports necessary to connect signals
 from website.archiver import listeners  # noqa
 from website.mails import listeners  # noqa
@@ -104,6 +105,9 @@ def init_app(settings_module='website.settings', set_backends=True, routes=True,
     settings = importlib.import_module(settings_module)
 
     init_addons(settings, routes)
+    if not settings.DEBUG_MODE:
+        # Compile email templates now rather than on the first send of each
+        mails.precompile_templates()
     with open(os.path.join(settings.STATIC_FOLDER, 'built', 'nodeCategories.json'), 'wb') as fp:
         json.dump(settings.NODE_CATEGORY_MAP, fp)
 
@@ -1,6 +1,7 @@
 import requests
 import json
 import httplib as http
+import time
 
 import celery
 from celery.utils.log import get_task_logger
@@ -9,6 +10,8 @@ from framework.celery_tasks import app as celery_app
 from framework.celery_tasks.utils import logged
 from framework.exceptions import HTTPError
 
+from addons.base.exceptions import FileTreeSizeExceeded
+
 from api.base.utils import waterbutler_api_url_for
 
 from website.archiver import (
@@ -18,7 +21,6 @@ from website.archiver import (
     ARCHIVER_NETWORK_ERROR,
     ARCHIVER_FILE_NOT_FOUND,
     ARCHIVER_UNCAUGHT_ERROR,
-    NO_ARCHIVE_LIMIT,
     AggregateStatResult,
 )
 from website.archiver import utils
@@ -29,6 +31,7 @@ from website import settings
 from website.app import init_addons
 from osf.models import (
     ArchiveJob,
+    ArchiveTarget,
     AbstractNode,
     DraftRegistration,
 )
@@ -106,6 +109,28 @@ class ArchiverTask(celery.Task):
         archiver_signals.archive_fail.send(dst, errors=errors)
 
 
+class StatProgress(object):
+    """Saves the partial totals of an addon that is being sized as the `stat_result`
+    of its archive target, at most every ``settings.ARCHIVE_STAT_PROGRESS_INTERVAL`` seconds.
+    """
+
+    def __init__(self, job, addon_short_name):
+        self.target = job.get_target(addon_short_name)
+        self.last_saved = time.time()
+
+    def __call__(self, num_files, disk_usage):
+        if self.target is None or time.time() - self.last_saved < settings.ARCHIVE_STAT_PROGRESS_INTERVAL:
+            return
+        logger.info('Sizing archive target {}: {} files, {} bytes so far'.format(self.target._id, num_files, disk_usage))
+        ArchiveTarget.objects.filter(id=self.target.id).update(stat_result={
+            'target_id': self.target._id,
+            'target_name': self.target.name,
+            'num_files': num_files,
+            'disk_usage': disk_usage,
+        })
+        self.last_saved = time.time()
+
+
 @celery_app.task(base=ArchiverTask, ignore_result=False)
 @logged('stat_addon')
 def stat_addon(addon_short_name, job_pk):
@@ -130,7 +155,12 @@ def stat_addon(addon_short_name, job_pk):
         # Addon enabled but not configured - no file trees, nothing to archive.
         return AggregateStatResult(src_addon._id, addon_short_name)
     try:
-        file_tree = src_addon._get_file_tree(user=user, version=version)
+        file_tree = src_addon._get_file_tree(
+            user=user,
+            version=version,
+            max_size=utils.max_archive_size_for(user),
+            progress=StatProgress(job, addon_short_name),
+        )
     except HTTPError as e:
         dst.archive_job.update_target(
             addon_short_name,
@@ -138,6 +168,17 @@ def stat_addon(addon_short_name, job_pk):
             errors=[e.data['error']],
         )
         raise
+    except FileTreeSizeExceeded as e:
+        # No need to list the rest, the registration will fail anyway
+        raise ArchiverSizeExceeded(result=AggregateStatResult(
+            dst._id,
+            dst.title,
+            targets=[AggregateStatResult(
+                src_addon._id,
+                addon_short_name,
+                targets=[utils.aggregate_file_tree_metadata(addon_short_name, e.file_tree, user)],
+            )],
+        ))
     result = AggregateStatResult(
         src_addon._id,
         addon_short_name,
@@ -232,7 +273,8 @@ def archive_node(stat_results, job_pk):
         dst.title,
         targets=stat_results
     )
-    if (NO_ARCHIVE_LIMIT not in job.initiator.system_tags) and (stat_result.disk_usage > settings.MAX_ARCHIVE_SIZE):
+    max_size = utils.max_archive_size_for(job.initiator)
+    if max_size is not None and stat_result.disk_usage > max_size:
         raise ArchiverSizeExceeded(result=stat_result)
     else:
         if not stat_result.targets:
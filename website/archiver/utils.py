@@ -8,6 +8,7 @@ from website.archiver import (
     ARCHIVER_SIZE_EXCEEDED,
     ARCHIVER_FILE_NOT_FOUND,
     ARCHIVER_FORCED_FAILURE,
+    NO_ARCHIVE_LIMIT,
 )
 
 from website import (
@@ -146,6 +147,14 @@ def link_archive_provider(node, user):
         addon.on_add()
     node.save()
 
+def max_archive_size_for(user):
+    """The most bytes `user` may archive into the configured archive provider,
+    or None if they have no limit.
+    """
+    if NO_ARCHIVE_LIMIT in user.system_tags:
+        return None
+    return settings.MAX_ARCHIVE_SIZES.get(settings.ARCHIVE_PROVIDER, settings.MAX_ARCHIVE_SIZE)
+
 def aggregate_file_tree_metadata(addon_short_name, fileobj_metadata, user):
     """Recursively traverse the addon's file tree and collect metadata in AggregateStatResult
 
@@ -32,10 +32,19 @@ EMAIL_TEMPLATES_DIR = os.path.join(settings.TEMPLATES_PATH, 'emails')
 
 _tpl_lookup = TemplateLookup(
     directories=[EMAIL_TEMPLATES_DIR],
+    # Compiled templates are kept by name. Outside of debug mode their files won't
+    # change, so don't stat them on every render
+    filesystem_checks=settings.DEBUG_MODE,
 )
 
 HTML_EXT = '.html.mako'
 
+# Compiled subject templates by subject
+_subject_templates = {}
+
+# Every Mail by template prefix, see `precompile_templates`
+_registry = {}
+
 
 class Mail(object):
     """An email object.
@@ -51,14 +60,34 @@ class Mail(object):
         self.tpl_prefix = tpl_prefix
         self._subject = subject
         self.categories = categories
+        _registry.setdefault(tpl_prefix, self)
+
+    @property
+    def tpl_name(self):
+        return self.tpl_prefix + HTML_EXT
 
     def html(self, **context):
         """Render the HTML email message."""
-        tpl_name = self.tpl_prefix + HTML_EXT
-        return render_message(tpl_name, **context)
+        return render_message(self.tpl_name, **context)
 
     def subject(self, **context):
-        return Template(self._subject).render(**context)
+        return get_subject_template(self._subject).render(**context)
+
+    def render_batch(self, contexts):
+        """Render the subject and HTML message for each of `contexts`.
+
+        :return list: (subject, message) tuples
+        """
+        subject_tpl = get_subject_template(self._subject)
+        tpl = _tpl_lookup.get_template(self.tpl_name)
+        return [(subject_tpl.render(**context), tpl.render(**context)) for context in contexts]
+
+
+def get_subject_template(subject):
+    tpl = _subject_templates.get(subject)
+    if tpl is None:
+        tpl = _subject_templates[subject] = Template(subject)
+    return tpl
 
 
 def render_message(tpl_name, **context):
@@ -67,6 +96,28 @@ def render_message(tpl_name, **context):
     return tpl.render(**context)
 
 
+def render_messages(tpl_name, contexts):
+    """Render an email message for each of `contexts`."""
+    tpl = _tpl_lookup.get_template(tpl_name)
+    return [tpl.render(**context) for context in contexts]
+
+
+def precompile_templates():
+    """Compile the subject and message templates of every `Mail` defined so far, so the
+    first emails sent by a process don't pay for it.
+
+    :return int: Number of mails
+    """
+    count = 0
+    for mail in _registry.values():
+        get_subject_template(mail._subject)
+        # Some mails are only ever rendered with another Mail's template
+        if os.path.exists(os.path.join(EMAIL_TEMPLATES_DIR, mail.tpl_name)):
+            _tpl_lookup.get_template(mail.tpl_name)
+        count += 1
+    return count
+
+
 def send_mail(
         to_addr, mail, mimetype='html', from_addr=None, mailer=None, celery=True,
         username=None, password=None, callback=None, attachment_name=None,
@@ -1,6 +1,11 @@
+from collections import defaultdict
+
 from babel import dates, core, Locale
 
 from osf.models import AbstractNode, OSFUser, NotificationDigest, NotificationSubscription
+from osf.models.node_relation import NodeClosure
+from osf.models.readable_node import ReadableNode
+from osf.utils.requests import dummy_request, get_current_request
 
 from website import mails
 from website.notifications import constants
@@ -95,15 +100,20 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
     context['user'] = user
     node_lineage_ids = get_node_lineage(node) if node else []
 
+    recipients = []
     for recipient_id in recipient_ids:
         if recipient_id == user._id:
             continue
         recipient = OSFUser.load(recipient_id)
         if recipient.is_disabled:
             continue
-        context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
-        context['recipient'] = recipient
-        message = mails.render_message(template, **context)
+        recipients.append(recipient)
+
+    messages = mails.render_messages(template, [
+        dict(context, localized_timestamp=localize_timestamp(timestamp, recipient), recipient=recipient)
+        for recipient in recipients
+    ])
+    for recipient, message in zip(recipients, messages):
         digest = NotificationDigest(
             timestamp=timestamp,
             send_type=notification_type,
@@ -116,34 +126,96 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
         digest.save()
 
 
-def compile_subscriptions(node, event_type, event=None, level=0):
-    """Recurse through node and parents for subscriptions.
+def compile_subscriptions(node, event_type, event=None):
+    """Compile the subscriptions to `event_type` on node and its parents, or to the particular
+    `event` (e.g. a file's file_updated) on node. A user's subscription on a node overrides
+    theirs on its parents, and only users who can read node are included.
+
+    The subscriptions and permissions of the whole lineage are loaded in a few queries, and
+    the result is memoized for the rest of the request.
 
     :param node: current node
     :param event_type: Generally node_subscriptions_available
     :param event: Particular event such a file_updated that has specific file subs
-    :param level: How deep the recursion is
     :return: a dict of notification types with lists of users.
     """
-    subscriptions = check_node(node, event_type)
+    memo = _get_subscriptions_memo()
+    key = (node.id, event_type, event)
+    if key not in memo:
+        memo[key] = _compile_subscriptions(node, event_type, event)
+    # Callers modify the lists they get
+    return {notification_type: list(users) for notification_type, users in memo[key].items()}
+
+
+def _get_subscriptions_memo():
+    request = get_current_request()
+    if request is dummy_request:
+        # Not in a request, so nothing to scope the memo to
+        return {}
+    if not hasattr(request, '_subscriptions_memo'):
+        request._subscriptions_memo = {}
+    return request._subscriptions_memo
+
+
+def _compile_subscriptions(node, event_type, event=None):
+    ancestor_depths = dict(NodeClosure.objects.filter(descendant_id=node.id).values_list('ancestor_id', 'depth'))
+    ancestors = AbstractNode.objects.filter(id__in=ancestor_depths.keys()) if ancestor_depths else []
+    lineage = [node] + sorted(ancestors, key=lambda ancestor: ancestor_depths[ancestor.id])
+
+    keys = [utils.to_subscription_key(each._id, event_type) for each in lineage]
     if event:
-        subscriptions = check_node(node, event)  # Gets particular event subscriptions
-        parent_subscriptions = compile_subscriptions(node, event_type, level=level + 1)  # get node and parent subs
-    elif node.parent_id:
-        parent_subscriptions = \
-            compile_subscriptions(AbstractNode.load(node.parent_id), event_type, level=level + 1)
-    else:
-        parent_subscriptions = check_node(None, event_type)
+        keys.append(utils.to_subscription_key(node._id, event))
+
+    # {subscription key: {notification type: [(user pk, user guid)]}}
+    subscribed = defaultdict(lambda: defaultdict(list))
+    for notification_type in constants.NOTIFICATION_TYPES:
+        through = getattr(NotificationSubscription, notification_type).through
+        rows = through.objects.filter(
+            notificationsubscription___id__in=keys,
+            osfuser__date_disabled__isnull=True,
+        ).values_list('notificationsubscription___id', 'osfuser_id', 'osfuser__guids___id')
+        for key, user_pk, user_guid in rows:
+            subscribed[key][notification_type].append((user_pk, user_guid))
+
+    user_pks = {user_pk: user_guid for types in subscribed.values() for users in types.values() for user_pk, user_guid in users}
+    readable = set()
+    if user_pks:
+        readable = set(ReadableNode.objects.filter(
+            node_id__in=[each.id for each in lineage],
+            user_id__in=user_pks.keys(),
+        ).values_list('node_id', 'user_id'))
+
+    def check(level_node, level_event):
+        subscription = subscribed[utils.to_subscription_key(level_node._id, level_event)]
+        return {
+            notification_type: [user_guid for user_pk, user_guid in subscription[notification_type] if (level_node.id, user_pk) in readable]
+            for notification_type in constants.NOTIFICATION_TYPES
+        }
+
+    # Subscriptions on a node override those on its parents
+    subscriptions = {key: [] for key in constants.NOTIFICATION_TYPES}
+    for level_node in reversed(lineage):
+        subscriptions = merge_subscriptions(subscriptions, check(level_node, event_type))
+    if event:
+        subscriptions = merge_subscriptions(subscriptions, check(node, event))
+
+    readers = {user_pks[user_pk] for node_id, user_pk in readable if node_id == node.id}
+    return {
+        notification_type: [user_guid for user_guid in users if user_guid in readers]
+        for notification_type, users in subscriptions.items()
+    }
+
+
+def merge_subscriptions(parent_subscriptions, subscriptions):
+    """Add `subscriptions` to `parent_subscriptions`, a user's subscription in the former overriding theirs in the latter."""
+    merged = {}
     for notification_type in parent_subscriptions:
-        p_sub_n = parent_subscriptions[notification_type]
-        p_sub_n.extend(subscriptions[notification_type])
+        p_sub_n = parent_subscriptions[notification_type] + subscriptions[notification_type]
         for nt in subscriptions:
             if notification_type != nt:
                 p_sub_n = list(set(p_sub_n).difference(set(subscriptions[nt])))
-        if level == 0:
-            p_sub_n, removed = utils.separate_users(node, p_sub_n)
-        parent_subscriptions[notification_type] = p_sub_n
-    return parent_subscriptions
+        merged[notification_type] = p_sub_n
+    return merged
 
 
 def check_node(node, event):
@@ -2,16 +2,22 @@
 Tasks for making even transactional emails consolidated.
 """
 import itertools
+import logging
+import time
+from multiprocessing.pool import ThreadPool
 
-from django.db import connection
+from django.db import connection, connections
 
 from framework.celery_tasks import app as celery_app
+from framework.email.tasks import BatchMailer
 from framework.sentry import log_exception
 from osf.models import OSFUser, AbstractNode, AbstractProvider
 from osf.models import NotificationDigest
 from website import mails, settings
 from website.notifications.utils import NotificationsDict
 
+logger = logging.getLogger(__name__)
+
 
 @celery_app.task(name='website.notifications.tasks.send_users_email', max_retries=0)
 def send_users_email(send_type):
@@ -27,32 +33,137 @@ def send_users_email(send_type):
 def _send_global_and_node_emails(send_type):
     """
     Called by `send_users_email`. Send all global and node-related notification emails.
+
+    Pending digests are read from the database and handled in batches of users. Each
+    batch loads its users and nodes in bulk, renders and sends its emails on a pool of
+    threads that reuse their mail connections, then deletes the digests that were sent.
     """
-    grouped_emails = get_users_emails(send_type)
-    for group in grouped_emails:
-        user = OSFUser.load(group['user_id'])
+    mailer = BatchMailer('{} digests'.format(send_type))
+    pool = ThreadPool(settings.NOTIFICATION_DIGEST_WORKERS)
+    sent = failed = 0
+    start = time.time()
+    try:
+        for batch in iter_users_digests(send_type, settings.NOTIFICATION_DIGEST_BATCH_SIZE):
+            batch_sent, batch_failed = _send_digest_batch(batch, pool, mailer)
+            sent += batch_sent
+            failed += batch_failed
+    finally:
+        pool.close()
+        pool.join()
+        mailer.close()
+    logger.info('Sent {} {} digest(s) in {:.1f}s, {} failed'.format(sent, send_type, time.time() - start, failed))
+
+
+def _send_digest_batch(batch, pool, mailer):
+    """Send the digests of a batch of (user id, digest rows) and delete those that were sent.
+
+    :return tuple: Number of emails sent and failed
+    """
+    users = OSFUser.objects.in_bulk([user_id for user_id, _ in batch])
+    messages = {}
+    for user_id, rows in batch:
+        # If there's only one node in digest we can show it's preferences link in the template.
+        sorted_messages = group_by_node(rows)
+        notification_nodes = sorted_messages['children'].keys()
+        messages[user_id] = (sorted_messages, notification_nodes[0] if len(notification_nodes) == 1 else None)
+    # Worker threads are only handed guids, not models that could query lazily
+    node_ids = set(
+        AbstractNode.objects.filter(guids___id__in={node_id for _, node_id in messages.values() if node_id})
+        .values_list('guids___id', flat=True)
+    )
+
+    emails = []
+    for user_id, rows in batch:
+        user = users.get(user_id)
         if not user:
             log_exception()
             continue
-        info = group['info']
-        notification_ids = [message['_id'] for message in info]
-        sorted_messages = group_by_node(info)
-        if sorted_messages:
-            if not user.is_disabled:
-                # If there's only one node in digest we can show it's preferences link in the template.
-                notification_nodes = sorted_messages['children'].keys()
-                node = AbstractNode.load(notification_nodes[0]) if len(
-                    notification_nodes) == 1 else None
-                mails.send_mail(
-                    to_addr=user.username,
-                    mimetype='html',
-                    can_change_node_preferences=bool(node),
-                    node=node,
-                    mail=mails.DIGEST,
-                    name=user.fullname,
-                    message=sorted_messages,
-                )
-            remove_notifications(email_notification_ids=notification_ids)
+        sorted_messages, node_id = messages[user_id]
+        if sorted_messages and not user.is_disabled:
+            node_id = node_id if node_id in node_ids else None
+            emails.append(([row['_id'] for row in rows], dict(
+                to_addr=user.username,
+                mimetype='html',
+                can_change_node_preferences=bool(node_id),
+                node_id=node_id,
+                mail=mails.DIGEST,
+                name=user.fullname,
+                message=sorted_messages,
+                mailer=mailer,
+                celery=False,
+            )))
+        else:
+            # Nothing to send, the digests are only removed
+            emails.append(([row['_id'] for row in rows], None))
+
+    done_ids = []
+    failed = 0
+    for notification_ids, ok in pool.imap_unordered(_send_digest, emails):
+        if ok:
+            done_ids.extend(notification_ids)
+        else:
+            failed += 1
+    remove_notifications(email_notification_ids=done_ids)
+    return len(emails) - failed, failed
+
+
+def _send_digest(email):
+    """Runs on a worker thread, outside the transaction of the task, so should not query
+    the database. Connections opened anyway are closed rather than left to the thread.
+    """
+    notification_ids, kwargs = email
+    if kwargs is None:
+        return notification_ids, True
+    try:
+        mails.send_mail(**kwargs)
+    except Exception:
+        # The digests are kept and retried by the next run
+        log_exception()
+        return notification_ids, False
+    finally:
+        connections.close_all()
+    return notification_ids, True
+
+
+def iter_users_digests(send_type, batch_size):
+    """Read pending digests, except reviews triggered emails for moderators, in batches of
+    `batch_size` users. Each batch is read with its own query, after the user ids of the
+    previous batch, so no cursor is held open while the batch is sent and its digests are
+    deleted, whether or not the task runs inside a transaction. Digests that fail to send
+    are left for the next run.
+
+    :param send_type: from NOTIFICATION_TYPES
+    :return: Iterable of lists of (user id, [{'message': ..., 'node_lineage': [...], '_id': NotificationDigest._id}, ...])
+    """
+    sql = """
+    WITH users AS (
+        SELECT DISTINCT nd.user_id
+        FROM osf_notificationdigest AS nd
+        WHERE send_type = %(send_type)s AND event != 'new_pending_submissions' AND nd.user_id > %(after)s
+        ORDER BY nd.user_id
+        LIMIT %(batch_size)s
+    )
+    SELECT nd.user_id, nd.message, nd.node_lineage, nd._id
+    FROM osf_notificationdigest AS nd
+        JOIN users ON users.user_id = nd.user_id
+    WHERE send_type = %(send_type)s AND event != 'new_pending_submissions'
+    ORDER BY nd.user_id, nd.id
+    """
+    after = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'send_type': send_type, 'after': after, 'batch_size': batch_size})
+            batch = [
+                (user_id, [
+                    {'message': message, 'node_lineage': node_lineage, '_id': _id}
+                    for _, message, node_lineage, _id in rows
+                ])
+                for user_id, rows in itertools.groupby(cursor.fetchall(), key=lambda row: row[0])
+            ]
+        if not batch:
+            return
+        yield batch
+        after = batch[-1][0]
 
 
 def _send_reviews_moderator_emails(send_type):
@@ -123,6 +234,7 @@ def get_moderators_emails(send_type):
 def get_users_emails(send_type):
     """Get all emails that need to be sent.
     NOTE: These do not include reviews triggered emails for moderators.
+    NOTE: This materializes every pending digest, `iter_users_digests` reads them in batches.
 
     :param send_type: from NOTIFICATION_TYPES
     :return: Iterable of dicts of the form:
@@ -76,7 +76,11 @@ def update_preprint_share(preprint, old_subjects=None, share_type=None):
         if not preprint.provider.access_token:
             raise ValueError('No access_token for {}. Unable to send {} to SHARE.'.format(preprint.provider, preprint))
         share_type = share_type or preprint.provider.share_publish_type
-        _update_preprint_share(preprint, old_subjects, share_type)
+        if settings.SHARE_OUTBOX_ENABLED:
+            ShareOutboxEntry = apps.get_model('osf.ShareOutboxEntry')
+            ShareOutboxEntry.enqueue(ShareOutboxEntry.PREPRINT, preprint._id, share_type=share_type, old_subjects=old_subjects)
+        else:
+            _update_preprint_share(preprint, old_subjects, share_type)
 
 def _update_preprint_share(preprint, old_subjects, share_type):
     # Any modifications to this function may need to change _async_update_preprint_share
@@ -47,12 +47,41 @@ def update_collecting_metadata(node, saved_fields):
             if 'is_public' in saved_fields:
                 update_collected_metadata(node._id, op='delete')
 
+@celery_app.task(bind=True, ignore_result=False)
+def fork_node_async(self, node_id, user_id, title=None):
+    """Fork a node in the background for ``website.project.views.node.project_fork_async``.
+    While it runs, the task's state is ``PROGRESS`` and its info is the stage of the fork
+    (see `osf.utils.forks`). Its result is the guid of the fork. The user is emailed when
+    the fork completes or fails.
+    """
+    from framework.auth import Auth
+    AbstractNode = apps.get_model('osf.AbstractNode')
+    OSFUser = apps.get_model('osf.OSFUser')
+
+    def progress(stage, done, total):
+        if not self.request.is_eager:
+            self.update_state(state='PROGRESS', meta={'stage': stage, 'done': done, 'total': total})
+
+    node = AbstractNode.load(node_id)
+    user = OSFUser.load(user_id)
+    try:
+        fork = node.fork_node(Auth(user), title=title, progress=progress)
+    except Exception:
+        mails.send_mail(user.email, mails.FORK_FAILED, title=node.title, guid=node._id, mimetype='html', can_change_preferences=False)
+        raise
+    mails.send_mail(user.email, mails.FORK_COMPLETED, title=node.title, guid=fork._id, mimetype='html', can_change_preferences=False)
+    return fork._id
+
 def update_node_share(node):
     # Wrapper that ensures share_url and token exist
     if settings.SHARE_URL:
         if not settings.SHARE_API_TOKEN:
             return logger.warning('SHARE_API_TOKEN not set. Could not send "{}" to SHARE.'.format(node._id))
-        _update_node_share(node)
+        if settings.SHARE_OUTBOX_ENABLED:
+            ShareOutboxEntry = apps.get_model('osf.ShareOutboxEntry')
+            ShareOutboxEntry.enqueue(ShareOutboxEntry.NODE, node._id)
+        else:
+            _update_node_share(node)
 
 def _update_node_share(node):
     # Any modifications to this function may need to change _async_update_node_share
@@ -108,17 +137,11 @@ def serialize_share_node_data(node):
 def format_node(node):
     is_qa_node = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(node.tags.all().values_list('name', flat=True))) \
         or any(substring in node.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
+    # Unique blank node ids, so graphs can be combined into one batch by website.share_outbox
+    project = GraphNode('project', is_deleted=not node.is_public or node.is_deleted or node.is_spammy or is_qa_node)
     return [
-        {
-            '@id': '_:123',
-            '@type': 'workidentifier',
-            'creative_work': {'@id': '_:789', '@type': 'project'},
-            'uri': '{}{}/'.format(settings.DOMAIN, node._id),
-        }, {
-            '@id': '_:789',
-            '@type': 'project',
-            'is_deleted': not node.is_public or node.is_deleted or node.is_spammy or is_qa_node
-        }
+        GraphNode('workidentifier', creative_work=project, uri='{}{}/'.format(settings.DOMAIN, node._id)).serialize(),
+        project.serialize(),
     ]
 
 def format_registration(node):
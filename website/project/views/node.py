@@ -3,6 +3,7 @@ import os
 import logging
 import httplib as http
 import math
+import uuid
 from collections import defaultdict
 from itertools import islice
 
@@ -14,6 +15,7 @@ from django.db.models import Q, OuterRef, Exists, Subquery
 from framework import status
 from framework.utils import iso8601format
 from framework.auth.decorators import must_be_logged_in, collect_auth
+from framework.celery_tasks.handlers import enqueue_task
 from website.ember_osf_web.decorators import ember_flag_is_active
 from framework.exceptions import HTTPError
 from osf.models.nodelog import NodeLog
@@ -36,6 +38,7 @@ from website.tokens import process_token_or_pass
 from website.util.rubeus import collect_addon_js
 from website.project.model import has_anonymous_link, NodeUpdateError, validate_title
 from website.project.forms import NewNodeForm
+from website.project.tasks import fork_node_async
 from website.project.metadata.utils import serialize_meta_schemas
 from osf.models import AbstractNode, Collection, Guid, PrivateLink, Contributor, Node, NodeRelation
 from osf.models.contributor import get_contributor_permissions
@@ -230,6 +233,34 @@ def project_before_fork(auth, node, **kwargs):
     return {'prompts': prompts}
 
 
+@must_be_logged_in
+@must_be_valid_project
+@must_be_contributor_or_public
+def project_fork_async(auth, node, **kwargs):
+    """Fork a node in the background, for projects too large to fork within a request.
+    Poll ``project_fork_async_status`` with the returned task id.
+    """
+    title = (request.get_json(silent=True) or {}).get('title')
+    task_id = str(uuid.uuid4())
+    enqueue_task(fork_node_async.s(node._id, auth.user._id, title=strip_html(title) if title else None).set(task_id=task_id))
+    return {'task_id': task_id}, http.ACCEPTED
+
+
+@must_be_logged_in
+@must_be_valid_project
+@must_be_contributor_or_public
+def project_fork_async_status(auth, node, **kwargs):
+    result = fork_node_async.AsyncResult(kwargs['task_id'])
+    data = {'state': result.state}
+    if result.state == 'PROGRESS':
+        data.update(result.info)
+    elif result.successful():
+        fork = AbstractNode.load(result.result)
+        if fork and fork.can_view(auth):
+            data['url'] = fork.url
+    return data
+
+
 @must_be_logged_in
 @must_be_valid_project
 def project_before_template(auth, node, **kwargs):
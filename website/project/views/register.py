@@ -175,7 +175,8 @@ def project_before_register(auth, node, **kwargs):
     }
     errors = {}
 
-    addon_set = [n.get_addons() for n in itertools.chain([node], node.get_descendants_recursive(primary_only=True))]
+    nodes = node.prefetch_addons([node] + list(node.get_descendants_recursive(primary_only=True)))
+    addon_set = [n.get_addons() for n in nodes]
     for addon in itertools.chain(*addon_set):
         if not addon.complete:
             continue
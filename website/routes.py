@@ -1557,6 +1557,18 @@ def make_url_map(app):
                 '/project/<pid>/node/<nid>/fork/before/',
             ], 'get', project_views.node.project_before_fork, json_renderer,
         ),
+        Rule(
+            [
+                '/project/<pid>/fork/async/',
+                '/project/<pid>/node/<nid>/fork/async/',
+            ], 'post', project_views.node.project_fork_async, json_renderer,
+        ),
+        Rule(
+            [
+                '/project/<pid>/fork/async/<task_id>/',
+                '/project/<pid>/node/<nid>/fork/async/<task_id>/',
+            ], 'get', project_views.node.project_fork_async_status, json_renderer,
+        ),
         Rule(
             [
                 '/project/<pid>/pointer/fork/',
@@ -1608,6 +1620,13 @@ def make_url_map(app):
             json_renderer,
         ),
 
+        Rule(
+            '/files/auth/batch/',
+            ['get', 'post'],
+            addon_views.get_auth_batch,
+            json_renderer,
+        ),
+
         Rule(
             [
                 '/project/<pid>/waterbutler/logs/',
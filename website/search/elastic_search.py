@@ -5,9 +5,11 @@ from __future__ import division
 
 import copy
 import functools
+import itertools
 import logging
 import math
 import re
+import time
 import unicodedata
 from framework import sentry
 
@@ -16,11 +18,10 @@ import six
 from django.apps import apps
 from django.core.paginator import Paginator
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q
+from django.db.models import Prefetch
 from elasticsearch import (ConnectionError, Elasticsearch, NotFoundError,
                            RequestError, TransportError, helpers)
 from framework.celery_tasks import app as celery_app
-from framework.database import paginated
 from osf.models import AbstractNode
 from osf.models import OSFUser
 from osf.models import BaseFileNode
@@ -316,6 +317,13 @@ def get_doctype_from_node(node):
     else:
         return node.category
 
+def get_delete_doctype(node):
+    if node.is_registration:
+        return 'registration'
+    elif node.is_preprint:
+        return 'preprint'
+    return node.project_or_component
+
 @celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
 def update_node_async(self, node_id, index=None, bulk=False):
     AbstractNode = apps.get_model('osf.AbstractNode')
@@ -377,29 +385,142 @@ def serialize_node(node, category):
         'preprint_url': node.preprint_url,
     }
     if not node.is_retracted:
-        for wiki in node.get_wiki_pages_latest():
+        for wiki in node.get_wiki_pages_latest().select_related('wiki_page'):
             # '.' is not allowed in field names in ES2
             elastic_document['wikis'][wiki.wiki_page.page_name.replace('.', ' ')] = wiki.raw_text(node)
 
     return elastic_document
 
+def is_qa_node(node, tag_names=None):
+    if tag_names is None:
+        tag_names = node.tags.all().values_list('name', flat=True)
+    return bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(tag_names)) or any(substring in node.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
+
+def node_action(node, index):
+    """Return the bulk action that indexes or deletes `node`'s document."""
+    if node.is_deleted or not node.is_public or node.archiving or (node.is_spammy and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or node.is_quickfiles or is_qa_node(node):
+        return {'_op_type': 'delete', '_index': index, '_type': get_delete_doctype(node), '_id': node._id}
+    category = get_doctype_from_node(node)
+    return {'_op_type': 'index', '_index': index, '_type': category, '_id': node._id, '_source': serialize_node(node, category)}
+
+def node_file_actions(node, index, chunk_size=None):
+    """Yield bulk actions for every osfstorage file on `node`.
+
+    Files are read in keyset-paginated chunks with their tags and guids prefetched,
+    and target-level state is computed once rather than per file.
+    """
+    from addons.osfstorage.models import OsfStorageFile
+    Guid = apps.get_model('osf.Guid')
+    chunk_size = chunk_size or settings.ELASTIC_BULK_CHUNK_SIZE
+    queryset = OsfStorageFile.objects.filter(
+        target_content_type=ContentType.objects.get_for_model(type(node)),
+        target_object_id=node.id
+    ).prefetch_related(
+        'tags',
+        Prefetch('guids', queryset=Guid.objects.order_by('id')),
+    ).order_by('id')
+    target_info = file_target_info(node)
+    last_id = 0
+    while True:
+        files = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not files:
+            return
+        for file_ in files:
+            yield file_action(file_, index, target_info=target_info)
+        last_id = files[-1].id
+
+def file_target_info(target):
+    """Target-level fields of a file document, shared by every file on `target`."""
+    if target.is_quickfiles:
+        node_url = '/{user_id}/quickfiles/'.format(user_id=target.creator._id)
+    else:
+        node_url = '/{target_id}/'.format(target_id=target._id)
+    return {
+        'indexable': target.is_public and not target.is_deleted and not target.archiving and not is_qa_node(target),
+        'node_url': node_url,
+        'node_title': getattr(target, 'title', None),
+        'parent_id': target.parent_node._id if getattr(target, 'parent_node', None) else None,
+        'is_registration': getattr(target, 'is_registration', False),
+        'is_retracted': getattr(target, 'is_retracted', False),
+    }
+
+def file_action(file_, index, delete=False, target_info=None):
+    """Return the bulk action that indexes or deletes `file_`'s document."""
+    target = file_.target
+    target_info = target_info or file_target_info(target)
+    tags = file_.tags.all()
+
+    # TODO: Can remove 'not file_.name' if we remove all base file nodes with name=None
+    file_node_is_qa = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(tag.name for tag in tags))
+    if not file_.name or delete or not target_info['indexable'] or file_node_is_qa:
+        return {'_op_type': 'delete', '_index': index, '_type': 'file', '_id': file_._id}
+
+    # We build URLs manually here so that this function can be
+    # run outside of a Flask request context (e.g. in a celery task)
+    file_deep_url = '/{target_id}/files/{provider}{path}/'.format(
+        target_id=target._id,
+        provider=file_.provider,
+        path=file_.path,
+    )
+
+    guid_url = None
+    file_guids = file_.guids.all()
+    if file_guids:
+        guid_url = '/{file_guid}/'.format(file_guid=file_guids[0]._id)
+    file_doc = {
+        'id': file_._id,
+        'deep_url': file_deep_url,
+        'guid_url': guid_url,
+        'tags': [tag.name for tag in tags if not tag.system],
+        'name': file_.name,
+        'category': 'file',
+        'node_url': target_info['node_url'],
+        'node_title': target_info['node_title'],
+        'parent_id': target_info['parent_id'],
+        'is_registration': target_info['is_registration'],
+        'is_retracted': target_info['is_retracted'],
+        'extra_search_terms': clean_splitters(file_.name),
+    }
+    return {'_op_type': 'index', '_index': index, '_type': 'file', '_id': file_._id, '_source': file_doc}
+
+@requires_search
+def streaming_bulk_index(actions, refresh=True):
+    """Send `actions` to elasticsearch in chunks of at most `ELASTIC_BULK_CHUNK_SIZE` documents
+    and `ELASTIC_BULK_MAX_CHUNK_BYTES` bytes. Deletes of missing documents are not errors.
+
+    :return: A tuple of (number of documents, list of failed items)
+    """
+    start = time.time()
+    count, errors = 0, []
+    for ok, item in helpers.streaming_bulk(
+            client(), actions,
+            chunk_size=settings.ELASTIC_BULK_CHUNK_SIZE,
+            max_chunk_bytes=settings.ELASTIC_BULK_MAX_CHUNK_BYTES,
+            raise_on_error=False,
+            refresh=refresh):
+        count += 1
+        if not ok and item.get('delete', {}).get('status') != 404:
+            errors.append(item)
+    elapsed = time.time() - start
+    logger.info('Bulk indexed {} documents in {:.2f}s ({:.0f} docs/s), {} failed'.format(
+        count, elapsed, count / elapsed if elapsed else count, len(errors)
+    ))
+    if errors:
+        logger.error('Bulk indexing errors: {}'.format(errors[:10]))
+    return count, errors
+
 @requires_search
 def update_node(node, index=None, bulk=False, async=False):
-    from addons.osfstorage.models import OsfStorageFile
     index = index or INDEX
-    for file_ in paginated(OsfStorageFile, Q(target_content_type=ContentType.objects.get_for_model(type(node)), target_object_id=node.id)):
-        update_file(file_, index=index)
-
-    is_qa_node = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(node.tags.all().values_list('name', flat=True))) or any(substring in node.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
-    if node.is_deleted or not node.is_public or node.archiving or (node.is_spammy and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or node.is_quickfiles or is_qa_node:
-        delete_doc(node._id, node, index=index)
-    else:
-        category = get_doctype_from_node(node)
-        elastic_document = serialize_node(node, category)
-        if bulk:
-            return elastic_document
-        else:
-            client().index(index=index, doc_type=category, id=node._id, body=elastic_document, refresh=True)
+    if bulk:
+        # The node document is returned for the caller to batch; its files are streamed now
+        streaming_bulk_index(node_file_actions(node, index))
+        action = node_action(node, index)
+        if action['_op_type'] == 'delete':
+            streaming_bulk_index([action])
+            return None
+        return action['_source']
+    streaming_bulk_index(itertools.chain(node_file_actions(node, index), [node_action(node, index)]))
 
 def bulk_update_nodes(serialize, nodes, index=None):
     """Updates the list of input projects
@@ -552,15 +673,8 @@ def update_user(user, index=None):
 @requires_search
 def update_file(file_, index=None, delete=False):
     index = index or INDEX
-    target = file_.target
-
-    # TODO: Can remove 'not file_.name' if we remove all base file nodes with name=None
-    file_node_is_qa = bool(
-        set(settings.DO_NOT_INDEX_LIST['tags']).intersection(file_.tags.all().values_list('name', flat=True))
-    ) or bool(
-        set(settings.DO_NOT_INDEX_LIST['tags']).intersection(target.tags.all().values_list('name', flat=True))
-    ) or any(substring in target.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
-    if not file_.name or not target.is_public or delete or target.is_deleted or target.archiving or file_node_is_qa:
+    action = file_action(file_, index, delete=delete)
+    if action['_op_type'] == 'delete':
         client().delete(
             index=index,
             doc_type='file',
@@ -570,41 +684,10 @@ def update_file(file_, index=None, delete=False):
         )
         return
 
-    # We build URLs manually here so that this function can be
-    # run outside of a Flask request context (e.g. in a celery task)
-    file_deep_url = '/{target_id}/files/{provider}{path}/'.format(
-        target_id=target._id,
-        provider=file_.provider,
-        path=file_.path,
-    )
-    if target.is_quickfiles:
-        node_url = '/{user_id}/quickfiles/'.format(user_id=target.creator._id)
-    else:
-        node_url = '/{target_id}/'.format(target_id=target._id)
-
-    guid_url = None
-    file_guid = file_.get_guid(create=False)
-    if file_guid:
-        guid_url = '/{file_guid}/'.format(file_guid=file_guid._id)
-    file_doc = {
-        'id': file_._id,
-        'deep_url': file_deep_url,
-        'guid_url': guid_url,
-        'tags': list(file_.tags.filter(system=False).values_list('name', flat=True)),
-        'name': file_.name,
-        'category': 'file',
-        'node_url': node_url,
-        'node_title': getattr(target, 'title', None),
-        'parent_id': target.parent_node._id if getattr(target, 'parent_node', None) else None,
-        'is_registration': getattr(target, 'is_registration', False),
-        'is_retracted': getattr(target, 'is_retracted', False),
-        'extra_search_terms': clean_splitters(file_.name),
-    }
-
     client().index(
         index=index,
         doc_type='file',
-        body=file_doc,
+        body=action['_source'],
         id=file_._id,
         refresh=True
     )
@@ -747,13 +830,7 @@ def create_index(index=None):
 @requires_search
 def delete_doc(elastic_document_id, node, index=None, category=None):
     index = index or INDEX
-    if not category:
-        if node.is_registration:
-            category = 'registration'
-        elif node.is_preprint:
-            category = 'preprint'
-        else:
-            category = node.project_or_component
+    category = category or get_delete_doctype(node)
     client().delete(index=index, doc_type=category, id=elastic_document_id, refresh=True, ignore=[404])
 
 
@@ -11,6 +11,7 @@ from elasticsearch import helpers
 
 import website.search.search as search
 from website.search.elastic_search import client
+from website.search_migration.parallel import swap_alias
 from website.search_migration import (
     JSON_UPDATE_NODES_SQL, JSON_DELETE_NODES_SQL,
     JSON_UPDATE_FILES_SQL, JSON_DELETE_FILES_SQL,
@@ -217,12 +218,8 @@ def set_up_index(idx):
 
 
 def set_up_alias(old_index, index):
-    alias = es_client().indices.get_aliases(index=old_index)
-    if alias:
-        logger.info('Removing old aliases to {}'.format(old_index))
-        es_client().indices.delete_alias(index=old_index, name='_all', ignore=404)
-    logger.info('Creating new alias from {0} to {1}'.format(old_index, index))
-    es_client().indices.put_alias(index=index, name=old_index)
+    logger.info('Moving alias {0} to {1}'.format(old_index, index))
+    swap_alias(old_index, index)
 
 
 def remove_old_index(index):
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Parallel, resumable variant of `website.search_migration.migrate`.
+
+Each search-enabled doc type is split into primary key ranges which are migrated by a
+pool of worker processes. Finished ranges are recorded in a JSON checkpoint file, so a
+run that is interrupted can be restarted with the same checkpoint and only migrates the
+ranges that did not finish. Bulk requests rejected by an overloaded cluster (HTTP 429)
+are retried with exponential backoff. The index alias is only moved, atomically, once
+every range has finished.
+"""
+from __future__ import absolute_import
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+
+from django.db import connection, connections
+from elasticsearch import NotFoundError, TransportError, helpers
+
+from osf.models import OSFUser, AbstractNode, BaseFileNode
+from website import settings
+from website.search import elastic_search
+from website.search_migration import (
+    JSON_UPDATE_NODES_SQL, JSON_DELETE_NODES_SQL,
+    JSON_UPDATE_FILES_SQL, JSON_DELETE_FILES_SQL,
+    JSON_UPDATE_USERS_SQL, JSON_DELETE_USERS_SQL)
+
+logger = logging.getLogger(__name__)
+
+# doc type -> (model, update sql, delete sql, whether the sql filters spam)
+DOC_TYPES = OrderedDict([
+    ('nodes', (AbstractNode, JSON_UPDATE_NODES_SQL, JSON_DELETE_NODES_SQL, True)),
+    ('files', (BaseFileNode, JSON_UPDATE_FILES_SQL, JSON_DELETE_FILES_SQL, True)),
+    ('users', (OSFUser, JSON_UPDATE_USERS_SQL, JSON_DELETE_USERS_SQL, False)),
+])
+
+MAX_BULK_RETRIES = 8
+INITIAL_BACKOFF = 1  # seconds, doubled on every rejected attempt
+
+
+class BulkRejectedError(Exception):
+    pass
+
+
+def bulk_with_backoff(actions, raise_on_error=True, max_retries=MAX_BULK_RETRIES, initial_backoff=INITIAL_BACKOFF):
+    """Like `helpers.bulk`, but retries documents the cluster rejected because its bulk
+    queue was full, sleeping `initial_backoff * 2 ** attempt` seconds in between.
+
+    :return int: Number of documents sent
+    """
+    pending = list(actions)
+    total = len(pending)
+    for attempt in range(max_retries + 1):
+        rejected, errors = [], []
+        try:
+            results = helpers.streaming_bulk(
+                elastic_search.client(), pending,
+                chunk_size=settings.ELASTIC_BULK_CHUNK_SIZE,
+                max_chunk_bytes=settings.ELASTIC_BULK_MAX_CHUNK_BYTES,
+                raise_on_error=False,
+            )
+            for action, (ok, item) in zip(pending, results):
+                if ok:
+                    continue
+                if list(item.values())[0].get('status') == 429:
+                    rejected.append(action)
+                else:
+                    errors.append(item)
+        except TransportError as e:
+            if e.status_code != 429:
+                raise
+            rejected = pending
+        if errors and raise_on_error:
+            raise helpers.BulkIndexError('{} document(s) failed to index.'.format(len(errors)), errors)
+        if not rejected:
+            return total
+        delay = initial_backoff * 2 ** attempt
+        logger.warning('{} document(s) rejected by elasticsearch, retrying in {}s'.format(len(rejected), delay))
+        time.sleep(delay)
+        pending = rejected
+    raise BulkRejectedError('{} document(s) still rejected after {} retries'.format(len(pending), max_retries))
+
+
+class Checkpoint(object):
+    """Finished ranges of a reindex, persisted as JSON at `path`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = None
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as fp:
+                data = json.load(fp)
+            self.index = data['index']
+            self.done = set(data['done'])
+
+    def save(self):
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as fp:
+            json.dump({'index': self.index, 'done': sorted(self.done)}, fp)
+        os.rename(tmp_path, self.path)  # atomic, so a crash never leaves a truncated checkpoint
+
+    def mark_done(self, key):
+        self.done.add(key)
+        self.save()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def range_key(doc_type, op, page_start, page_end):
+    return '{}:{}:{}:{}'.format(doc_type, op, page_start, page_end)
+
+def plan_ranges(delete, increment):
+    """Yield (doc_type, op, page_start, page_end) for every range to migrate.
+    One extra range past the current max id covers objects created during the run.
+    """
+    for doc_type, (model, _, _, _) in DOC_TYPES.items():
+        last = model.objects.order_by('id').last()
+        max_id = last.id if last else 0
+        for op in (('update', 'delete') if delete else ('update', )):
+            for page_start in range(0, max_id + increment, increment):
+                yield doc_type, op, page_start, page_start + increment
+
+def migrate_range(task):
+    """Worker entry point: migrate a single range, returning its checkpoint key and count."""
+    index, doc_type, op, page_start, page_end = task
+    _, update_sql, delete_sql, spam_filtered = DOC_TYPES[doc_type]
+    kwargs = {}
+    if spam_filtered:
+        kwargs['spam_flagged_removed_from_search'] = settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH
+    sql = update_sql if op == 'update' else delete_sql
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(index=index, page_start=page_start, page_end=page_end, **kwargs))
+        ser_objs = cursor.fetchone()[0]
+    count = 0
+    if ser_objs:
+        # Deletes of documents that are not in the index are expected
+        count = bulk_with_backoff(ser_objs, raise_on_error=(op == 'update'))
+    return range_key(doc_type, op, page_start, page_end), count
+
+def _init_worker():
+    # The parent's elasticsearch connection pool must not be shared with workers.
+    # Its DB connections are closed before forking, so workers open their own.
+    elastic_search.CLIENT = None
+
+def migrate_ranges(index, checkpoint, delete, workers, increment):
+    tasks = [
+        (index, doc_type, op, page_start, page_end)
+        for doc_type, op, page_start, page_end in plan_ranges(delete, increment)
+        if range_key(doc_type, op, page_start, page_end) not in checkpoint.done
+    ]
+    logger.info('{} ranges to migrate ({} already done)'.format(len(tasks), len(checkpoint.done)))
+    connections.close_all()
+    pool = multiprocessing.Pool(workers, initializer=_init_worker)
+    try:
+        total = 0
+        for i, (key, count) in enumerate(pool.imap_unordered(migrate_range, tasks), 1):
+            checkpoint.mark_done(key)
+            total += count
+            logger.info('Finished {} ({} documents), {} / {} ranges'.format(key, count, i, len(tasks)))
+        pool.close()
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return total
+
+def swap_alias(alias, index):
+    """Point `alias` at `index` and away from every other index in one atomic request."""
+    try:
+        existing = elastic_search.client().indices.get_alias(name=alias)
+    except NotFoundError:
+        existing = {}
+    actions = [{'remove': {'index': old_index, 'alias': alias}} for old_index in existing if old_index != index]
+    actions.append({'add': {'index': index, 'alias': alias}})
+    elastic_search.client().indices.update_aliases(body={'actions': actions})
+    logger.info('Alias {} now points to {}'.format(alias, index))
+
+def parallel_migrate(delete, index=None, remove=False, workers=None, checkpoint_path=None, increment=10000, app=None):
+    """Reindex nodes, files and users across `workers` processes, resuming from `checkpoint_path`.
+
+    Institutions and collection submissions are small and still migrated serially.
+    """
+    from website.search_migration.migrate import (
+        migrate_collected_metadata, migrate_institutions, remove_old_index, set_up_index)
+    from website.app import init_app
+
+    index = index or settings.ELASTIC_INDEX
+    workers = workers or multiprocessing.cpu_count()
+    checkpoint = Checkpoint(checkpoint_path or '{}_reindex_checkpoint.json'.format(index))
+    app = app or init_app('website.settings', set_backends=True, routes=True)
+    ctx = app.test_request_context()
+    ctx.push()
+    try:
+        if checkpoint.index:
+            new_index = checkpoint.index
+            logger.info('Resuming reindex into {}'.format(new_index))
+        else:
+            new_index = set_up_index(index)
+            checkpoint.index = new_index
+            checkpoint.save()
+            if settings.ENABLE_INSTITUTIONS:
+                migrate_institutions(new_index)
+            migrate_collected_metadata(new_index, delete=delete)
+
+        total = migrate_ranges(new_index, checkpoint, delete, workers, increment)
+        logger.info('{} documents migrated'.format(total))
+
+        swap_alias(index, new_index)
+        checkpoint.remove()
+        if remove:
+            remove_old_index(new_index)
+    finally:
+        ctx.pop()
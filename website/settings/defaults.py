@@ -116,6 +116,9 @@ ELASTIC_KWARGS = {
     # 'client_cert': None,
     # 'client_key': None
 }
+# Documents and bytes per request when streaming bulk actions to elasticsearch
+ELASTIC_BULK_CHUNK_SIZE = 500
+ELASTIC_BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
 
 # Sessions
 COOKIE_NAME = 'osf'
@@ -127,6 +130,19 @@ OSF_SESSION_TIMEOUT = 30 * 24 * 60 * 60  # 30 days in seconds
 SECRET_KEY = 'CHANGEME'
 SESSION_COOKIE_SECURE = SECURE_MODE
 SESSION_COOKIE_HTTPONLY = True
+# Sessions are read through a per-process LRU and the SESSION_CACHE django cache, and only
+# written to the database when their data changes, see framework.sessions.cache.
+# Sessions are only cached if SESSION_CACHE is shared between processes (e.g. redis), so
+# logging out is seen by all of them; not with the default per-process cache.
+SESSION_CACHE_ENABLED = True
+SESSION_CACHE = 'sessions'
+SESSION_CACHE_TIMEOUT = 60 * 60  # seconds a session is kept in SESSION_CACHE
+SESSION_CACHE_LOCAL_SIZE = 1000  # sessions kept per process
+# Seconds a process trusts its own copy of a session; changes made by other processes,
+# e.g. logging out, may be missed for this long. 0 to only use SESSION_CACHE.
+SESSION_CACHE_LOCAL_TIMEOUT = 5
+# Seconds verified basic auth credentials skip the password check. 0 to disable.
+BASIC_AUTH_CACHE_TIMEOUT = 60
 
 # local path to private key and cert for local development using https, overwrite in local.py
 OSF_SERVER_KEY = None
@@ -157,6 +173,9 @@ FAKE_EMAIL_DOMAIN = 'cos.io'
 MAIL_SERVER = 'smtp.sendgrid.net'
 MAIL_USERNAME = 'osf-smtp'
 MAIL_PASSWORD = ''  # Set this in local.py
+# Open SMTP connections kept for reuse per server and login, and for how many seconds
+MAIL_POOL_MAX_IDLE = 8
+MAIL_POOL_IDLE_TIMEOUT = 60
 
 # OR, if using Sendgrid's API
 # WARNING: If `SENDGRID_WHITELIST_MODE` is True,
@@ -165,6 +184,10 @@ SENDGRID_API_KEY = None
 SENDGRID_WHITELIST_MODE = False
 SENDGRID_EMAIL_WHITELIST = []
 
+# Number of users whose digests are loaded and sent at once, and of threads sending them
+NOTIFICATION_DIGEST_BATCH_SIZE = 1000
+NOTIFICATION_DIGEST_WORKERS = 8
+
 # Mailchimp
 MAILCHIMP_API_KEY = None
 MAILCHIMP_WEBHOOK_SECRET_KEY = 'CHANGEME'  # OSF secret key to ensure webhook is secure
@@ -189,6 +212,11 @@ MAILGUN_API_KEY = None
 # Use Celery for file rendering
 USE_CELERY = True
 
+# Postcommit tasks share one greenlet pool per process (see framework.postcommit_tasks.executor)
+POSTCOMMIT_POOL_SIZE = 30  # one db connection per greenlet
+POSTCOMMIT_MAX_QUEUE_DEPTH = 300  # tasks waiting for the pool beyond this run in the request instead
+POSTCOMMIT_TIMEOUT = 5.0  # seconds a request waits for its postcommit tasks
+
 # File rendering timeout (in ms)
 MFR_TIMEOUT = 30000
 
@@ -308,6 +336,12 @@ KEEN = {
     },
 }
 
+# Page view, download and user activity counts are buffered in memory and written
+# every COUNTER_FLUSH_INTERVAL seconds, or once COUNTER_BUFFER_MAX_KEYS counters are
+# pending. 0 writes every count immediately.
+COUNTER_FLUSH_INTERVAL = 10
+COUNTER_BUFFER_MAX_KEYS = 10000
+
 SENTRY_DSN = None
 SENTRY_DSN_JS = None
 
@@ -384,7 +418,24 @@ SHARE_REGISTRATION_URL = ''
 SHARE_URL = None
 SHARE_API_TOKEN = None  # Required to send project updates to SHARE
 
+# Queue node and preprint updates in the SHARE outbox, to be sent in batches by celery beat
+SHARE_OUTBOX_ENABLED = True
+SHARE_OUTBOX_BATCH_SIZE = 50  # objects per request
+SHARE_OUTBOX_MAX_BATCHES = 100  # batches sent per flush
+SHARE_OUTBOX_MAX_REQUESTS_PER_SECOND = 2  # 0 for no limit
+SHARE_OUTBOX_MAX_ATTEMPTS = 5
+SHARE_OUTBOX_TIMEOUT = 30  # seconds
+# Seconds a flush may take to send the entries it claimed before another flush retries them.
+# Must exceed the time to send a batch one object at a time.
+SHARE_OUTBOX_LEASE = 60 * 30
+
 CAS_SERVER_URL = 'http://localhost:8080'
+CAS_POOL_SIZE = 10  # keep-alive connections to CAS per process
+# Cache the CAS profiles of OAuth2 access tokens, in the `cas_tokens` django cache
+CAS_TOKEN_CACHE_ENABLED = True  # Has no effect while the cas_tokens django cache is per process
+CAS_TOKEN_CACHE_TIMEOUT = 60  # seconds a valid token is trusted without asking CAS
+CAS_TOKEN_CACHE_NEGATIVE_TIMEOUT = 10  # seconds a rejected token is rejected without asking CAS
+CAS_TOKEN_CACHE_MAX_ENTRIES = 10000
 MFR_SERVER_URL = 'http://localhost:7778'
 
 ###### ARCHIVER ###########
@@ -392,6 +443,13 @@ ARCHIVE_PROVIDER = 'osfstorage'
 
 MAX_ARCHIVE_SIZE = 5 * 1024 ** 3  # == math.pow(1024, 3) == 1 GB
 MAX_FILE_SIZE = MAX_ARCHIVE_SIZE  # TODO limit file size?
+# Overrides of MAX_ARCHIVE_SIZE by ARCHIVE_PROVIDER
+MAX_ARCHIVE_SIZES = {}
+
+# Listing addon file trees, e.g. to size them before archiving
+FILE_TREE_CONCURRENCY = 8  # folders listed at once
+FILE_TREE_MAX_REQUESTS_PER_SECOND = 10  # 0 for no limit
+ARCHIVE_STAT_PROGRESS_INTERVAL = 10  # seconds between saving partial sizes of the addons being archived
 
 ARCHIVE_TIMEOUT_TIMEDELTA = timedelta(1)  # 24 hours
 
@@ -447,6 +505,7 @@ class CeleryConfig:
         'scripts.triggered_mails',
         'website.mailchimp_utils',
         'website.notifications.tasks',
+        'website.share_outbox',
     }
 
     high_pri_modules = {
@@ -498,6 +557,7 @@ class CeleryConfig:
         'website.archiver.tasks',
         'website.search.search',
         'website.project.tasks',
+        'website.share_outbox',
         'scripts.populate_new_and_noteworthy_projects',
         'scripts.populate_popular_projects_and_registrations',
         'scripts.refresh_addon_tokens',
@@ -534,6 +594,10 @@ class CeleryConfig:
         #  Setting up a scheduler, essentially replaces an independent cron job
         # Note: these times must be in UTC
         beat_schedule = {
+            'flush_share_outbox': {
+                'task': 'website.share_outbox.flush_share_outbox',
+                'schedule': crontab(minute='*'),  # Every minute
+            },
             '5-minute-emails': {
                 'task': 'website.notifications.tasks.send_users_email',
                 'schedule': crontab(minute='*/5'),
@@ -619,7 +683,12 @@ class CeleryConfig:
             },
             'generate_sitemap': {
                 'task': 'scripts.generate_sitemap',
-                'schedule': crontab(minute=0, hour=5),  # Daily 12:00 a.m.
+                'schedule': crontab(minute=0, hour=5, day_of_week='1-6'),  # Monday-Saturday 12:00 a.m.
+                'kwargs': {'incremental': True},
+            },
+            'generate_full_sitemap': {
+                'task': 'scripts.generate_sitemap',
+                'schedule': crontab(minute=0, hour=5, day_of_week=0),  # Sunday 12:00 a.m.
             },
             'generate_prereg_csv': {
                 'task': 'scripts.generate_prereg_csv',
@@ -648,6 +717,11 @@ WATERBUTLER_JWE_SECRET = 'CirclesAre4Squares'
 WATERBUTLER_JWT_SECRET = 'ILiekTrianglesALot'
 WATERBUTLER_JWT_ALGORITHM = 'HS256'
 WATERBUTLER_JWT_EXPIRATION = 15
+# Seconds a signed payload from addons.base.views.get_auth may be reused for the same user, node,
+# provider and action, in the WATERBUTLER_AUTH_CACHE django cache. Keep well under the expiration. 0 to disable.
+WATERBUTLER_AUTH_CACHE = 'waterbutler_auth'
+WATERBUTLER_AUTH_CACHE_TIMEOUT = 5
+WATERBUTLER_AUTH_BATCH_SIZE = 100  # actions per get_auth_batch request
 
 SENSITIVE_DATA_SALT = 'yusaltydough'
 SENSITIVE_DATA_SECRET = 'TrainglesAre5Squares'
@@ -661,6 +735,9 @@ ENABLE_INSTITUTIONS = True
 ENABLE_VARNISH = False
 ENABLE_ESI = False
 VARNISH_SERVERS = []  # This should be set in local.py or cache invalidation won't work
+VARNISH_BAN_TIMEOUT = 0.3  # seconds
+VARNISH_BAN_CONCURRENCY = 10  # simultaneous BAN requests (and pooled connections) per host
+VARNISH_BAN_MAX_PATTERNS = 50  # paths collapsed into a single regex BAN
 ESI_MEDIA_TYPES = {'application/vnd.api+json', 'application/json'}
 
 # Used for gathering meta information about the current build
@@ -1877,6 +1954,8 @@ SITEMAP_TO_S3 = False
 SITEMAP_AWS_BUCKET = None
 SITEMAP_URL_MAX = 25000
 SITEMAP_INDEX_MAX = 50000
+# Processes writing sitemap shards, 1 writes them in the calling process
+SITEMAP_WORKERS = 4
 SITEMAP_STATIC_URLS = [
     OrderedDict([('loc', ''), ('changefreq', 'yearly'), ('priority', '0.5')]),
     OrderedDict([('loc', 'preprints'), ('changefreq', 'yearly'), ('priority', '0.5')]),
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""Batched delivery of node and preprint updates to SHARE.
+
+With ``settings.SHARE_OUTBOX_ENABLED``, `update_node_share` and `update_preprint_share`
+add the object to the ``ShareOutboxEntry`` table instead of posting it. `flush_outbox`,
+run by celery beat, serializes the waiting objects and posts them to SHARE in batches of
+up to ``settings.SHARE_OUTBOX_BATCH_SIZE`` graphs, one batch per endpoint and token, over
+a keep-alive session and at most ``settings.SHARE_OUTBOX_MAX_REQUESTS_PER_SECOND``
+requests per second. Batches rejected by SHARE are retried one object at a time, so a
+single bad record does not hold back the rest; failed objects are retried with backoff.
+
+Entries are claimed in a short transaction that pushes their ``next_attempt`` back by
+``settings.SHARE_OUTBOX_LEASE`` seconds, and sent after it commits, so no row lock or
+transaction is held while waiting for SHARE. Concurrent flushes skip claimed entries; if
+a flush dies, its entries are sent again once the lease runs out.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import requests
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from framework.celery_tasks import app as celery_app
+from framework.utils import RateLimiter
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+NODE_PATH = 'api/normalizeddata/'
+PREPRINT_PATH = 'api/v2/normalizeddata/'
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return this process's keep-alive session for SHARE."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            # Connections are not shared with forked processes
+            _session = requests.Session()
+            _session_pid = os.getpid()
+        return _session
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def serialize_batch(graphs):
+    """Wrap the graphs of several objects into a single NormalizedData payload."""
+    return {
+        'data': {
+            'type': 'NormalizedData',
+            'attributes': {
+                'tasks': [],
+                'raw': None,
+                'data': {'@graph': [item for graph in graphs for item in graph]}
+            }
+        }
+    }
+
+def send_batch(path, token, graphs, limiter=None):
+    if limiter:
+        limiter.wait()
+    resp = get_session().post(
+        '{}{}'.format(settings.SHARE_URL, path),
+        json=serialize_batch(graphs),
+        headers={'Authorization': 'Bearer {}'.format(token), 'Content-Type': 'application/vnd.api+json'},
+        timeout=settings.SHARE_OUTBOX_TIMEOUT,
+    )
+    logger.debug(resp.content)
+    return resp
+
+
+class Delivery(object):
+    """A serialized outbox entry, ready to be sent."""
+
+    def __init__(self, entry, target, path, token, graph):
+        self.entry = entry
+        self.target = target
+        self.path = path
+        self.token = token
+        self.graph = graph
+
+    def report_error(self, resp):
+        from website.preprints.tasks import send_desk_share_preprint_error
+        from website.project.tasks import send_desk_share_error
+
+        if self.entry.target_type == self.entry.PREPRINT:
+            send_desk_share_preprint_error(self.target, resp, self.entry.attempts)
+        else:
+            send_desk_share_error(self.target, resp, self.entry.attempts)
+
+
+def prepare(entry):
+    """Serialize the object of an outbox entry. Returns None if it can't be sent."""
+    from website.preprints.tasks import format_preprint
+    from website.project.tasks import format_node, format_registration
+
+    if entry.target_type == entry.PREPRINT:
+        preprint = apps.get_model('osf.PreprintService').load(entry.target_guid)
+        if preprint is None:
+            return None
+        if not preprint.provider.access_token:
+            logger.warning('No access_token for {}. Unable to send {} to SHARE.'.format(preprint.provider, preprint))
+            return None
+        share_type = entry.share_type or preprint.provider.share_publish_type
+        graph = format_preprint(preprint, share_type, entry.old_subjects)
+        return Delivery(entry, preprint, PREPRINT_PATH, preprint.provider.access_token, graph)
+
+    node = apps.get_model('osf.AbstractNode').load(entry.target_guid)
+    if node is None:
+        return None
+    if not settings.SHARE_API_TOKEN:
+        logger.warning('SHARE_API_TOKEN not set. Could not send "{}" to SHARE.'.format(node._id))
+        return None
+    graph = format_registration(node) if node.is_registration else format_node(node)
+    return Delivery(entry, node, NODE_PATH, settings.SHARE_API_TOKEN, graph)
+
+def finish(entry):
+    """Drop an entry that was sent or given up on, unless its object was enqueued again
+    while it was being sent; that update is then due right away.
+    """
+    ShareOutboxEntry = apps.get_model('osf.ShareOutboxEntry')
+    deleted, _ = ShareOutboxEntry.objects.filter(id=entry.id, enqueued=entry.enqueued).delete()
+    if not deleted:
+        ShareOutboxEntry.objects.filter(id=entry.id).update(attempts=0, next_attempt=timezone.now())
+
+def reschedule(entry, resp=None, delivery=None):
+    """Retry an entry that could not be sent, with the backoff used by the celery tasks,
+    and give up after ``settings.SHARE_OUTBOX_MAX_ATTEMPTS`` attempts. The error SHARE
+    answered with, `resp`, is then reported for `delivery`.
+    """
+    entry.attempts += 1
+    if entry.attempts >= settings.SHARE_OUTBOX_MAX_ATTEMPTS:
+        if resp is not None and delivery is not None:
+            delivery.report_error(resp)
+        else:
+            logger.error('Giving up on sending {} {} to SHARE'.format(entry.target_type, entry.target_guid))
+        finish(entry)
+        return
+    countdown = (random.random() + 1) * min(60 + settings.CELERY_RETRY_BACKOFF_BASE ** entry.attempts, 60 * 10)
+    entry.next_attempt = timezone.now() + timedelta(seconds=countdown)
+    entry.save(update_fields=['attempts', 'next_attempt'])
+
+def deliver(deliveries, limiter=None):
+    """Send deliveries sharing an endpoint and token as one batch.
+
+    :return tuple: Number of objects (sent, failed)
+    """
+    delivery = deliveries[0]
+    try:
+        resp = send_batch(delivery.path, delivery.token, [each.graph for each in deliveries], limiter=limiter)
+    except requests.RequestException as e:
+        logger.error('Sending {} object(s) to SHARE failed: {}'.format(len(deliveries), e))
+        resp = None
+
+    if resp is not None and resp.ok:
+        for each in deliveries:
+            finish(each.entry)
+        return len(deliveries), 0
+
+    if resp is not None and resp.status_code < 500:
+        if len(deliveries) > 1:
+            # Find the bad records
+            results = [deliver([each], limiter=limiter) for each in deliveries]
+            return sum(sent for sent, _ in results), sum(failed for _, failed in results)
+        delivery.report_error(resp)
+        finish(delivery.entry)
+        return 0, 1
+
+    for each in deliveries:
+        reschedule(each.entry, resp, each)
+    return 0, len(deliveries)
+
+def claim(limit):
+    """Lease up to `limit` due entries, oldest first, to the caller."""
+    ShareOutboxEntry = apps.get_model('osf.ShareOutboxEntry')
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            ShareOutboxEntry.objects
+            .select_for_update(skip_locked=True)
+            .filter(next_attempt__lte=now)
+            .order_by('next_attempt', 'id')[:limit]
+        )
+        ShareOutboxEntry.objects.filter(id__in=[entry.id for entry in entries]).update(
+            next_attempt=now + timedelta(seconds=settings.SHARE_OUTBOX_LEASE)
+        )
+    return entries
+
+def flush_outbox(max_batches=None):
+    """Send the outbox entries that are due, oldest first, in batches.
+
+    Entries are leased while they are sent, so flushes may run concurrently. Updates to
+    an object that is being sent are sent again once it is done.
+
+    :param int max_batches: Number of batches of entries to claim before returning
+    :return tuple: Number of objects (sent, failed)
+    """
+    if not settings.SHARE_URL:
+        return 0, 0
+
+    max_batches = max_batches or settings.SHARE_OUTBOX_MAX_BATCHES
+    limiter = RateLimiter(settings.SHARE_OUTBOX_MAX_REQUESTS_PER_SECOND)
+    sent = failed = 0
+    start = time.time()
+    for _ in range(max_batches):
+        entries = claim(settings.SHARE_OUTBOX_BATCH_SIZE)
+        if not entries:
+            break
+
+        groups = OrderedDict()
+        for entry in entries:
+            try:
+                delivery = prepare(entry)
+            except Exception:
+                # Don't hold back the rest of the batch
+                logger.exception('Serializing {} {} for SHARE failed'.format(entry.target_type, entry.target_guid))
+                reschedule(entry)
+                failed += 1
+                continue
+            if delivery is None:
+                finish(entry)
+                continue
+            groups.setdefault((delivery.path, delivery.token), []).append(delivery)
+
+        for deliveries in groups.values():
+            batch_sent, batch_failed = deliver(deliveries, limiter=limiter)
+            sent += batch_sent
+            failed += batch_failed
+
+    if sent or failed:
+        logger.info('Sent {} object(s) to SHARE in {:.1f}s, {} failed'.format(sent, time.time() - start, failed))
+    return sent, failed
+
+
+@celery_app.task(ignore_results=True)
+def flush_share_outbox():
+    flush_outbox()